@@ -0,0 +1,355 @@
+"""
+Хранилище испытаний: каждое испытание в своём файле SQLite.
+
+    test_data/catalog.db     — каталог: номер, путь к файлу, состояние
+    test_data/test_N.db      — таблицы мультиметр_N, осциллограф_N, uart_N
+
+Имена таблиц внутри файла те же, что были в общей БД, поэтому запросы к ним
+не меняются — меняется только сессия (session_for_table). Запись текущего
+испытания не конкурирует с чтением старых, а удаление, архивация и резервное
+копирование испытания — операции над одним файлом.
+
+Запросы сразу по нескольким испытаниям идут через fan_out (по очереди в
+каждый файл) или attach_tests (ATTACH файлов к одному соединению).
+"""
+
+import contextlib
+import os
+import shutil
+import threading
+
+from sqlalchemy import Column, Integer, String, event, text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+from backend.engine import Session, create_sqlite_engine
+from backend.settings import TESTS_DIR
+from backend.timestamps import now_ns
+
+CATALOG_FILENAME = 'catalog.db'
+TEST_TABLE_PREFIXES = ('мультиметр', 'осциллограф', 'uart')
+# SQLite по умолчанию позволяет подключить не больше 10 баз к соединению
+MAX_ATTACHED = 10
+
+CatalogBase = declarative_base()
+
+
+class CatalogEntry(CatalogBase):
+    __tablename__ = 'tests'
+    number = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False)
+    status = Column(String, default='running')
+    created_ns = Column(Integer)
+    finished_ns = Column(Integer, nullable=True)
+
+
+CATALOG_PATH = os.path.join(TESTS_DIR, CATALOG_FILENAME)
+catalog_engine = create_sqlite_engine(f"sqlite:///{CATALOG_PATH}")
+CatalogSession = sessionmaker(bind=catalog_engine)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+# каталог и TESTS_DIR создаются при первом подключении к каталогу, а не при
+# импорте: сервер без испытаний не оставляет после себя test_data/
+@event.listens_for(catalog_engine, 'do_connect')
+def _create_catalog_dir(dialect, connection_record, cargs, cparams):
+    os.makedirs(TESTS_DIR, exist_ok=True)
+
+
+_CREATE_CATALOG = str(
+    CreateTable(CatalogEntry.__table__, if_not_exists=True).compile(
+        dialect=catalog_engine.dialect
+    )
+)
+
+
+@event.listens_for(catalog_engine, 'connect')
+def _create_catalog_table(dbapi_connection, connection_record):
+    dbapi_connection.execute(_CREATE_CATALOG)
+
+
+def catalog_exists():
+    return os.path.exists(CATALOG_PATH)
+
+
+def test_file_path(test_number):
+    return os.path.join(TESTS_DIR, f'test_{int(test_number)}.db')
+
+
+def table_number_for(table):
+    """Номер испытания по имени таблицы (мультиметр_3 -> 3) или None"""
+    prefix, _, number = (table or '').rpartition('_')
+    if prefix in TEST_TABLE_PREFIXES and number.isdigit():
+        return int(number)
+    return None
+
+
+def get_entry(test_number):
+    session = CatalogSession()
+    try:
+        entry = session.get(CatalogEntry, int(test_number))
+        if entry is not None:
+            session.expunge(entry)
+        return entry
+    finally:
+        session.close()
+
+
+def list_entries():
+    session = CatalogSession()
+    try:
+        entries = session.query(CatalogEntry).order_by(CatalogEntry.number).all()
+        session.expunge_all()
+        return entries
+    finally:
+        session.close()
+
+
+def max_test_number():
+    session = CatalogSession()
+    try:
+        return session.execute(text('SELECT MAX(number) FROM tests')).scalar()
+    finally:
+        session.close()
+
+
+def allocate_test_number():
+    """Выделяет номер нового испытания и сразу заносит его в каталог одной
+    транзакцией: два одновременных запуска не получат один номер"""
+    with catalog_engine.begin() as connection:
+        test_number = connection.execute(
+            text(
+                "INSERT INTO tests (number, path, status, created_ns) "
+                "SELECT COALESCE(MAX(number), 0) + 1, '', 'starting', :created_ns "
+                "FROM tests RETURNING number"
+            ),
+            {'created_ns': now_ns()},
+        ).scalar()
+        connection.execute(
+            text("UPDATE tests SET path = :path WHERE number = :number"),
+            {'path': test_file_path(test_number), 'number': test_number},
+        )
+    return test_number
+
+
+def register_test(test_number, path=None, status='running', created_ns=None):
+    """Добавляет или обновляет запись испытания в каталоге"""
+    session = CatalogSession()
+    try:
+        entry = session.get(CatalogEntry, int(test_number))
+        if entry is None:
+            entry = CatalogEntry(number=int(test_number))
+            session.add(entry)
+        entry.path = path or test_file_path(test_number)
+        entry.status = status
+        entry.created_ns = created_ns or entry.created_ns or now_ns()
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def set_test_status(test_number, status, finished_ns=None):
+    session = CatalogSession()
+    try:
+        entry = session.get(CatalogEntry, int(test_number))
+        if entry is None:
+            return False
+        entry.status = status
+        if finished_ns is not None:
+            entry.finished_ns = finished_ns
+        session.commit()
+        return True
+    finally:
+        session.close()
+
+
+def abort_stale_tests():
+    """Испытания, оставшиеся в состоянии starting/running после остановки
+    сервера, помечаются aborted; возвращает их номера"""
+    if not catalog_exists():
+        return []
+    session = CatalogSession()
+    try:
+        stale = (
+            session.query(CatalogEntry)
+            .filter(CatalogEntry.status.in_(('starting', 'running')))
+            .all()
+        )
+        for entry in stale:
+            entry.status = 'aborted'
+            entry.finished_ns = entry.finished_ns or now_ns()
+        session.commit()
+        return [entry.number for entry in stale]
+    finally:
+        session.close()
+
+
+def engine_for_test(test_number):
+    """Движок файла испытания; None, если испытания нет в каталоге"""
+    test_number = int(test_number)
+    with _engines_lock:
+        test_db = _engines.get(test_number)
+        if test_db is not None:
+            return test_db
+        entry = get_entry(test_number)
+        if entry is None:
+            return None
+        test_db = create_sqlite_engine(f"sqlite:///{entry.path}")
+        _engines[test_number] = test_db
+        return test_db
+
+
+def _dispose_engine(test_number):
+    with _engines_lock:
+        test_db = _engines.pop(int(test_number), None)
+    if test_db is not None:
+        test_db.dispose()
+
+
+def session_for_test(test_number):
+    test_db = engine_for_test(test_number)
+    if test_db is None:
+        raise LookupError(f"Испытание #{test_number} не найдено в каталоге")
+    return Session(bind=test_db)
+
+
+def session_for_table(table):
+    """Сессия той БД, где лежит таблица: файл испытания для таблиц
+    зарегистрированных испытаний, иначе рабочая БД"""
+    test_number = table_number_for(table)
+    if test_number is not None:
+        test_db = engine_for_test(test_number)
+        if test_db is not None:
+            return Session(bind=test_db)
+    return Session()
+
+
+def fan_out(func, test_numbers=None):
+    """Вызывает func(session, номер) для каждого испытания по очереди и
+    собирает {номер: результат}; ошибки одного файла не мешают остальным"""
+    if test_numbers is None:
+        test_numbers = [entry.number for entry in list_entries()]
+    results = {}
+    for test_number in test_numbers:
+        try:
+            session = session_for_test(test_number)
+        except LookupError:
+            continue
+        try:
+            results[test_number] = func(session, test_number)
+        except Exception as e:
+            print(f"Ошибка запроса к испытанию #{test_number}: {e}")
+        finally:
+            session.close()
+    return results
+
+
+@contextlib.contextmanager
+def attach_tests(connection, test_numbers):
+    """Подключает файлы испытаний к соединению как схемы test_N, чтобы один
+    запрос мог объединить несколько испытаний (UNION ALL, JOIN).
+    Возвращает {номер: имя схемы}"""
+    if len(test_numbers) > MAX_ATTACHED:
+        raise ValueError(f"Не больше {MAX_ATTACHED} испытаний за один запрос")
+    schemas = {}
+    try:
+        for test_number in test_numbers:
+            entry = get_entry(test_number)
+            path = entry.path if entry else test_file_path(test_number)
+            schema = f'test_{int(test_number)}'
+            connection.exec_driver_sql(f'ATTACH DATABASE ? AS "{schema}"', (path,))
+            schemas[int(test_number)] = schema
+        yield schemas
+    finally:
+        connection.rollback()
+        for schema in schemas.values():
+            connection.exec_driver_sql(f'DETACH DATABASE "{schema}"')
+
+
+def move_tables_to_test_file(connection, test_number, tables):
+    """Переносит таблицы испытания из БД соединения в файл испытания.
+    Таблица удаляется только после того, как копия записана и число строк в
+    ней совпало с оригиналом"""
+    moved = []
+    with attach_tests(connection, [test_number]) as schemas:
+        schema = schemas[int(test_number)]
+        for table in tables:
+            ddl = connection.execute(
+                text(
+                    "SELECT sql FROM main.sqlite_master WHERE type='table' AND name = :name"
+                ),
+                {'name': table},
+            ).scalar()
+            if ddl is None:
+                continue
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{schema}"."{table}"')
+            connection.exec_driver_sql(
+                ddl.replace('CREATE TABLE ', f'CREATE TABLE "{schema}".', 1)
+            )
+            connection.exec_driver_sql(
+                f'INSERT INTO "{schema}"."{table}" SELECT * FROM main."{table}"'
+            )
+            connection.exec_driver_sql(
+                f'CREATE INDEX IF NOT EXISTS "{schema}"."ix_{table}_ts_ns" '
+                f'ON "{table}" (ts_ns)'
+            )
+            connection.commit()
+            copied = connection.exec_driver_sql(
+                f'SELECT COUNT(*) FROM "{schema}"."{table}"'
+            ).scalar()
+            original = connection.exec_driver_sql(
+                f'SELECT COUNT(*) FROM main."{table}"'
+            ).scalar()
+            if copied != original:
+                raise RuntimeError(
+                    f"Копия {table} неполная: {copied} из {original} строк"
+                )
+            connection.exec_driver_sql(f'DROP TABLE main."{table}"')
+            connection.commit()
+            moved.append(table)
+    return moved
+
+
+def move_test_file(test_number, directory):
+    """Перемещает файл испытания в другой каталог (архив) и обновляет путь
+    в каталоге"""
+    entry = get_entry(test_number)
+    if entry is None:
+        raise LookupError(f"Испытание #{test_number} не найдено в каталоге")
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, os.path.basename(entry.path))
+    _dispose_engine(test_number)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(entry.path + suffix):
+            shutil.move(entry.path + suffix, target + suffix)
+    session = CatalogSession()
+    try:
+        session.get(CatalogEntry, int(test_number)).path = target
+        session.commit()
+    finally:
+        session.close()
+    return target
+
+
+def delete_test(test_number):
+    """Удаляет испытание: файл и запись в каталоге"""
+    entry = get_entry(test_number)
+    if entry is None:
+        return False
+    _dispose_engine(test_number)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(entry.path + suffix):
+            os.remove(entry.path + suffix)
+    session = CatalogSession()
+    try:
+        session.query(CatalogEntry).filter_by(number=int(test_number)).delete()
+        session.commit()
+    finally:
+        session.close()
+    return True
@@ -1,10 +1,94 @@
-from sqlalchemy import create_engine
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session as OrmSession
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = 'sqlite:///my_database.db'
+from backend.metrics import SIZE_BUCKETS, histogram
+
+# STAND_DATABASE_URL — другая БД (бенчмарки, отладка) без правки кода
+DATABASE_URL = os.environ.get('STAND_DATABASE_URL', 'sqlite:///my_database.db')
+DB_WORKERS = 4
+# потоковые выгрузки держат поток, пока клиент читает ответ, поэтому у них
+# свой пул: медленные загрузки не занимают потоки записи показаний
+STREAM_WORKERS = 4
+
+DB_COMMIT_SECONDS = histogram('db_commit_seconds', 'Время фиксации транзакции')
+DB_WRITE_BATCH_ROWS = histogram(
+    'db_write_batch_rows', 'Строк INSERT в одной транзакции', SIZE_BUCKETS
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: чтение истории не блокирует запись живых данных
+    cursor = dbapi_connection.cursor()
+    # действует только на новую БД; существующую переводит VACUUM в
+    # backend.retention
+    cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
+
+
+def _count_inserted_rows(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip()[:6].upper() == 'INSERT':
+        rows = len(parameters) if executemany else 1
+        conn.info['inserted_rows'] = conn.info.get('inserted_rows', 0) + rows
+
+
+def _observe_write_batch(conn):
+    rows = conn.info.pop('inserted_rows', 0)
+    if rows:
+        DB_WRITE_BATCH_ROWS.observe(rows)
+
+
+def _discard_write_batch(conn):
+    conn.info.pop('inserted_rows', None)
 
 
-engine = create_engine(DATABASE_URL, echo=False)
+@event.listens_for(OrmSession, 'before_commit')
+def _commit_started(session):
+    session.info['commit_started'] = time.perf_counter()
+
+
+@event.listens_for(OrmSession, 'after_commit')
+def _commit_finished(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def create_sqlite_engine(url):
+    """Движок SQLite с общими настройками; им же открываются файлы испытаний"""
+    sqlite_engine = create_engine(url, echo=False)
+    event.listen(sqlite_engine, 'connect', _set_sqlite_pragmas)
+    # размер пачки записи: строки INSERT между началом и фиксацией транзакции
+    event.listen(sqlite_engine, 'before_cursor_execute', _count_inserted_rows)
+    event.listen(sqlite_engine, 'commit', _observe_write_batch)
+    event.listen(sqlite_engine, 'rollback', _discard_write_batch)
+    return sqlite_engine
+
+
+engine = create_sqlite_engine(DATABASE_URL)
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
+
+
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+stream_executor = ThreadPoolExecutor(
+    max_workers=STREAM_WORKERS, thread_name_prefix='db-stream'
+)
+
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет блокирующий запрос к БД в пуле потоков, не занимая цикл событий"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        db_executor, functools.partial(func, *args, **kwargs)
+    )
@@ -0,0 +1,362 @@
+"""
+Канал событий между процессами сценария и сервером.
+
+Раньше дочерние скрипты печатали всё в stdout: сервер сопоставлял каждую
+строку с регулярным выражением, отправлял её отдельным сообщением WebSocket,
+а осциллограммы шли JSON-строкой, которую lua.js разбирал построчно. Теперь
+скрипт, запущенный сервером, подключается к Unix-сокету из переменной
+окружения STAND_EVENT_SOCKET и передаёт типизированные события кадрами:
+
+    4 байта длины тела (big-endian) | 1 байт кодека | тело
+
+Кодек b'j' — JSON в UTF-8, b'm' — msgpack (если пакет установлен). Каждый
+процесс подключается отдельно, поэтому большие кадры разных процессов не
+перемешиваются. События — словари с ключом 'event':
+
+    log       {'line'}
+    progress  {'source', 'done', 'total'}
+    reading   {'source', 'data'}                  показание прибора
+    waveform  {'channel', 'time', 'voltage', 'color', 'settings'}
+    trigger   {'level', 'mode', 'source', 'slope'}
+
+В waveform массивы передаются как float32: байтами в msgpack и base64 в
+JSON — тот же формат, что в БД и в decodeBase64ToFloat32Array на клиенте.
+Без STAND_EVENT_SOCKET EventWriter печатает в stdout, как раньше, и скрипты
+можно запускать вручную.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+EVENT_SOCKET_ENV = 'STAND_EVENT_SOCKET'
+CODEC_JSON = b'j'
+CODEC_MSGPACK = b'm'
+HEADER = struct.Struct('>Ic')
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+LOG_FLUSH_INTERVAL = 0.2
+LOG_BATCH_LINES = 200
+
+
+def pack_float32(values):
+    """Массив в байты float32"""
+    return np.asarray(values, dtype=np.float32).tobytes()
+
+
+def encode_frame(event, codec=None):
+    if codec is None:
+        codec = CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+    if codec == CODEC_MSGPACK:
+        body = msgpack.packb(event, use_bin_type=True)
+    else:
+        event = {
+            key: base64.b64encode(value).decode('ascii')
+            if isinstance(value, bytes)
+            else value
+            for key, value in event.items()
+        }
+        body = json.dumps(event, ensure_ascii=False).encode('utf-8')
+    return HEADER.pack(len(body), codec) + body
+
+
+def decode_frame(codec, body):
+    """Тело кадра в словарь; байтовые поля приводятся к base64-строкам"""
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Получен кадр msgpack, но пакет msgpack не установлен")
+        event = msgpack.unpackb(body, raw=False)
+        return {
+            key: base64.b64encode(value).decode('ascii')
+            if isinstance(value, bytes)
+            else value
+            for key, value in event.items()
+        }
+    if codec == CODEC_JSON:
+        return json.loads(body.decode('utf-8'))
+    raise ValueError(f"Неизвестный кодек кадра: {codec!r}")
+
+
+async def read_frames(reader):
+    """Асинхронно выдаёт события из потока кадров до его закрытия"""
+    while True:
+        try:
+            header = await reader.readexactly(HEADER.size)
+        except asyncio.IncompleteReadError:
+            return
+        length, codec = HEADER.unpack(header)
+        if length > MAX_FRAME_BYTES:
+            raise ValueError(f"Слишком большой кадр события: {length} байт")
+        try:
+            body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return
+        yield decode_frame(codec, body)
+
+
+class EventWriter:
+    """Сторона дочернего процесса: отправляет события серверу, а без
+    STAND_EVENT_SOCKET печатает их в stdout в прежнем виде"""
+
+    def __init__(self, path=None):
+        self.sock = None
+        self.lock = threading.Lock()
+        path = path or os.environ.get(EVENT_SOCKET_ENV)
+        if path:
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(path)
+            except OSError as e:
+                print(f"Не удалось подключиться к каналу событий {path}: {e}")
+                self.sock = None
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def send(self, event):
+        if self.sock is None:
+            return False
+        frame = encode_frame(event)
+        try:
+            with self.lock:
+                self.sock.sendall(frame)
+            return True
+        except OSError as e:
+            print(f"Канал событий закрыт: {e}")
+            self.close()
+            return False
+
+    def log(self, line):
+        if not self.send({'event': 'log', 'line': line}):
+            print(line)
+
+    def progress(self, source, done, total):
+        self.send(
+            {'event': 'progress', 'source': source, 'done': done, 'total': total}
+        )
+
+    def reading(self, source, data):
+        return self.send({'event': 'reading', 'source': source, 'data': data})
+
+    def waveform(self, channel, time, voltage, color=None, settings=None):
+        if self.sock is None:
+            print(
+                json.dumps(
+                    {
+                        'type': 'oscilloscope_test',
+                        'channel': channel,
+                        'time': list(time),
+                        'voltage': list(voltage),
+                        'color': color,
+                        'settings': settings or {},
+                    }
+                )
+            )
+            return
+        self.send(
+            {
+                'event': 'waveform',
+                'channel': channel,
+                'time': pack_float32(time),
+                'voltage': pack_float32(voltage),
+                'color': color,
+                'settings': settings or {},
+            }
+        )
+
+    def trigger(self, level, mode='Auto', source='CH1', slope='Rising'):
+        event = {
+            'event': 'trigger',
+            'level': level,
+            'mode': mode,
+            'source': source,
+            'slope': slope,
+        }
+        if not self.send(event):
+            event['type'] = event.pop('event')
+            print(json.dumps(event))
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class EventServer:
+    """Серверная сторона: Unix-сокет во временном каталоге, каждое событие
+    передаётся в корутину handler(event)"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.directory = None
+        self.path = None
+        self.server = None
+        self.clients = set()
+
+    def env(self, base=None):
+        env = dict(os.environ if base is None else base)
+        env[EVENT_SOCKET_ENV] = self.path
+        return env
+
+    async def _client(self, reader, writer):
+        self.clients.add(asyncio.current_task())
+        try:
+            async for event in read_frames(reader):
+                try:
+                    await self.handler(event)
+                except Exception as e:
+                    print(f"Ошибка обработки события {event.get('event')}: {e}")
+        except ValueError as e:
+            print(f"Ошибка канала событий: {e}")
+        finally:
+            self.clients.discard(asyncio.current_task())
+            writer.close()
+
+    async def __aenter__(self):
+        self.directory = tempfile.mkdtemp(prefix='stand_events_')
+        self.path = os.path.join(self.directory, 'events.sock')
+        self.server = await asyncio.start_unix_server(self._client, self.path)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        # процессы уже завершились, соединения дочитываются до конца
+        if self.clients:
+            await asyncio.wait(list(self.clients), timeout=1.0)
+        await self.server.wait_closed()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return False
+
+
+class ClientEventSink:
+    """Преобразует события сценария в сообщения WebSocket.
+
+    Строки журнала копятся и уходят пачкой {'type': 'lua_output', 'lines'}
+    раз в LOG_FLUSH_INTERVAL; прогресс — наименьшая доля среди источников,
+    только при росте процента.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.lines = []
+        self.progress = {}
+        self.last_percent = 0
+        self._flusher = None
+
+    async def emit(self, message):
+        try:
+            await self.send(message)
+        except Exception as e:
+            print(f"Ошибка отправки сообщения сценария: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(LOG_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def start(self):
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def flush(self):
+        if self.lines:
+            lines, self.lines = self.lines, []
+            await self.emit({'type': 'lua_output', 'lines': lines})
+
+    def expect_progress(self, *sources):
+        """Регистрирует источники заранее, чтобы прогресс считался по всем"""
+        for source in sources:
+            self.progress.setdefault(source, 0.0)
+
+    async def log(self, line):
+        if line.startswith('[PROGRESS]'):
+            # прогресс, посчитанный самим скриптом, нужен только если
+            # процессы не присылают событий progress
+            if not self.progress:
+                try:
+                    percent = int(line[len('[PROGRESS]') :].strip().rstrip('%'))
+                except ValueError:
+                    percent = None
+                if percent is not None:
+                    await self._send_percent(percent)
+            return
+        self.lines.append(line)
+        if len(self.lines) >= LOG_BATCH_LINES:
+            await self.flush()
+
+    async def _send_percent(self, percent):
+        percent = min(100, percent)
+        if percent > self.last_percent:
+            self.last_percent = percent
+            await self.emit({'type': 'lua_progress', 'percent': percent})
+
+    async def report_progress(self, source, done, total):
+        self.progress[source] = done / total if total else 1.0
+        await self._send_percent(int(min(self.progress.values()) * 100))
+
+    async def handle(self, event):
+        kind = event.get('event')
+        if kind == 'log':
+            await self.log(str(event.get('line', '')))
+        elif kind == 'progress':
+            await self.report_progress(
+                event.get('source', ''), event.get('done', 0), event.get('total', 0)
+            )
+        elif kind == 'reading':
+            await self.emit({'type': 'multimeter', 'data': event.get('data')})
+        elif kind == 'waveform':
+            await self.emit(
+                {
+                    'type': 'oscilloscope_waveform',
+                    'channel': event.get('channel'),
+                    'time_data': event.get('time'),
+                    'voltage_data': event.get('voltage'),
+                    'color': event.get('color'),
+                    'settings': event.get('settings') or {},
+                }
+            )
+        elif kind == 'trigger':
+            await self.emit(
+                {
+                    'type': 'oscilloscope_trigger',
+                    'level': event.get('level', 0),
+                    'mode': event.get('mode', 'Auto'),
+                    'source': event.get('source', 'CH1'),
+                    'slope': event.get('slope', 'Rising'),
+                }
+            )
+        else:
+            print(f"Неизвестное событие сценария: {kind}")
@@ -0,0 +1,242 @@
+"""
+Выгрузка испытания в колоночные файлы для анализа.
+
+    npz      — один файл numpy (np.load), удобно скачивать
+    npy      — каталог .npy-файлов, загружается через mmap без копирования
+    parquet  — каталог Parquet-файлов (нужен pyarrow)
+
+Массивы (ключи в npz, пути в каталогах):
+
+    multimeter/timestamp_ns, multimeter/value_si, multimeter/overload,
+    multimeter/unit_code, multimeter/unit
+    uart/timestamp_ns, uart/temp600_1, ... uart/thrust1
+    oscilloscope/<канал>/timestamp_ns   (N,)
+    oscilloscope/<канал>/time           (N, M) float32
+    oscilloscope/<канал>/voltage        (N, M) float32
+
+Метки времени — int64 наносекунды Unix-эпохи. Осциллограммы разной длины
+дополняются NaN до самой длинной. Показания мультиметра выгружаются в
+единицах СИ величины unit_code (mV и V — одна шкала), unit — единица прибора
+для справки; при перегрузке value_si = NaN.
+"""
+
+import base64
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from backend.timestamps import timestamp_to_ns
+
+EXPORT_FORMATS = ('npz', 'npy', 'parquet')
+UART_SENSOR_COLUMNS = (
+    'temp600_1',
+    'temp600_2',
+    'tempNormal1',
+    'tempNormal2',
+    'thrust1',
+)
+NAT_NS = np.iinfo(np.int64).min
+
+
+def row_timestamp_ns(row):
+    """Время записи в наносекундах: колонка ts_ns, а для записей без неё —
+    разбор строкового timestamp (NAT_NS, если не удалось)"""
+    ts_ns = row.get('ts_ns') or timestamp_to_ns(row.get('timestamp'))
+    return ts_ns if ts_ns else NAT_NS
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _decode_float32(data):
+    if not data:
+        return np.empty(0, dtype=np.float32)
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def _stack_padded(rows):
+    width = max((len(row) for row in rows), default=0)
+    result = np.full((len(rows), width), np.nan, dtype=np.float32)
+    for i, row in enumerate(rows):
+        result[i, : len(row)] = row
+    return result
+
+
+def collect_test_arrays(test_number):
+    """Читает все таблицы испытания курсором и собирает колонки numpy"""
+    from backend.measurement import multimeter_numeric_fields
+    from backend.setup_db import iter_table_rows
+
+    arrays = {}
+
+    timestamps, values, overload, unit_codes, units = [], [], [], [], []
+    for row in iter_table_rows(f"мультиметр_{test_number}"):
+        timestamps.append(row_timestamp_ns(row))
+        if row.get('unit_code') is None:
+            # записи до появления числовых колонок
+            row = {**row, **multimeter_numeric_fields(row)}
+        overload.append(bool(row['overload']))
+        values.append(_parse_float(row['value_si']))
+        unit_codes.append(row['unit_code'])
+        units.append(row['unit'] or '')
+    arrays['multimeter/timestamp_ns'] = np.array(timestamps, dtype=np.int64)
+    arrays['multimeter/value_si'] = np.array(values, dtype=np.float64)
+    arrays['multimeter/overload'] = np.array(overload, dtype=bool)
+    arrays['multimeter/unit_code'] = np.array(unit_codes, dtype=np.int8)
+    arrays['multimeter/unit'] = np.array(units, dtype=np.str_)
+
+    timestamps = []
+    sensors = {name: [] for name in UART_SENSOR_COLUMNS}
+    for row in iter_table_rows(f"uart_{test_number}"):
+        values = [row.get(name) for name in UART_SENSOR_COLUMNS]
+        if all(value is None for value in values):
+            # сырые пакеты и калибровка без значений датчиков
+            continue
+        timestamps.append(row_timestamp_ns(row))
+        for name, value in zip(UART_SENSOR_COLUMNS, values):
+            sensors[name].append(np.nan if value is None else value)
+    arrays['uart/timestamp_ns'] = np.array(timestamps, dtype=np.int64)
+    for name, column in sensors.items():
+        arrays[f'uart/{name}'] = np.array(column, dtype=np.float64)
+
+    channels = {}
+    for row in iter_table_rows(f"осциллограф_{test_number}"):
+        channel = channels.setdefault(
+            row['channel'] or 'unknown',
+            {'timestamp_ns': [], 'time': [], 'voltage': []},
+        )
+        try:
+            time_data = _decode_float32(row['time_data'])
+            voltage_data = _decode_float32(row['voltage_data'])
+        except ValueError:
+            continue
+        channel['timestamp_ns'].append(row_timestamp_ns(row))
+        channel['time'].append(time_data)
+        channel['voltage'].append(voltage_data)
+    for name, channel in channels.items():
+        prefix = f'oscilloscope/{name}'
+        arrays[f'{prefix}/timestamp_ns'] = np.array(
+            channel['timestamp_ns'], dtype=np.int64
+        )
+        arrays[f'{prefix}/time'] = _stack_padded(channel['time'])
+        arrays[f'{prefix}/voltage'] = _stack_padded(channel['voltage'])
+
+    return arrays
+
+
+def _write_npy_dir(arrays, path):
+    for key, array in arrays.items():
+        filename = os.path.join(path, *key.split('/')) + '.npy'
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        np.save(filename, array, allow_pickle=False)
+
+
+def _to_arrow_column(array):
+    if array.ndim == 2:
+        return pa.FixedSizeListArray.from_arrays(
+            pa.array(array.ravel()), array.shape[1]
+        )
+    return pa.array(array)
+
+
+def _write_parquet_dir(arrays, path):
+    if pa is None:
+        raise RuntimeError("Для выгрузки в Parquet нужен пакет pyarrow")
+    groups = {}
+    for key, array in arrays.items():
+        group, _, column = key.rpartition('/')
+        groups.setdefault(group, {})[column] = array
+    for group, columns in groups.items():
+        timestamp = columns.pop('timestamp_ns')
+        fields = {'timestamp': pa.array(timestamp, type=pa.timestamp('ns'))}
+        for name, array in columns.items():
+            fields[name] = _to_arrow_column(array)
+        table = pa.table(fields)
+        filename = os.path.join(path, group.replace('/', '_') + '.parquet')
+        pq.write_table(table, filename)
+
+
+def export_test(test_number, path, export_format='npz'):
+    """Выгружает испытание в файл (npz) или каталог (npy, parquet)"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+    arrays = collect_test_arrays(test_number)
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    if export_format == 'npz':
+        np.savez(path, **arrays)
+        if not path.endswith('.npz'):
+            path += '.npz'
+    else:
+        os.makedirs(path, exist_ok=True)
+        if export_format == 'npy':
+            _write_npy_dir(arrays, path)
+        else:
+            _write_parquet_dir(arrays, path)
+    return path
+
+
+def export_test_archive(test_number, export_format='npz'):
+    """Готовит выгрузку для скачивания одним файлом. Возвращает путь к
+    временному файлу и имя для Content-Disposition; файл удаляет вызывающий"""
+    workdir = tempfile.mkdtemp(prefix=f'test_{test_number}_')
+    try:
+        if export_format == 'npz':
+            path = export_test(
+                test_number, os.path.join(workdir, 'export.npz'), 'npz'
+            )
+            filename = f'test_{test_number}.npz'
+        else:
+            export_dir = export_test(
+                test_number, os.path.join(workdir, 'export'), export_format
+            )
+            path = os.path.join(workdir, 'export.zip')
+            # npy и parquet уже плотные, поэтому без сжатия
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+                for directory, _, filenames in os.walk(export_dir):
+                    for name in filenames:
+                        full = os.path.join(directory, name)
+                        archive.write(full, os.path.relpath(full, export_dir))
+            filename = f'test_{test_number}_{export_format}.zip'
+        handle, result = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+        os.close(handle)
+        shutil.move(path, result)
+        return result, filename
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def load_export(path, mmap=True):
+    """Загружает выгрузку в словарь {ключ: массив}. Каталог npy отображается
+    в память (mmap_mode='r'), Parquet читается в pyarrow.Table по группам"""
+    if os.path.isfile(path):
+        with np.load(path, allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+    result = {}
+    for directory, _, filenames in os.walk(path):
+        for name in sorted(filenames):
+            full = os.path.join(directory, name)
+            key = os.path.relpath(full, path).replace(os.sep, '/')
+            if name.endswith('.npy'):
+                result[key[: -len('.npy')]] = np.load(
+                    full, mmap_mode='r' if mmap else None, allow_pickle=False
+                )
+            elif name.endswith('.parquet') and pq is not None:
+                result[key[: -len('.parquet')]] = pq.read_table(
+                    full, memory_map=mmap
+                )
+    return result
@@ -1,74 +1,114 @@
 import asyncio
+import contextlib
 import json
+import os
 import traceback
-from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 
-from backend.send_websocket import send_to_all_websocket_clients
-from backend.settings import current_uart_data, http_event_loop
-
-
-class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.error_message_format = '''
-        <html>
-            <head>
-                <meta charset="utf-8">
-                <title>Error %(code)d</title>
-            </head>
-            <body>
-                <h1>Error %(code)d</h1>
-                <p>%(message)s</p>
-            </body>
-        </html>
-        '''
-        super().__init__(*args, **kwargs)
+from backend.catalog import get_entry
+from backend.engine import run_db, stream_executor
+from backend.http_server import AsyncHTTPRequestHandler
+from backend.lifecycle import test_lifecycle
+from backend.log import get_logger
+from backend.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from backend.settings import STATIC_MAX_AGE, current_uart_data
+from backend.static_files import static_cache
+from backend.streaming import (STREAM_CHUNK_SIZE, STREAM_FORMATS,
+                               encode_rows, iterate_in_thread)
+from backend.uart_ingest import ingest_sensor_frames
 
+logger = get_logger('http')
+
+
+class CustomHTTPRequestHandler(AsyncHTTPRequestHandler):
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         super().end_headers()
 
-    def do_OPTIONS(self):
+    async def do_OPTIONS(self):
         self.send_response(200)
         self.end_headers()
 
-    def do_GET(self):
+    async def do_HEAD(self):
+        await self.do_GET()
+
+    async def do_GET(self):
         try:
             parsed_path = urlparse(self.path)
             path = parsed_path.path
             query = parse_qs(parsed_path.query)
+            stream_format = self.get_stream_format(query)
 
             if path == '/':
-                self.serve_file('frontend/index.html', 'text/html')
+                self.serve_file('index.html', 'text/html')
             elif path.startswith('/src/') and path.endswith('.js'):
-                self.serve_file('frontend' + path, 'text/javascript')
+                self.serve_file(path, 'text/javascript')
             elif path.startswith('/static/') and path.endswith('.css'):
-                self.serve_file('frontend' + path, 'text/css')
+                self.serve_file(path, 'text/css')
             elif path.endswith('.html'):
-                self.serve_file('frontend' + path, 'text/html')
+                self.serve_file(path, 'text/html')
             elif self.path == '/api/uart-data':
                 self.get_uart_data()
+            elif path == '/db/oscilloscope' and stream_format:
+                from backend.setup_db import iter_data_rows
+
+                test_number = query.get('test_number', [None])[0]
+                await self.send_stream(
+                    iter_data_rows,
+                    'oscilloscope',
+                    int(test_number) if test_number else None,
+                    stream_format=stream_format,
+                )
             elif path == '/db/oscilloscope':
                 from backend.setup_db import get_oscilloscope_data_paginated
 
                 page = int(query.get('page', ['1'])[0])
                 per_page = int(query.get('per_page', ['50'])[0])
                 self.send_json_response(
-                    get_oscilloscope_data_paginated(
-                        page=page, per_page=per_page
+                    await run_db(
+                        get_oscilloscope_data_paginated,
+                        page=page,
+                        per_page=per_page,
+                        **self.get_page_cursors(query),
                     )
                 )
+            elif path == '/db/multimeter' and stream_format:
+                from backend.setup_db import iter_data_rows
+
+                test_number = query.get('test_number', [None])[0]
+                await self.send_stream(
+                    iter_data_rows,
+                    'multimeter',
+                    int(test_number) if test_number else None,
+                    stream_format=stream_format,
+                )
             elif path == '/db/multimeter':
                 from backend.setup_db import get_multimeter_data_paginated
 
                 page = int(query.get('page', ['1'])[0])
                 per_page = int(query.get('per_page', ['50'])[0])
                 self.send_json_response(
-                    get_multimeter_data_paginated(page=page, per_page=per_page)
+                    await run_db(
+                        get_multimeter_data_paginated,
+                        page=page,
+                        per_page=per_page,
+                        **self.get_page_cursors(query),
+                    )
                 )
 
+            elif path == '/db/uart' and stream_format:
+                from backend.setup_db import iter_data_rows
+
+                test_number = query.get('test_number', [None])[0]
+                await self.send_stream(
+                    iter_data_rows,
+                    'uart',
+                    int(test_number) if test_number else None,
+                    query.get('data_type', [None])[0],
+                    stream_format=stream_format,
+                )
             elif path == '/db/uart':
                 from backend.setup_db import get_uart_data_paginated
                 
@@ -81,30 +121,75 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
                     test_number = int(test_number)
                 
                 self.send_json_response(
-                    get_uart_data_paginated(
-                        page=page, 
-                        per_page=per_page, 
+                    await run_db(
+                        get_uart_data_paginated,
+                        page=page,
+                        per_page=per_page,
                         test_number=test_number,
-                        data_type=data_type
+                        data_type=data_type,
+                        **self.get_page_cursors(query),
                     )
                 )
             elif path == '/history/oscilloscope':
                 from backend.measurement import get_oscilloscope_history
 
                 period = query.get('period', ['hour'])[0]
-                self.send_json_response(get_oscilloscope_history(period))
+                self.send_json_response(
+                    await run_db(get_oscilloscope_history, period)
+                )
+            elif path == '/history/multimeter/stats':
+                from backend.measurement import get_multimeter_stats
+
+                test_number = query.get('test_number', [None])[0]
+                self.send_json_response(
+                    await run_db(
+                        get_multimeter_stats,
+                        int(test_number) if test_number else None,
+                        query.get('period', [None])[0],
+                    )
+                )
+            elif path == '/history/multimeter/rollup':
+                from backend.measurement import get_multimeter_rollup
+
+                test_number = query.get('test_number', [None])[0]
+                self.send_json_response(
+                    await run_db(
+                        get_multimeter_rollup,
+                        query.get('period', ['hour'])[0],
+                        int(query.get('bucket', ['60'])[0]),
+                        int(test_number) if test_number else None,
+                    )
+                )
             elif path == '/history/multimeter':
                 from backend.measurement import get_multimeter_history
 
                 period = query.get('period', ['hour'])[0]
-                self.send_json_response(get_multimeter_history(period))
+                self.send_json_response(
+                    await run_db(get_multimeter_history, period)
+                )
+            elif path == '/db/oscilloscope_history' and stream_format:
+                from backend.oscillocsope_visualizer import iter_channel_history
+
+                channel = query.get('channel', [None])[0]
+                limit = int(query.get('limit', [20])[0])
+                if channel:
+                    await self.send_stream(
+                        iter_channel_history,
+                        channel,
+                        limit,
+                        stream_format=stream_format,
+                    )
+                else:
+                    self.send_error(400, "Channel not specified")
             elif path == '/db/oscilloscope_history':
                 from backend.oscillocsope_visualizer import get_channel_history
 
                 channel = query.get('channel', [None])[0]
                 limit = int(query.get('limit', [20])[0])
                 if channel:
-                    time_arr, voltage_arr = get_channel_history(channel, limit)
+                    time_arr, voltage_arr = await run_db(
+                        get_channel_history, channel, limit
+                    )
                     self.send_json_response(
                         {
                             'channel': channel,
@@ -114,10 +199,76 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
                     )
                 else:
                     self.send_error(400, "Channel not specified")
+            elif path == '/db/retention':
+                from backend import retention
+
+                self.send_json_response(
+                    {
+                        'space': await run_db(retention.database_space),
+                        'last_report': retention.last_report,
+                    }
+                )
+            elif path == '/metrics':
+                self.send_metrics()
+            elif path == '/trace/latency':
+                from backend.tracing import tracer
+
+                self.send_json_response(tracer.report())
             elif path == '/tests':
                 from backend.setup_db import get_test_list
 
-                self.send_json_response(get_test_list())
+                self.send_json_response(await run_db(get_test_list))
+            elif path.startswith('/tests/') and path.endswith('/export'):
+                from backend.export import EXPORT_FORMATS, export_test_archive
+
+                try:
+                    test_number = int(path.split('/')[-2])
+                except ValueError:
+                    self.send_error(400, "Invalid test number")
+                    return
+                export_format = query.get('format', ['npz'])[0]
+                if export_format not in EXPORT_FORMATS:
+                    self.send_error(400, "Unknown export format")
+                    return
+                if await run_db(get_entry, test_number) is None:
+                    self.send_error(404, "Test not found")
+                    return
+                # выгрузка читает испытание целиком, поэтому идёт в пуле
+                # выгрузок и не занимает потоки записи живых данных
+                try:
+                    filename, download_name = (
+                        await asyncio.get_running_loop().run_in_executor(
+                            stream_executor,
+                            export_test_archive,
+                            test_number,
+                            export_format,
+                        )
+                    )
+                except RuntimeError as e:
+                    self.send_error(501, str(e))
+                    return
+                try:
+                    await self.send_file_download(filename, download_name)
+                finally:
+                    os.remove(filename)
+            elif path.startswith('/tests/') and stream_format:
+                from backend.setup_db import iter_test_rows
+
+                try:
+                    test_number = int(path.split('/')[-1])
+                except ValueError:
+                    self.send_error(400, "Invalid test number")
+                    return
+                # после send_stream ответ уже начат, ошибку не отдать
+                if await run_db(get_entry, test_number) is None:
+                    self.send_error(404, "Test not found")
+                    return
+                await self.send_stream(
+                    iter_test_rows,
+                    test_number,
+                    query.get('type', [None])[0],
+                    stream_format=stream_format,
+                )
             elif path.startswith('/tests/'):
                 try:
                     from backend.setup_db import get_test_data
@@ -126,18 +277,22 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
                     data_type = query.get('type', [None])[0]
                     limit = int(query.get('limit', [100])[0])
                     page = int(query.get('page', [1])[0])
-                    result = get_test_data(test_number, data_type, limit, page)
+                    result = await run_db(
+                        get_test_data, test_number, data_type, limit, page
+                    )
                     self.send_json_response(result)
                 except ValueError:
                     self.send_error(400, "Invalid test number")
             else:
                 self.send_error(404, "File not found")
         except Exception as e:
+            if self.streaming:
+                raise
             print(f"Ошибка при обработке GET запроса: {e}")
             traceback.print_exc()
             self.send_error(500, "Internal server error")
 
-    def handle_uart_data(self, post_data=None):
+    async def handle_uart_data(self, post_data=None):
         """Обработка UART данных, приходящих через HTTP"""
         try:
             if post_data is None:
@@ -151,10 +306,7 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
                 return
 
             try:
-                data_str = post_data.decode('utf-8').strip()
-                print(f"RAW UART DATA: {data_str}")
-
-                data = json.loads(data_str)
+                data = json.loads(post_data.decode('utf-8').strip())
             except json.JSONDecodeError as e:
                 print(f"JSON decode error: {e}")
                 print(f"Raw data that failed to decode: {post_data}")
@@ -166,37 +318,28 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
                 )
                 return
 
-            print(f"RECEIVED UART DATA VIA HTTP: {data}")
+            logger.debug("Данные UART по HTTP: %s", data)
 
             if data.get('type') == 'sensor_data':
                 sensor_data = data.get('data', {})
-
-                global current_uart_data
-                current_uart_data.update(sensor_data)
-
-                try:
-                    from backend.setup_db import save_uart_sensor_data
-                    save_uart_sensor_data(sensor_data)
-                    print(f"UART sensor data saved to database: {sensor_data}")
-                except Exception as e:
-                    print(f"Error saving UART data to database: {e}")
-
-                global http_event_loop
-                if http_event_loop:
-                    asyncio.run_coroutine_threadsafe(
-                        send_to_all_websocket_clients(
-                            {'type': 'sensor_data', 'data': sensor_data}
-                        ),
-                        http_event_loop,
-                    )
-                    print(
-                        f"UART data sent to WebSocket clients: {sensor_data}"
-                    )
+                await ingest_sensor_frames(
+                    [{'timestamp': data.get('timestamp'), 'data': sensor_data}]
+                )
 
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({'status': 'success'}).encode())
+            elif data.get('type') == 'sensor_batch':
+                frames = data.get('data', [])
+                await ingest_sensor_frames(frames)
+
+                self.send_response(200)
+                self.send_header('Content-type', 'application/json')
+                self.end_headers()
+                self.wfile.write(
+                    json.dumps({'status': 'success', 'count': len(frames)}).encode()
+                )
             else:
                 print(f"Unknown data type: {data.get('type')}")
                 self.send_response(400)
@@ -208,7 +351,7 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
             self.send_response(500)
             self.end_headers()
 
-    def do_POST(self):
+    async def do_POST(self):
         """Обработка POST запросов для сохранения данных в БД"""
         try:
             content_length = int(self.headers['Content-Length'])
@@ -221,14 +364,23 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
                     data_content = data.get('data', {})
 
                     success = False
+                    active_test = test_lifecycle.active
                     if data_type == 'oscilloscope':
                         from backend.measurement import save_oscilloscope_data
 
-                        success = save_oscilloscope_data(data_content)
+                        success = await run_db(
+                            save_oscilloscope_data,
+                            data_content,
+                            active_test=active_test,
+                        )
                     elif data_type == 'multimeter':
                         from backend.measurement import save_multimeter_data
 
-                        success = save_multimeter_data(data_content)
+                        success = await run_db(
+                            save_multimeter_data,
+                            data_content,
+                            active_test=active_test,
+                        )
 
                     self.send_json_response({'success': success})
                 except json.JSONDecodeError:
@@ -240,7 +392,7 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
                     self.send_error(500, "Internal server error")
 
             elif self.path == '/uart-data':
-                self.handle_uart_data(post_data)
+                await self.handle_uart_data(post_data)
             else:
                 self.send_error(404, "Endpoint not found")
 
@@ -260,16 +412,108 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
             print(f"Ошибка при отправке JSON ответа: {e}")
             self.send_error(500, "Internal server error")
 
+    def send_metrics(self):
+        """Метрики сервера в текстовом формате Prometheus"""
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    async def send_file_download(self, filename, download_name):
+        """Отдаёт файл с диска как вложение, читая его кусками в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header(
+            'Content-Disposition', f'attachment; filename="{download_name}"'
+        )
+        self.send_header('Content-Length', os.path.getsize(filename))
+        self.end_headers()
+        await self.start_chunked()
+        with open(filename, 'rb') as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await self.write_chunk(chunk)
+        await self.end_chunked()
+
+    def get_page_cursors(self, query):
+        """Курсоры постраничного просмотра ?before_id= / ?after_id="""
+        cursors = {}
+        for name in ('before_id', 'after_id'):
+            value = query.get(name, [None])[0]
+            if value:
+                cursors[name] = int(value)
+        return cursors
+
+    def get_stream_format(self, query):
+        """Формат потоковой выдачи из ?stream=ndjson|json или заголовка
+        Accept: application/x-ndjson; None — обычный ответ с пагинацией"""
+        stream_format = query.get('stream', [None])[0]
+        if stream_format in STREAM_FORMATS:
+            return stream_format
+        if 'application/x-ndjson' in self.headers.get('Accept', ''):
+            return 'ndjson'
+        return None
+
+    async def send_stream(self, rows_factory, *args, stream_format='ndjson'):
+        """Отдаёт записи rows_factory(*args) потоком chunked-ответа. Запрос к
+        БД и кодирование идут в пуле потоков, первые байты уходят клиенту
+        сразу, а память не зависит от размера выборки."""
+        self.send_response(200)
+        self.send_header(
+            'Content-Type', f'{STREAM_FORMATS[stream_format]}; charset=utf-8'
+        )
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        await self.start_chunked()
+
+        def produce():
+            return encode_rows(rows_factory(*args), stream_format)
+
+        async with contextlib.aclosing(iterate_in_thread(produce)) as chunks:
+            async for chunk in chunks:
+                await self.write_chunk(chunk)
+        await self.end_chunked()
+
     def serve_file(self, filename, content_type):
+        """Отдаёт файл фронтенда из кэша в памяти: ETag/Last-Modified,
+        ответ 304 и сжатый вариант по Accept-Encoding"""
         try:
-            with open(filename, 'rb') as f:
-                content = f.read()
+            asset = static_cache.get(filename, content_type)
+            if asset is None:
+                self.send_error(404, "File not found")
+                return
+
+            if static_cache.dev_mode or content_type == 'text/html':
+                cache_control = 'no-cache'
+            else:
+                cache_control = f'public, max-age={STATIC_MAX_AGE}'
+
+            if asset.is_not_modified(self.headers):
+                self.send_response(304)
+                self.send_header('ETag', asset.etag)
+                self.send_header('Cache-Control', cache_control)
+                self.end_headers()
+                return
+
+            encoding, body = asset.select_encoding(
+                self.headers.get('Accept-Encoding')
+            )
             self.send_response(200)
             self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+            self.send_header('ETag', asset.etag)
+            self.send_header('Last-Modified', asset.last_modified)
+            self.send_header('Cache-Control', cache_control)
+            if asset.encodings:
+                self.send_header('Vary', 'Accept-Encoding')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
             self.end_headers()
-            self.wfile.write(content)
-        except FileNotFoundError:
-            self.send_error(404, "File not found")
+            self.wfile.write(body)
         except Exception as e:
             print(f"Ошибка при отправке файла {filename}: {e}")
             self.send_error(500, "Internal server error")
@@ -288,6 +532,3 @@ class CustomHTTPRequestHandler(BaseHTTPRequestHandler):
         except Exception as e:
             print(f"Error getting UART data: {e}")
             self.send_error(500)
-
-    def log_message(self, format, *args):
-        pass
@@ -0,0 +1,258 @@
+import asyncio
+import email.parser
+import io
+import traceback
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import HTTPMessage
+
+MAX_REQUEST_LINE = 64 * 1024
+MAX_HEADERS = 100
+MAX_BODY_SIZE = 64 * 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 60
+
+DEFAULT_ERROR_MESSAGE = '''
+<html>
+    <head>
+        <meta charset="utf-8">
+        <title>Error %(code)d</title>
+    </head>
+    <body>
+        <h1>Error %(code)d</h1>
+        <p>%(message)s</p>
+    </body>
+</html>
+'''
+
+
+class AsyncHTTPRequestHandler:
+    """HTTP/1.1 обработчик для asyncio с тем же интерфейсом, что у
+    http.server.BaseHTTPRequestHandler: do_GET/do_POST (здесь корутины),
+    send_response, send_header, end_headers, send_error, rfile и wfile.
+
+    Тело ответа копится в wfile и уходит одним куском с Content-Length,
+    поэтому соединение остаётся keep-alive. Большие ответы можно отдавать
+    по частям: start_chunked(), write_chunk(), end_chunked().
+    """
+
+    server_version = 'StandHTTP/1.0'
+    protocol_version = 'HTTP/1.1'
+    error_message_format = DEFAULT_ERROR_MESSAGE
+    error_content_type = 'text/html;charset=utf-8'
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.client_address = writer.get_extra_info('peername')
+        self.close_connection = False
+        self.command = None
+        self.path = None
+        self.request_version = None
+        self.headers = HTTPMessage()
+        self.rfile = io.BytesIO()
+        self._reset_response()
+
+    def _reset_response(self):
+        self.status = None
+        self.response_headers = []
+        self.wfile = io.BytesIO()
+        self.streaming = False
+        self.chunked = False
+        self.sized = False
+        self.stream_complete = False
+
+    async def handle_one_request(self):
+        """Читает и обрабатывает один запрос. Возвращает False, если
+        соединение нужно закрыть"""
+        try:
+            request_line = await asyncio.wait_for(
+                self.reader.readline(), KEEP_ALIVE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            return False
+        if not request_line:
+            return False
+        if len(request_line) > MAX_REQUEST_LINE:
+            self.send_error(414)
+            await self.finish_response()
+            return False
+
+        words = request_line.decode('iso-8859-1').rstrip('\r\n').split()
+        if len(words) != 3:
+            self.close_connection = True
+            self.send_error(400, "Bad request syntax")
+            await self.finish_response()
+            return False
+        self.command, self.path, self.request_version = words
+        if self.request_version != 'HTTP/1.1':
+            self.close_connection = True
+
+        header_lines = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line.decode('iso-8859-1'))
+            if len(header_lines) > MAX_HEADERS:
+                self.close_connection = True
+                self.send_error(431)
+                await self.finish_response()
+                return False
+        self.headers = email.parser.Parser(_class=HTTPMessage).parsestr(
+            ''.join(header_lines)
+        )
+
+        connection = self.headers.get('Connection', '').lower()
+        if connection == 'close':
+            self.close_connection = True
+        elif connection == 'keep-alive':
+            self.close_connection = False
+
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if content_length > MAX_BODY_SIZE:
+            self.close_connection = True
+            self.send_error(413)
+            await self.finish_response()
+            return False
+        if content_length:
+            if self.headers.get('Expect', '').lower() == '100-continue':
+                self.writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            self.rfile = io.BytesIO(
+                await self.reader.readexactly(content_length)
+            )
+
+        method = getattr(self, 'do_' + self.command, None)
+        if method is None:
+            self.send_error(501, f"Unsupported method ({self.command})")
+        else:
+            try:
+                await method()
+            except ConnectionError:
+                raise
+            except Exception as e:
+                print(f"Ошибка обработки HTTP запроса {self.command} {self.path}: {e}")
+                traceback.print_exc()
+                if self.streaming:
+                    # заголовки уже ушли, клиент увидит оборванный ответ
+                    self.close_connection = True
+                else:
+                    self.send_error(500, "Internal server error")
+        await self.finish_response()
+        return not self.close_connection
+
+    def send_response(self, code, message=None):
+        self._reset_response()
+        if message is None:
+            try:
+                message = HTTPStatus(code).phrase
+            except ValueError:
+                message = ''
+        self.status = (code, message)
+        self.send_header('Server', self.server_version)
+        self.send_header('Date', formatdate(usegmt=True))
+
+    def send_header(self, keyword, value):
+        self.response_headers.append((keyword, str(value)))
+        if keyword.lower() == 'connection' and str(value).lower() == 'close':
+            self.close_connection = True
+
+    def end_headers(self):
+        pass
+
+    def send_error(self, code, message=None):
+        try:
+            explain = HTTPStatus(code).phrase
+        except ValueError:
+            explain = ''
+        self.send_response(code, message)
+        body = (
+            self.error_message_format
+            % {'code': code, 'message': message or explain}
+        ).encode('utf-8', 'replace')
+        self.send_header('Content-Type', self.error_content_type)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _build_head(self, extra_headers):
+        code, message = self.status
+        lines = [f"{self.protocol_version} {code} {message}"]
+        names = set()
+        for keyword, value in self.response_headers + extra_headers:
+            lines.append(f"{keyword}: {value}")
+            names.add(keyword.lower())
+        if self.close_connection and 'connection' not in names:
+            lines.append('Connection: close')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace')
+
+    async def finish_response(self):
+        if self.streaming:
+            if not (self.stream_complete and (self.chunked or self.sized)):
+                self.close_connection = True
+            return
+        if self.status is None:
+            self.send_error(500, "No response")
+        body = self.wfile.getvalue()
+        extra_headers = []
+        names = {keyword.lower() for keyword, _ in self.response_headers}
+        if 'content-length' not in names and self.status[0] not in (204, 304):
+            extra_headers.append(('Content-Length', len(body)))
+        head = self._build_head(extra_headers)
+        self.writer.write(head + body if self.command != 'HEAD' else head)
+        await self.writer.drain()
+
+    async def start_chunked(self):
+        """Отправляет статус и заголовки, после чего тело пишется частями
+        через write_chunk(). Если Content-Length уже задан, тело уходит как
+        есть; клиентам HTTP/1.0 без длины конец ответа обозначается
+        закрытием соединения."""
+        if self.status is None:
+            self.send_response(200)
+        self.streaming = True
+        extra_headers = []
+        names = {keyword.lower() for keyword, _ in self.response_headers}
+        if 'content-length' in names:
+            # длина известна заранее: тело идёт как есть, без разметки
+            self.sized = True
+        elif self.request_version == 'HTTP/1.1':
+            self.chunked = True
+            extra_headers.append(('Transfer-Encoding', 'chunked'))
+        else:
+            self.close_connection = True
+        self.writer.write(self._build_head(extra_headers))
+        await self.writer.drain()
+
+    async def write_chunk(self, data):
+        if not data or self.command == 'HEAD':
+            return
+        if self.chunked:
+            self.writer.write(b'%x\r\n' % len(data) + data + b'\r\n')
+        else:
+            self.writer.write(data)
+        await self.writer.drain()
+
+    async def end_chunked(self):
+        if self.chunked and self.command != 'HEAD':
+            self.writer.write(b'0\r\n\r\n')
+            await self.writer.drain()
+        self.stream_complete = True
+
+
+async def serve_http(handler_class, host, port):
+    """Запускает HTTP-сервер в текущем цикле событий; каждое соединение
+    обслуживается своей задачей, поэтому запросы идут параллельно"""
+
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                handler = handler_class(reader, writer)
+                if not await handler.handle_one_request():
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Ошибка HTTP соединения: {e}")
+            traceback.print_exc()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
@@ -0,0 +1,229 @@
+"""
+Очередь запусков испытаний.
+
+Раньше действие run_lua выполнялось прямо в цикле сообщений клиента: пока
+скрипт шёл, этот клиент не мог ничего отправить (даже остановку), а два
+клиента могли одновременно запустить сценарии на одних и тех же приборах.
+
+Теперь запуск — задание (Job) в очереди планировщика. Задание заявляет
+приборы, которые ему нужны ('oscilloscope', 'multimeter', 'uart'), и
+стартует, когда все они свободны. Задания на непересекающихся приборах идут
+параллельно; очередь обслуживается по порядку: задание не обгоняет более
+раннее, которому нужен тот же прибор.
+
+Отмена снимает задание из очереди или останавливает идущее: группе
+процессов скрипта отправляется SIGTERM (через JOB_KILL_GRACE — SIGKILL), а
+задача asyncio отменяется. Состояние каждого задания рассылается владельцу
+и клиентам, подписанным на задания (subscribe_jobs).
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import signal
+
+from backend.send_websocket import is_websocket_open
+from backend.timestamps import now_ns
+
+INSTRUMENTS = ('oscilloscope', 'multimeter', 'uart')
+JOB_KILL_GRACE = 3.0
+JOB_HISTORY_LIMIT = 50
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+JOB_FINISHED = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+_job_ids = itertools.count(1)
+
+
+class Job:
+    """Задание: runner(job) — корутина, выполняющая запуск"""
+
+    def __init__(self, kind, script, instruments, runner, owner=None):
+        unknown = set(instruments) - set(INSTRUMENTS)
+        if unknown:
+            names = ', '.join(sorted(unknown))
+            raise ValueError(f"Неизвестные приборы: {names}")
+        self.id = next(_job_ids)
+        self.kind = kind
+        self.script = script
+        self.instruments = frozenset(instruments)
+        self.runner = runner
+        self.owner = owner
+        self.state = JOB_QUEUED
+        self.error = None
+        self.result = None
+        self.test_number = None
+        self.process = None
+        self.task = None
+        self.cancel_requested = False
+        self.created_ns = now_ns()
+        self.started_ns = None
+        self.finished_ns = None
+
+    def attach_process(self, process):
+        """Запоминает процесс скрипта, чтобы отмена могла убить его группу"""
+        self.process = process
+
+    def kill_process(self, sig=signal.SIGTERM):
+        process = self.process
+        if process is None or process.returncode is not None:
+            return False
+        try:
+            os.killpg(os.getpgid(process.pid), sig)
+        except ProcessLookupError:
+            return False
+        return True
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'script': self.script,
+            'instruments': sorted(self.instruments),
+            'state': self.state,
+            'error': self.error,
+            'result': self.result,
+            'test_number': self.test_number,
+            'created_ns': self.created_ns,
+            'started_ns': self.started_ns,
+            'finished_ns': self.finished_ns,
+        }
+
+
+class JobScheduler:
+    def __init__(self):
+        self.queue = []
+        self.running = {}
+        self.busy = {}
+        self.history = []
+        self.subscribers = set()
+
+    def subscribe(self, websocket):
+        self.subscribers.add(websocket)
+
+    def unsubscribe(self, websocket):
+        self.subscribers.discard(websocket)
+
+    def get(self, job_id):
+        jobs = itertools.chain(self.queue, self.running.values(), self.history)
+        for job in jobs:
+            if job.id == job_id:
+                return job
+        return None
+
+    def jobs(self):
+        jobs = itertools.chain(self.history, self.running.values(), self.queue)
+        return [job.to_dict() for job in jobs]
+
+    def active_jobs(self, owner=None):
+        return [
+            job
+            for job in itertools.chain(self.running.values(), self.queue)
+            if owner is None or job.owner is owner
+        ]
+
+    async def publish(self, job):
+        message = json.dumps({'type': 'job_status', 'job': job.to_dict()})
+        targets = set(self.subscribers)
+        if job.owner is not None:
+            targets.add(job.owner)
+        for websocket in targets:
+            if not is_websocket_open(websocket):
+                self.subscribers.discard(websocket)
+                continue
+            try:
+                await websocket.send(message)
+            except Exception as e:
+                print(f"Ошибка отправки состояния задания: {e}")
+
+    async def submit(self, job):
+        self.queue.append(job)
+        print(f"Задание #{job.id} ({job.script}) в очереди")
+        await self.publish(job)
+        self._schedule()
+        return job
+
+    def _schedule(self):
+        """Запускает задания из очереди, чьи приборы свободны. Приборы
+        задания, оставшегося в очереди, резервируются для него, чтобы более
+        поздние задания его не обгоняли"""
+        reserved = set(self.busy)
+        for job in list(self.queue):
+            if job.instruments & reserved:
+                reserved |= job.instruments
+                continue
+            self.queue.remove(job)
+            for instrument in job.instruments:
+                self.busy[instrument] = job.id
+            reserved |= job.instruments
+            self.running[job.id] = job
+            job.state = JOB_RUNNING
+            job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job):
+        job.started_ns = now_ns()
+        instruments = ', '.join(sorted(job.instruments)) or 'нет'
+        print(f"Задание #{job.id} запущено, приборы: {instruments}")
+        await self.publish(job)
+        try:
+            job.result = await job.runner(job)
+            # процесс, убитый отменой, может завершить runner без ошибки
+            if job.cancel_requested:
+                job.state = JOB_CANCELLED
+            else:
+                job.state = JOB_COMPLETED
+        except asyncio.CancelledError:
+            job.state = JOB_CANCELLED
+        except Exception as e:
+            print(f"Ошибка задания #{job.id}: {e}")
+            job.state = JOB_FAILED
+            job.error = str(e)
+        finally:
+            job.finished_ns = now_ns()
+            self.running.pop(job.id, None)
+            for instrument in job.instruments:
+                if self.busy.get(instrument) == job.id:
+                    del self.busy[instrument]
+            self.history.append(job)
+            del self.history[:-JOB_HISTORY_LIMIT]
+            print(f"Задание #{job.id}: {job.state}")
+            self._schedule()
+        await self.publish(job)
+
+    async def cancel(self, job_id):
+        """Снимает задание из очереди или останавливает идущее"""
+        job = self.get(job_id)
+        if job is None or job.state in JOB_FINISHED:
+            return False
+        if job.state == JOB_QUEUED:
+            self.queue.remove(job)
+            job.state = JOB_CANCELLED
+            job.finished_ns = now_ns()
+            self.history.append(job)
+            self._schedule()
+            await self.publish(job)
+            return True
+        job.cancel_requested = True
+        if job.kill_process(signal.SIGTERM):
+            try:
+                await asyncio.wait_for(job.process.wait(), JOB_KILL_GRACE)
+            except asyncio.TimeoutError:
+                job.kill_process(signal.SIGKILL)
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    async def shutdown(self):
+        for job in self.active_jobs():
+            await self.cancel(job.id)
+
+
+scheduler = JobScheduler()
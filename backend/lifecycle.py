@@ -0,0 +1,121 @@
+"""
+Жизненный цикл испытания.
+
+    idle --start--> running --stop--> completed
+                       |  \\--abort--> aborted
+                       \\--start--> (предыдущее completed) running
+
+Номер выделяется в каталоге одной транзакцией, файл испытания создаётся
+до переключения, а само переключение — замена одной ссылки active, поэтому
+запуск занимает миллисекунды и не требует остановки записи.
+
+Живые данные маршрутизирует слой сохранения: источник берёт снимок
+test_lifecycle.active в момент получения отсчёта и передаёт его в функции
+записи. Отсчёт, полученный до переключения, попадает в прежнее испытание,
+даже если записывается уже после него.
+"""
+
+import threading
+
+from backend.catalog import (allocate_test_number, set_test_status,
+                             test_file_path)
+from backend.timestamps import now_ns
+
+STATE_IDLE = 'idle'
+STATE_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_ABORTED = 'aborted'
+
+
+class ActiveTest:
+    """Неизменяемый снимок идущего испытания"""
+
+    __slots__ = ('number', 'tables', 'started_ns')
+
+    def __init__(self, number, tables, started_ns):
+        self.number = number
+        self.tables = tables
+        self.started_ns = started_ns
+
+    def table(self, kind):
+        return self.tables.get(kind)
+
+    def to_dict(self):
+        return {
+            'test_number': self.number,
+            'tables': dict(self.tables),
+            'started_ns': self.started_ns,
+            'path': test_file_path(self.number),
+        }
+
+
+class Lifecycle:
+    def __init__(self):
+        self._transition_lock = threading.Lock()
+        self.active = None
+
+    @property
+    def state(self):
+        return STATE_RUNNING if self.active else STATE_IDLE
+
+    @property
+    def test_number(self):
+        active = self.active
+        return active.number if active else None
+
+    def start(self):
+        """Начинает новое испытание; идущее завершается как completed.
+        Возвращает номер испытания или None при ошибке"""
+        from backend.setup_db import create_test_tables
+
+        with self._transition_lock:
+            test_number = allocate_test_number()
+            mult_table, osc_table, uart_table = create_test_tables(test_number)
+            if not (mult_table and osc_table and uart_table):
+                set_test_status(test_number, STATUS_ABORTED, now_ns())
+                print("Ошибка при создании таблиц испытания")
+                return None
+            set_test_status(test_number, STATE_RUNNING)
+            previous = self.active
+            self.active = ActiveTest(
+                test_number,
+                {
+                    'multimeter': mult_table,
+                    'oscilloscope': osc_table,
+                    'uart': uart_table,
+                },
+                now_ns(),
+            )
+            if previous:
+                set_test_status(previous.number, STATUS_COMPLETED, now_ns())
+                print(f"Испытание #{previous.number} завершено")
+        print(f"Начато новое испытание #{test_number}")
+        return test_number
+
+    def _finish(self, status):
+        with self._transition_lock:
+            previous = self.active
+            if previous is None:
+                return None
+            self.active = None
+            set_test_status(previous.number, status, now_ns())
+        print(f"Испытание #{previous.number}: {status}")
+        return previous.number
+
+    def stop(self):
+        """Завершает идущее испытание; None, если испытания нет"""
+        return self._finish(STATUS_COMPLETED)
+
+    def abort(self):
+        """Прерывает идущее испытание; данные остаются, статус aborted"""
+        return self._finish(STATUS_ABORTED)
+
+    def status(self):
+        active = self.active
+        result = {'state': self.state}
+        if active:
+            result.update(active.to_dict())
+        return result
+
+
+test_lifecycle = Lifecycle()
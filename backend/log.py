@@ -0,0 +1,149 @@
+"""
+Журнал сервера и мостов.
+
+Горячие пути раньше печатали каждое показание print'ом: запись в stdout
+(и дальше в journald) шла синхронно из цикла событий и при заполненном
+канале блокировала его. Теперь сообщения идут через logging:
+
+    from backend.log import get_logger
+
+    logger = get_logger('multimeter')
+    logger.debug("Показание: %s", measurement)            # ленивое форматирование
+    logger.debug("Пакет: %s", packet, extra={'sample': 100})  # каждое сотое
+    logger.info("Испытание %s", number, extra={'test_number': number})
+
+Запись в поток вывода выполняет отдельный поток (QueueHandler ->
+QueueListener): вызывающий код только кладёт запись в очередь, а при
+переполненной очереди запись отбрасывается и учитывается. Сообщения
+с одним шаблоном ограничены LOG_RATE_LIMIT в LOG_RATE_INTERVAL; число
+пропущенных попадает в поле suppressed следующей записи. Отключённый
+уровень стоит одной проверки isEnabledFor, аргументы не форматируются.
+
+Вывод — строка JSON на запись (ts, level, logger, msg и поля из extra)
+или обычный текст (LOG_FORMAT = 'text').
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+from backend.settings import (LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE,
+                              LOG_RATE_INTERVAL, LOG_RATE_LIMIT)
+
+ROOT_LOGGER = 'stand'
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# атрибуты LogRecord; всё остальное пришло из extra и попадает в JSON
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord('', 0, '', 0, '', (), None).__dict__
+) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key != 'sample':
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше limit записей с одним шаблоном за interval секунд;
+    extra={'sample': n} пропускает только каждую n-ю запись шаблона"""
+
+    def __init__(self, limit=LOG_RATE_LIMIT, interval=LOG_RATE_INTERVAL):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.lock = threading.Lock()
+        # (logger, шаблон) -> [начало окна, записей в окне, пропущено, всего]
+        self.windows = {}
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None:
+                window = self.windows[key] = [now, 0, 0, 0]
+            window[3] += 1
+            sample = getattr(record, 'sample', 1)
+            if sample > 1 and (window[3] - 1) % sample:
+                return False
+            if now - window[0] >= self.interval:
+                window[0] = now
+                window[1] = 0
+            if window[1] >= self.limit:
+                window[2] += 1
+                return False
+            window[1] += 1
+            if window[2]:
+                record.suppressed = window[2]
+                window[2] = 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не ждёт места в очереди"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Настраивает журнал 'stand' (повторный вызов заменяет настройки)"""
+    global _listener
+    shutdown_logging()
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RateLimitFilter())
+    root = logging.getLogger(ROOT_LOGGER)
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(
+        handler.queue, output, respect_handler_level=True
+    )
+    _listener.start()
+    return root
+
+
+def shutdown_logging():
+    """Дописывает очередь и останавливает поток вывода"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,428 @@
+"""
+Встроенная среда Lua (lupa) для сценариев.
+
+Внешний lua получает данные приборов только через io.popen: проверка
+модулей через python3 -c, ps aux | grep, запуск rigol_reader.py и ut803.py —
+каждый шаг сценария стоит процесса. Встроенная среда выполняет тот же
+скрипт внутри сервера (в отдельном потоке) и даёт ему таблицу stand с
+функциями сервера:
+
+    stand.log(...)                         строка в консоль сценария
+    stand.progress(source, done, total)
+    stand.sleep(seconds)
+    stand.oscilloscope_data()              все каналы, как get_oscilloscope_data
+    stand.get_channel_data(channel)        time, voltage одного канала
+    stand.read_multimeter()                следующее показание мультиметра
+    stand.read_serial(), stand.read_hid()  чтение UT803Reader (при общем
+                                           мультиметре — из опроса сервера)
+    stand.save_oscilloscope(data)          запись в текущее испытание
+    stand.save_multimeter(measurement)
+    stand.send_calibration(value)          калибровка UART
+
+Совместимость: print пишет в консоль сценария, os.execute("sleep N") и
+os.exit не трогают процесс сервера, а io.popen для rigol_reader.py и
+ut803.py выдаёт те же строки, что выдавали скрипты, но данные снимаются
+здесь же, на приборах сервера. Остальные команды выполняются настоящим
+io.popen, так что существующие сценарии работают без изменений.
+
+Нужен пакет lupa (необязательная зависимость, requirements.txt); без него
+run_lua_embedded возвращает ошибку, сценарий можно запустить внешним lua.
+"""
+
+import asyncio
+import base64
+import os
+import shlex
+import threading
+import time
+
+try:
+    import lupa
+    from lupa import LuaRuntime
+except ImportError:
+    lupa = None
+    LuaRuntime = None
+
+# проверка отмены раз в столько инструкций Lua
+CANCEL_CHECK_INSTRUCTIONS = 100000
+MULTIMETER_READ_TIMEOUT = 1.0
+
+# команды, которые сценарии запускали только для проверки окружения
+# сервера; во встроенной среде они заведомо выполнены
+_ENVIRONMENT_CHECKS = ('import hid', "grep 'python3 main.py'")
+
+_BOOTSTRAP = '''
+local stand, script_dir, check_every = ...
+_G.stand = stand
+local original_popen = io.popen
+local original_execute = os.execute
+
+package.path = script_dir .. '/?.lua;' .. package.path
+
+print = function(...)
+    local parts = {}
+    for i = 1, select('#', ...) do
+        parts[#parts + 1] = tostring(select(i, ...))
+    end
+    stand.log(table.concat(parts, '\\t'))
+end
+
+io.popen = function(cmd, mode)
+    local handle = stand.popen(cmd)
+    if handle then
+        return handle
+    end
+    return original_popen(cmd, mode)
+end
+
+os.execute = function(cmd)
+    local seconds = tonumber(string.match(cmd or '', '^%s*sleep%s+([%d.]+)%s*$'))
+    if seconds then
+        stand.sleep(seconds)
+        return true, 'exit', 0
+    end
+    return original_execute(cmd)
+end
+
+os.exit = function(code)
+    stand.exit(code)
+end
+
+debug.sethook(function() stand.check() end, '', check_every)
+'''
+
+
+def _public_attributes(obj, attr_name, is_setting):
+    """Скрипту доступны только публичные функции stand, без записи"""
+    if is_setting or attr_name.startswith('_'):
+        raise AttributeError(f"Доступ к {attr_name} из Lua запрещён")
+    return attr_name
+
+
+class LuaExit(Exception):
+    def __init__(self, code):
+        super().__init__(f"os.exit({code})")
+        self.code = code
+
+
+class ScenarioCancelled(Exception):
+    pass
+
+
+def _to_python(value):
+    """Таблица Lua в dict/list (последовательные ключи 1..n — list)"""
+    if lupa is None or lupa.lua_type(value) != 'table':
+        return value
+    items = {key: _to_python(item) for key, item in value.items()}
+    if items and all(isinstance(key, int) for key in items):
+        keys = sorted(items)
+        if keys == list(range(1, len(keys) + 1)):
+            return [items[key] for key in keys]
+    return items
+
+
+def _to_lua(lua, value):
+    if isinstance(value, dict):
+        return lua.table_from(
+            {key: _to_lua(lua, item) for key, item in value.items()}
+        )
+    if isinstance(value, (list, tuple)):
+        return lua.table_from([_to_lua(lua, item) for item in value])
+    if hasattr(value, 'tolist'):
+        return _to_lua(lua, value.tolist())
+    return value
+
+
+def _human_readable(measurement):
+    """Строка показания в формате UT803Reader.decode_ut803_data"""
+    if not measurement:
+        return None
+    value = measurement.get('value')
+    if (measurement.get('raw_data') or {}).get('is_overload'):
+        value = 'OL'
+    return (
+        f"[{measurement.get('timestamp')}] {value} {measurement.get('unit')} "
+        f"{measurement.get('mode')} {measurement.get('range_str')} "
+        f"[{measurement.get('measure_type')}]"
+    )
+
+
+class StandBindings:
+    """Функции, доступные скрипту как stand.*. Вызываются в потоке среды
+    Lua; корутины сервера выполняются в его цикле событий.
+
+    handle_event — корутина для событий (log, reading, waveform, ...), как у
+    канала событий; multimeter_queue — asyncio.Queue с показаниями опроса
+    сервера (если он держит мультиметр)."""
+
+    def __init__(
+        self,
+        loop,
+        handle_event,
+        visualizer=None,
+        multimeter=None,
+        multimeter_queue=None,
+        send_calibration=None,
+        active_test=None,
+    ):
+        self.loop = loop
+        self.handle_event = handle_event
+        self.visualizer = visualizer
+        self.multimeter = multimeter
+        self.multimeter_queue = multimeter_queue
+        self.send_calibration_value = send_calibration
+        self.active_test = active_test
+        self.cancelled = threading.Event()
+        self.cpu_time = 0.0
+        self.lua = None
+
+    def _call_async(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def _emit(self, event):
+        self._call_async(self.handle_event(event))
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise ScenarioCancelled("Сценарий остановлен")
+
+    def exit(self, code=0):
+        if code is True or code is None:
+            code = 0
+        elif code is False:
+            code = 1
+        raise LuaExit(int(code))
+
+    def log(self, line):
+        self.check()
+        self._emit({'event': 'log', 'line': str(line)})
+
+    def progress(self, source, done, total):
+        self._emit(
+            {'event': 'progress', 'source': source, 'done': done, 'total': total}
+        )
+
+    def sleep(self, seconds):
+        self.cancelled.wait(float(seconds))
+        self.check()
+
+    def oscilloscope_data(self):
+        self.check()
+        if self.visualizer is None:
+            data = {'error': "Осциллограф не инициализирован"}
+            return _to_lua(self.lua, data)
+        return _to_lua(self.lua, self.visualizer.read_oscilloscope_data())
+
+    def get_channel_data(self, channel):
+        self.check()
+        if self.visualizer is None:
+            return None, None
+        time_data, voltage_data = self.visualizer.get_channel_data(int(channel))
+        if time_data is None:
+            return None, None
+        return _to_lua(self.lua, time_data), _to_lua(self.lua, voltage_data)
+
+    def _read_shared_multimeter(self):
+        async def next_reading():
+            try:
+                return await asyncio.wait_for(
+                    self.multimeter_queue.get(), MULTIMETER_READ_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                return None
+
+        return self._call_async(next_reading())
+
+    def _read_multimeter(self):
+        if self.multimeter_queue is not None:
+            return self._read_shared_multimeter()
+        if self.multimeter is None:
+            return None
+        if self.multimeter.serial_port:
+            measurement, _ = self.multimeter.read_serial()
+        else:
+            measurement, _ = self.multimeter.read_hid()
+        return measurement
+
+    def _reading_event(self, measurement):
+        # показание из очереди опрос сервера уже разослал клиентам
+        return {
+            'event': 'reading',
+            'source': 'multimeter',
+            'data': measurement,
+            'shared': self.multimeter_queue is not None,
+        }
+
+    def _read_port(self, read):
+        """Порт держит опрос сервера, если мультиметр общий: тогда
+        показание берётся из очереди, а не читается из порта вторым
+        читателем"""
+        self.check()
+        if self.multimeter_queue is not None:
+            measurement = self._read_shared_multimeter()
+            return _to_lua(self.lua, measurement), _human_readable(measurement)
+        if self.multimeter is None:
+            return None, None
+        measurement, human_readable = read()
+        return _to_lua(self.lua, measurement), human_readable
+
+    def read_multimeter(self):
+        self.check()
+        return _to_lua(self.lua, self._read_multimeter())
+
+    def read_serial(self):
+        return self._read_port(lambda: self.multimeter.read_serial())
+
+    def read_hid(self):
+        return self._read_port(lambda: self.multimeter.read_hid())
+
+    def _save_oscilloscope(self, data):
+        from backend.measurement import save_oscilloscope_data
+
+        return save_oscilloscope_data(
+            data, force_save=True, active_test=self.active_test
+        )
+
+    def save_oscilloscope(self, data):
+        self.check()
+        return self._save_oscilloscope(_to_python(data))
+
+    def save_multimeter(self, measurement):
+        self.check()
+        self._emit(self._reading_event(_to_python(measurement)))
+        return True
+
+    def send_calibration(self, value):
+        self.check()
+        if self.send_calibration_value is None:
+            return False
+        self._call_async(self.send_calibration_value(float(value)))
+        return True
+
+    def _send_waveforms(self, data):
+        from backend.events import pack_float32
+
+        for channel, channel_data in data.get('channels', {}).items():
+            if 'voltage' not in channel_data:
+                continue
+            self._emit(
+                {
+                    'event': 'waveform',
+                    'channel': channel,
+                    'time': base64.b64encode(
+                        pack_float32(channel_data.get('time', []))
+                    ).decode('ascii'),
+                    'voltage': base64.b64encode(
+                        pack_float32(channel_data['voltage'])
+                    ).decode('ascii'),
+                    'color': channel_data.get('color'),
+                    'settings': channel_data.get('settings', {}),
+                }
+            )
+
+    def _oscilloscope_lines(self, samples, interval):
+        """Замена rigol_reader.py: те же строки, данные с прибора сервера"""
+        for i in range(samples):
+            started = time.monotonic()
+            yield f"Получение выборки {i + 1}/{samples}"
+            self.check()
+            if self.visualizer is None:
+                yield "Осциллограф не инициализирован"
+                return
+            data = self.visualizer.read_oscilloscope_data()
+            if 'error' in data:
+                yield f"Ошибка получения данных: {data['error']}"
+            else:
+                if self._save_oscilloscope(data):
+                    yield "Данные успешно сохранены в БД напрямую"
+                self._send_waveforms(data)
+            delay = interval - (time.monotonic() - started)
+            if delay > 0:
+                self.sleep(delay)
+
+    def _multimeter_lines(self, measurement_time):
+        """Замена ut803.py: показание в строке на каждое измерение"""
+        deadline = time.monotonic() + measurement_time
+        while time.monotonic() < deadline:
+            self.check()
+            measurement = self._read_multimeter()
+            if measurement:
+                self._emit(self._reading_event(measurement))
+                yield (
+                    f"Measurement [{measurement.get('timestamp')}] "
+                    f"{measurement.get('value')} {measurement.get('unit')} "
+                    f"{measurement.get('mode', '')}"
+                )
+
+    def _handle(self, lines):
+        """Объект, похожий на файл io.popen: read('*l'/'*a') и close()"""
+        lines = iter(lines)
+
+        def read(handle, fmt='*l'):
+            if str(fmt).lstrip('*').startswith('a'):
+                return '\n'.join(lines)
+            return next(lines, None)
+
+        def close(handle):
+            return True, 'exit', 0
+
+        return self.lua.table_from({'read': read, 'close': close})
+
+    def popen(self, cmd):
+        """Команды, которые выполняются в сервере; None — настоящий popen"""
+        if any(check in cmd for check in _ENVIRONMENT_CHECKS):
+            return self._handle([])
+        try:
+            args = shlex.split(cmd)
+        except ValueError:
+            return None
+        names = [os.path.basename(arg) for arg in args]
+
+        def option(name, default, cast):
+            if name in args:
+                index = args.index(name)
+                if index + 1 < len(args):
+                    return cast(args[index + 1])
+            return default
+
+        if 'rigol_reader.py' in names:
+            return self._handle(
+                self._oscilloscope_lines(
+                    option('--samples', 10, int),
+                    option('--interval', 1.0, float),
+                )
+            )
+        if 'ut803.py' in names:
+            return self._handle(
+                self._multimeter_lines(option('--measurement_time', 10, float))
+            )
+        return None
+
+
+def run_lua_file(script_name, bindings):
+    """Выполняет скрипт во встроенной среде (блокирующий вызов, для потока).
+    Возвращает код завершения: 0, код os.exit или 1 при ошибке"""
+    if lupa is None:
+        raise RuntimeError("Для встроенной среды Lua нужен пакет lupa")
+    lua = LuaRuntime(
+        unpack_returned_tuples=True,
+        register_eval=False,
+        attribute_filter=_public_attributes,
+    )
+    bindings.lua = lua
+    script_dir = os.path.dirname(os.path.abspath(script_name))
+    lua.execute(_BOOTSTRAP, bindings, script_dir, CANCEL_CHECK_INSTRUCTIONS)
+    with open(script_name, encoding='utf-8') as f:
+        source = f.read()
+    try:
+        lua.execute(source)
+    except LuaExit as e:
+        return e.code
+    except lupa.LuaError as e:
+        # исключение Python внутри вызова stand.* приходит обёрнутым
+        if isinstance(e.__cause__, LuaExit):
+            return e.__cause__.code
+        if isinstance(e.__cause__, ScenarioCancelled):
+            raise e.__cause__
+        raise
+    return 0
@@ -1,14 +1,21 @@
+import json
 import traceback
 from datetime import datetime, timedelta
 
 import numpy as np
 from sqlalchemy import text
 
+from backend.catalog import session_for_table
 from backend.engine import *
-from backend.models import MultimeterData, OscilloscopeData
+from backend.log import get_logger
+from backend.models import (MULTIMETER_MODES, MULTIMETER_SI_UNITS,
+                            MULTIMETER_UNITS,
+                            MultimeterData, MultimeterMode, MultimeterRange,
+                            MultimeterUnit, OscilloscopeData)
+from backend.timestamps import ns_to_timestamp, timestamp_to_ns
+
+logger = get_logger('measurement')
 
-current_multimeter_table = None
-current_oscilloscope_table = None
 is_data_collection_active = False
 
 is_multimeter_collection_active = False
@@ -27,11 +34,59 @@ class Measurement:
         self.timestamp = timestamp
 
 
-def save_oscilloscope_data(data, force_save=False):
+def multimeter_numeric_fields(data):
+    """Числовые поля показаний мультиметра: значение в единицах СИ, признак
+    перегрузки (OL) и коды величины, режима и диапазона"""
+    unit = data.get('unit') or ''
+    unit_code, scale = MULTIMETER_UNITS.get(unit, (MultimeterUnit.UNKNOWN, 1.0))
+    raw_data = data.get('raw_data') or {}
+    if isinstance(raw_data, str):
+        try:
+            raw_data = json.loads(raw_data)
+        except ValueError:
+            raw_data = {}
+    value = str(data.get('value') or '').strip()
+    overload = bool(raw_data.get('is_overload')) or value.upper() == 'OL'
+    value_si = None
+    if not overload:
+        try:
+            value_si = float(value) * scale
+        except ValueError:
+            pass
+    return {
+        'value_si': value_si,
+        'overload': overload,
+        'unit_code': int(unit_code),
+        'mode_code': int(
+            MULTIMETER_MODES.get(data.get('mode'), MultimeterMode.UNKNOWN)
+        ),
+        'range_code': int(
+            MultimeterRange.AUTO
+            if data.get('range_str') == 'AUTO'
+            else MultimeterRange.MANUAL
+        ),
+    }
+
+
+def format_multimeter_value(value_si, overload, unit=''):
+    """Строка для отображения из хранимого значения в СИ и единицы прибора"""
+    if overload:
+        return 'OL'
+    if value_si is None:
+        return ''
+    scale = MULTIMETER_UNITS.get(unit or '', (None, 1.0))[1]
+    return f"{value_si / scale:.6f}".rstrip('0').rstrip('.')
+
+
+def save_oscilloscope_data(data, force_save=False, active_test=None):
+    """Сохраняет осциллограмму в рабочую таблицу и, если идёт испытание, в
+    его файл. active_test — снимок test_lifecycle.active на момент получения
+    данных; по умолчанию берётся текущий"""
     from backend.setup_db import save_oscilloscope_data_to_test
+    from backend.lifecycle import test_lifecycle
 
-    global is_data_collection_active, current_oscilloscope_table
-    if not is_data_collection_active and not force_save:
+    active_test = active_test or test_lifecycle.active
+    if not is_data_collection_active and not force_save and not active_test:
         return True
     session = Session()
     try:
@@ -58,9 +113,9 @@ def save_oscilloscope_data(data, force_save=False):
                     )
                     session.add(db_record)
         session.commit()
-        print("Данные осциллографа сохранены в рабочую таблицу")
-        if current_oscilloscope_table:
-            save_oscilloscope_data_to_test(data, current_oscilloscope_table)
+        logger.debug("Данные осциллографа сохранены в рабочую таблицу")
+        if active_test:
+            save_oscilloscope_data_to_test(data, active_test.table('oscilloscope'))
         return True
     except Exception as e:
         session.rollback()
@@ -71,11 +126,14 @@ def save_oscilloscope_data(data, force_save=False):
         session.close()
 
 
-def save_multimeter_data(data, force_save=False):
+def save_multimeter_data(data, force_save=False, active_test=None):
+    """Сохраняет показание мультиметра в рабочую таблицу и в файл идущего
+    испытания (см. save_oscilloscope_data)"""
     from backend.setup_db import save_multimeter_data_to_test
+    from backend.lifecycle import test_lifecycle
 
-    global is_multimeter_collection_active, current_multimeter_table
-    if not is_multimeter_collection_active and not force_save:
+    active_test = active_test or test_lifecycle.active
+    if not is_multimeter_collection_active and not force_save and not active_test:
         return True
     session = Session()
     try:
@@ -87,12 +145,13 @@ def save_multimeter_data(data, force_save=False):
             range_str=data.get('range_str', ''),
             measure_type=data.get('measure_type', ''),
             raw_data=data.get('raw_data', {}),
+            **multimeter_numeric_fields(data),
         )
         session.add(db_record)
         session.commit()
-        print("Данные мультиметра сохранены в рабочую таблицу")
-        if current_multimeter_table:
-            save_multimeter_data_to_test(data, current_multimeter_table)
+        logger.debug("Данные мультиметра сохранены в рабочую таблицу")
+        if active_test:
+            save_multimeter_data_to_test(data, active_test.table('multimeter'))
         return True
     except Exception as e:
         session.rollback()
@@ -107,8 +166,8 @@ def save_uart_data(data):
     session = Session()
     try:
         insert_sql = """
-        INSERT INTO uart (timestamp, start_byte, command, status, payload_len, payload, crc_one, crc_two)
-        VALUES (:timestamp, :start_byte, :command, :status, :payload_len, :payload, :crc_one, :crc_two)
+        INSERT INTO uart_data (timestamp, start_byte, command, status, payload_len, payload, crc_one, crc_two, data_type)
+        VALUES (:timestamp, :start_byte, :command, :status, :payload_len, :payload, :crc_one, :crc_two, 'raw_packet')
         """
         session.execute(
             text(insert_sql),
@@ -124,7 +183,7 @@ def save_uart_data(data):
             },
         )
         session.commit()
-        print("Данные UART сохранены в рабочую таблицу")
+        logger.debug("Данные UART сохранены в рабочую таблицу")
         return True
     except Exception as e:
         session.rollback()
@@ -293,11 +352,10 @@ def get_oscilloscope_history(period='hour'):
                 start_time = now - timedelta(weeks=1)
             else:
                 start_time = now - timedelta(hours=1)
-            start_time_str = start_time.strftime("%Y-%m-%d %H:%M:%S")
             results = (
                 session.query(OscilloscopeData)
-                .filter(OscilloscopeData.timestamp >= start_time_str)
-                .order_by(OscilloscopeData.id.asc())
+                .filter(OscilloscopeData.ts_ns >= timestamp_to_ns(start_time))
+                .order_by(OscilloscopeData.ts_ns.asc())
                 .all()
             )
             timestamps = []
@@ -324,44 +382,45 @@ def get_oscilloscope_history(period='hour'):
         session.close()
 
 
+def _period_start(period):
+    now = datetime.now()
+    if period == 'day':
+        return now - timedelta(days=1)
+    if period == 'week':
+        return now - timedelta(weeks=1)
+    return now - timedelta(hours=1)
+
+
+def _unit_scale(unit):
+    return MULTIMETER_UNITS.get(unit or '', (None, 1.0))[1]
+
+
+def _multimeter_table(test_number=None):
+    if test_number is None:
+        return MultimeterData.__tablename__
+    return f"мультиметр_{int(test_number)}"
+
+
 def get_multimeter_history(period='hour'):
     """Возвращает исторические данные мультиметра для графика"""
     session = Session()
     try:
-        now = datetime.now()
-        if period == 'hour':
-            start_time = now - timedelta(hours=1)
-        elif period == 'day':
-            start_time = now - timedelta(days=1)
-        elif period == 'week':
-            start_time = now - timedelta(weeks=1)
-        else:
-            start_time = now - timedelta(hours=1)
-
-        start_time_str = start_time.strftime("%Y-%m-%d %H:%M:%S")
-
-        results = (
-            session.query(MultimeterData)
-            .filter(MultimeterData.timestamp >= start_time_str)
-            .order_by(MultimeterData.timestamp.asc())
-            .all()
+        results = session.execute(
+            text(
+                f'SELECT timestamp, value_si, unit, raw_data FROM "{MultimeterData.__tablename__}" '
+                "WHERE ts_ns >= :start AND value_si IS NOT NULL ORDER BY ts_ns"
+            ),
+            {'start': timestamp_to_ns(_period_start(period))},
         )
 
         timestamps = []
         values = []
         raw_data_list = []
 
-        for row in results:
-            try:
-                value = float(row.value) if row.value != 'OL' else None
-                if value is not None:
-                    timestamps.append(row.timestamp)
-                    values.append(value)
-                    raw_data_list.append(
-                        row.raw_data if row.raw_data else None
-                    )
-            except (ValueError, TypeError):
-                continue
+        for timestamp, value_si, unit, raw_data in results:
+            timestamps.append(timestamp)
+            values.append(value_si / _unit_scale(unit))
+            raw_data_list.append(json.loads(raw_data) if raw_data else None)
 
         if not timestamps:
             print("Нет данных мультиметра в БД за указанный период")
@@ -379,3 +438,80 @@ def get_multimeter_history(period='hour'):
         return {'timestamps': [], 'values': [], 'raw_data': []}
     finally:
         session.close()
+
+
+def _aggregate_row(row):
+    """Сводка по величине (unit_code): показания в mV и V одной величины
+    попадают в одну строку, значения — в единице СИ величины"""
+    return {
+        'unit': MULTIMETER_SI_UNITS.get(row['unit_code'], ''),
+        'unit_code': row['unit_code'],
+        'avg': row['avg_si'],
+        'min': row['min_si'],
+        'max': row['max_si'],
+        'avg_si': row['avg_si'],
+        'min_si': row['min_si'],
+        'max_si': row['max_si'],
+        'count': row['count'],
+        'overloads': row['overloads'] or 0,
+    }
+
+
+def get_multimeter_stats(test_number=None, period=None):
+    """AVG/MIN/MAX показаний мультиметра по каждой величине.
+    Считается в SQL по числовой колонке value_si"""
+    session = session_for_table(_multimeter_table(test_number))
+    try:
+        sql = (
+            "SELECT unit_code, AVG(value_si) AS avg_si, MIN(value_si) AS min_si, "
+            "MAX(value_si) AS max_si, COUNT(value_si) AS count, "
+            f'SUM(overload) AS overloads FROM "{_multimeter_table(test_number)}"'
+        )
+        params = {}
+        if period:
+            sql += " WHERE ts_ns >= :start"
+            params['start'] = timestamp_to_ns(_period_start(period))
+        sql += " GROUP BY unit_code ORDER BY unit_code"
+        result = session.execute(text(sql), params).mappings()
+        return {'units': [_aggregate_row(row) for row in result]}
+    except Exception as e:
+        print(f"Ошибка расчёта статистики мультиметра: {e}")
+        traceback.print_exc()
+        return {'units': []}
+    finally:
+        session.close()
+
+
+def get_multimeter_rollup(period='hour', bucket_seconds=60, test_number=None):
+    """Свёртка показаний мультиметра по интервалам bucket_seconds:
+    AVG/MIN/MAX и число точек в каждом интервале, считается в SQL"""
+    session = session_for_table(_multimeter_table(test_number))
+    try:
+        bucket_seconds = max(1, int(bucket_seconds))
+        sql = (
+            "SELECT ts_ns / :bucket_ns AS bucket, "
+            "unit_code, AVG(value_si) AS avg_si, MIN(value_si) AS min_si, "
+            "MAX(value_si) AS max_si, COUNT(value_si) AS count, "
+            f'SUM(overload) AS overloads FROM "{_multimeter_table(test_number)}"'
+        )
+        params = {'bucket_ns': bucket_seconds * 1_000_000_000, 'start': 1}
+        if period and test_number is None:
+            params['start'] = timestamp_to_ns(_period_start(period))
+        sql += " WHERE ts_ns >= :start"
+        sql += " GROUP BY bucket, unit_code ORDER BY bucket"
+        buckets = []
+        for row in session.execute(text(sql), params).mappings():
+            if row['bucket'] is None:
+                continue
+            item = _aggregate_row(row)
+            item['timestamp'] = ns_to_timestamp(
+                row['bucket'] * bucket_seconds * 1_000_000_000
+            )
+            buckets.append(item)
+        return {'bucket_seconds': bucket_seconds, 'buckets': buckets}
+    except Exception as e:
+        print(f"Ошибка свёртки данных мультиметра: {e}")
+        traceback.print_exc()
+        return {'bucket_seconds': bucket_seconds, 'buckets': []}
+    finally:
+        session.close()
@@ -0,0 +1,271 @@
+"""
+Метрики горячих путей: счётчики, величины и гистограммы.
+
+    from backend.metrics import counter, histogram
+
+    FRAMES = counter('oscilloscope_frames_total', 'Снятые кадры осциллографа')
+    FRAMES.inc()
+    with histogram('visa_seconds', 'Время обмена VISA').time(op='waveform'):
+        ...
+
+Метки передаются именованными аргументами. Экспорт: текстовый формат
+Prometheus (render_prometheus, маршрут /metrics) и словарь snapshot() со
+скоростями за интервал для темы stats WebSocket. Значения, которые дешевле
+посчитать в момент чтения (размер очередей клиентов), дают сборщики,
+зарегистрированные через register_collector.
+
+Записи защищены блокировкой: метрики пишутся и из цикла событий, и из
+потоков (db_executor, опрос приборов).
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# разбор пакетов и подобные операции в микросекундах
+FAST_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01,
+)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+STATS_INTERVAL = 1.0
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help = help_text
+        self.lock = lock
+        self.values = {}
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+    def snapshot(self):
+        return {_format_labels(key): value for key, value in self.values.items()}
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        """Удаляет все серии (например, отключившихся клиентов)"""
+        with self.lock:
+            self.values.clear()
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+    def snapshot(self):
+        return {_format_labels(key): value for key, value in self.values.items()}
+
+
+class _HistogramValue:
+    __slots__ = ('counts', 'sum', 'count', 'max')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, lock, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            item = self.values.get(key)
+            if item is None:
+                item = self.values[key] = _HistogramValue(len(self.buckets) + 1)
+            item.counts[index] += 1
+            item.sum += value
+            item.count += 1
+            item.max = max(item.max, value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        for key, item in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), item.counts):
+                cumulative += count
+                labels = key + (('le', _format_value(bound)),)
+                result.append((f'{self.name}_bucket', labels, cumulative))
+            result.append((f'{self.name}_sum', key, item.sum))
+            result.append((f'{self.name}_count', key, item.count))
+        return result
+
+    def quantile(self, item, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины)"""
+        if not item.count:
+            return 0.0
+        rank = q * item.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, item.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, item.max)
+        return item.max
+
+    def snapshot(self):
+        return {
+            _format_labels(key): {
+                'count': item.count,
+                'avg': item.sum / item.count if item.count else 0.0,
+                'p50': self.quantile(item, 0.5),
+                'p99': self.quantile(item, 0.99),
+                'max': item.max,
+            }
+            for key, item in self.values.items()
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        self._last_counters = {}
+        self._last_time = None
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, self.lock, **kwargs)
+                self.metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError(f"Метрика {name} уже зарегистрирована как {metric.kind}")
+        return metric
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def register_collector(self, collector):
+        """collector() вызывается при каждом чтении метрик (обычно для
+        обновления величин, которые хранятся вне реестра)"""
+        self.collectors.append(collector)
+
+    def _collect(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Ошибка сборщика метрик: {e}")
+
+    def render_prometheus(self):
+        self._collect()
+        lines = []
+        with self.lock:
+            for metric in self.metrics.values():
+                lines.extend(metric.header())
+                for name, key, value in metric.samples():
+                    labels = _format_labels(key)
+                    lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Значения всех метрик и скорость счётчиков (в секунду) с прошлого
+        вызова snapshot"""
+        self._collect()
+        now = time.monotonic()
+        result = {}
+        rates = {}
+        with self.lock:
+            elapsed = now - self._last_time if self._last_time else None
+            for name, metric in self.metrics.items():
+                result[name] = metric.snapshot()
+                if isinstance(metric, Counter):
+                    for key, value in metric.values.items():
+                        series = name + _format_labels(key)
+                        previous = self._last_counters.get(series)
+                        if elapsed and previous is not None:
+                            rates[series] = (value - previous) / elapsed
+                        self._last_counters[series] = value
+            self._last_time = now
+        return {'metrics': result, 'rates': rates}
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+register_collector = REGISTRY.register_collector
+render_prometheus = REGISTRY.render_prometheus
+snapshot = REGISTRY.snapshot
@@ -1,13 +1,83 @@
-from sqlalchemy import JSON, Column, Integer, LargeBinary, String, Float
+import enum
+
+from sqlalchemy import (JSON, Boolean, Column, Float, Integer, LargeBinary,
+                        String, event)
 from sqlalchemy.dialects.sqlite import JSON
 
 from backend.engine import Base
+from backend.timestamps import now_ns, timestamp_to_ns
+
+
+class MultimeterUnit(enum.IntEnum):
+    """Величина показаний мультиметра; value_si хранится в её единице СИ"""
+
+    UNKNOWN = 0
+    VOLT = 1
+    AMPERE = 2
+    OHM = 3
+    HERTZ = 4
+    FARAD = 5
+    CELSIUS = 6
+    RATIO = 7
+
+
+class MultimeterMode(enum.IntEnum):
+    UNKNOWN = 0
+    DC = 1
+    AC = 2
+    TEMPERATURE = 3
+
+
+class MultimeterRange(enum.IntEnum):
+    MANUAL = 0
+    AUTO = 1
+
+
+# единица прибора -> (величина, множитель к СИ)
+MULTIMETER_UNITS = {
+    'V': (MultimeterUnit.VOLT, 1.0),
+    'mV': (MultimeterUnit.VOLT, 1e-3),
+    'A': (MultimeterUnit.AMPERE, 1.0),
+    'mA': (MultimeterUnit.AMPERE, 1e-3),
+    'µA': (MultimeterUnit.AMPERE, 1e-6),
+    'uA': (MultimeterUnit.AMPERE, 1e-6),
+    'Ω': (MultimeterUnit.OHM, 1.0),
+    'kΩ': (MultimeterUnit.OHM, 1e3),
+    'MΩ': (MultimeterUnit.OHM, 1e6),
+    'Hz': (MultimeterUnit.HERTZ, 1.0),
+    'kHz': (MultimeterUnit.HERTZ, 1e3),
+    'MHz': (MultimeterUnit.HERTZ, 1e6),
+    'nF': (MultimeterUnit.FARAD, 1e-9),
+    'µF': (MultimeterUnit.FARAD, 1e-6),
+    'uF': (MultimeterUnit.FARAD, 1e-6),
+    '°C': (MultimeterUnit.CELSIUS, 1.0),
+    '': (MultimeterUnit.RATIO, 1.0),
+}
+
+# величина -> единица СИ, в которой показываются сводки (статистика, свёртки)
+MULTIMETER_SI_UNITS = {
+    MultimeterUnit.UNKNOWN: '',
+    MultimeterUnit.VOLT: 'V',
+    MultimeterUnit.AMPERE: 'A',
+    MultimeterUnit.OHM: 'Ω',
+    MultimeterUnit.HERTZ: 'Hz',
+    MultimeterUnit.FARAD: 'F',
+    MultimeterUnit.CELSIUS: '°C',
+    MultimeterUnit.RATIO: '',
+}
+
+MULTIMETER_MODES = {
+    'DC': MultimeterMode.DC,
+    'AC': MultimeterMode.AC,
+    '°C': MultimeterMode.TEMPERATURE,
+}
 
 
 class OscilloscopeData(Base):
     __tablename__ = 'осциллограф'
     id = Column(Integer, primary_key=True)
     timestamp = Column(String)
+    ts_ns = Column(Integer, index=True)
     channel = Column(String)
     time_data = Column(String)
     voltage_data = Column(String)
@@ -18,6 +88,7 @@ class MultimeterData(Base):
     __tablename__ = 'мультиметр'
     id = Column(Integer, primary_key=True)
     timestamp = Column(String)
+    ts_ns = Column(Integer, index=True)
     value = Column(String)
     unit = Column(String)
     mode = Column(String)
@@ -25,11 +96,18 @@ class MultimeterData(Base):
     measure_type = Column(String)
     raw_data = Column(JSON)
 
+    value_si = Column(Float)
+    overload = Column(Boolean, default=False)
+    unit_code = Column(Integer)
+    mode_code = Column(Integer)
+    range_code = Column(Integer)
+
 
 class UARTData(Base):
     __tablename__ = 'uart_data'
     id = Column(Integer, primary_key=True)
     timestamp = Column(String)
+    ts_ns = Column(Integer, index=True)
     
     temp600_1 = Column(Float)
     temp600_2 = Column(Float)
@@ -50,4 +128,57 @@ class UARTData(Base):
     
     data_type = Column(String)
     raw_data = Column(JSON)
-    test_number = Column(Integer, nullable=True)
\ No newline at end of file
+    test_number = Column(Integer, nullable=True)
+
+
+
+class MultimeterRollup(Base):
+    """Свёртка показаний мультиметра, которая хранится дольше сырых данных"""
+
+    __tablename__ = 'multimeter_rollup'
+    id = Column(Integer, primary_key=True)
+    bucket_ns = Column(Integer, index=True)
+    bucket_seconds = Column(Integer)
+    unit = Column(String)
+    unit_code = Column(Integer)
+    avg_si = Column(Float)
+    min_si = Column(Float)
+    max_si = Column(Float)
+    count = Column(Integer)
+    overloads = Column(Integer)
+
+
+class UARTRollup(Base):
+    """Свёртка данных датчиков UART"""
+
+    __tablename__ = 'uart_rollup'
+    id = Column(Integer, primary_key=True)
+    bucket_ns = Column(Integer, index=True)
+    bucket_seconds = Column(Integer)
+    count = Column(Integer)
+    temp600_1_avg = Column(Float)
+    temp600_1_min = Column(Float)
+    temp600_1_max = Column(Float)
+    temp600_2_avg = Column(Float)
+    temp600_2_min = Column(Float)
+    temp600_2_max = Column(Float)
+    tempNormal1_avg = Column(Float)
+    tempNormal1_min = Column(Float)
+    tempNormal1_max = Column(Float)
+    tempNormal2_avg = Column(Float)
+    tempNormal2_min = Column(Float)
+    tempNormal2_max = Column(Float)
+    thrust1_avg = Column(Float)
+    thrust1_min = Column(Float)
+    thrust1_max = Column(Float)
+
+
+def _set_ts_ns(mapper, connection, target):
+    # ts_ns — время записи в наносекундах эпохи для индексных выборок по
+    # диапазону; строковый timestamp остаётся для отображения
+    if target.ts_ns is None:
+        target.ts_ns = timestamp_to_ns(target.timestamp) or now_ns()
+
+
+for _model in (OscilloscopeData, MultimeterData, UARTData):
+    event.listen(_model, 'before_insert', _set_ts_ns)
@@ -1,6 +1,17 @@
+import time
+
 import hid
 import serial
 
+from backend.metrics import FAST_BUCKETS, counter, histogram
+
+MULTIMETER_READINGS = counter(
+    'multimeter_readings_total', 'Новые показания мультиметра'
+)
+MULTIMETER_DECODE_SECONDS = histogram(
+    'multimeter_decode_seconds', 'Время разбора пакета UT803', FAST_BUCKETS
+)
+
 global_multimeter = None
 last_multimeter_values = {}
 
@@ -18,6 +29,8 @@ class UT803Reader:
         self.serial_port = None
         self.connected = False
         self.last_reading = None
+        # момент прихода последнего пакета (для backend/tracing.py)
+        self.capture_ns = None
 
     def connect_serial(self, port: str = '/dev/ttyUSB0') -> bool:
         try:
@@ -60,6 +73,11 @@ class UT803Reader:
             return False
 
     def decode_ut803_data(self, data):
+        self.capture_ns = time.monotonic_ns()
+        with MULTIMETER_DECODE_SECONDS.time():
+            return self._decode_ut803_data(data)
+
+    def _decode_ut803_data(self, data):
         """
         Универсальный декодер: определяет формат (бинарный/ASCII) и парсит оба варианта.
         data: bytes или str
@@ -177,6 +195,8 @@ class UT803Reader:
                 self.last_reading = (
                     json_data.get('value') if json_data else None
                 )
+                if json_data:
+                    MULTIMETER_READINGS.inc(interface='serial')
                 return json_data, human_readable
             data = self.serial_port.readline()
             if data:
@@ -192,6 +212,8 @@ class UT803Reader:
                 self.last_reading = (
                     json_data.get('value') if json_data else None
                 )
+                if json_data:
+                    MULTIMETER_READINGS.inc(interface='serial')
                 return json_data, human_readable
         except Exception as e:
             print(f"[Мультиметр] Error reading from RS232: {str(e)}")
@@ -209,6 +231,8 @@ class UT803Reader:
                 self.last_reading = (
                     json_data.get('value') if json_data else None
                 )
+                if json_data:
+                    MULTIMETER_READINGS.inc(interface='hid')
                 return json_data, human_readable
         except Exception as e:
             print(f"[Мультиметр] Error reading from HID: {str(e)}")
@@ -8,11 +8,19 @@ import numpy as np
 import pyvisa
 
 from backend.engine import *
+from backend.metrics import counter, histogram
 from backend.models import OscilloscopeData
 
 oscilloscope_lock = threading.Lock()
 active_websockets = set()
 
+OSCILLOSCOPE_FRAMES = counter(
+    'oscilloscope_frames_total', 'Снятые кадры осциллографа'
+)
+OSCILLOSCOPE_VISA_SECONDS = histogram(
+    'oscilloscope_visa_seconds', 'Время обмена с осциллографом по VISA'
+)
+
 
 class OscilloscopeVisualizer:
     def __init__(self):
@@ -130,6 +138,7 @@ class OscilloscopeVisualizer:
 
             with oscilloscope_lock:
                 try:
+                    started = time.perf_counter()
                     self.oscilloscope.write(f":WAV:SOUR CHAN{channel}")
                     time.sleep(0.05)
 
@@ -144,6 +153,9 @@ class OscilloscopeVisualizer:
                     self.oscilloscope.write(":WAV:DATA?")
                     time.sleep(0.05)
                     raw_data = self.oscilloscope.read_raw()
+                    OSCILLOSCOPE_VISA_SECONDS.observe(
+                        time.perf_counter() - started, op='waveform'
+                    )
 
                     if raw_data:
                         data_start = raw_data.find(b'#')
@@ -202,6 +214,7 @@ class OscilloscopeVisualizer:
 
             with oscilloscope_lock:
                 try:
+                    started = time.perf_counter()
                     volts_div = float(
                         self.oscilloscope.query(f":CHAN{channel}:SCAL?")
                     )
@@ -214,6 +227,9 @@ class OscilloscopeVisualizer:
                     display = self.oscilloscope.query(
                         f":CHAN{channel}:DISP?"
                     ).strip()
+                    OSCILLOSCOPE_VISA_SECONDS.observe(
+                        time.perf_counter() - started, op='settings'
+                    )
 
                     return {
                         "volts_div": volts_div,
@@ -241,8 +257,8 @@ class OscilloscopeVisualizer:
             None, lambda: self.get_channel_settings(channel)
         )
 
-    async def get_oscilloscope_data(self):
-        """Получает данные со всех активных каналов"""
+    def read_oscilloscope_data(self):
+        """Получает данные со всех активных каналов (синхронная версия)"""
         if not self.connected:
             self.connect_to_oscilloscope()
             if not self.connected:
@@ -324,12 +340,18 @@ class OscilloscopeVisualizer:
             ):
                 return {"error": "Нет активных каналов осциллографа"}
 
+            OSCILLOSCOPE_FRAMES.inc()
             return oscilloscope_data
         except Exception as e:
             print(f"Ошибка при получении данных с осциллографа: {e}")
             traceback.print_exc()
             return {"error": "Ошибка получения данных с осциллографа"}
 
+    async def get_oscilloscope_data(self):
+        """Асинхронная обертка: опрос прибора идёт в пуле потоков"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.read_oscilloscope_data)
+
     def set_channel_settings(self, channel_name, settings):
         """Устанавливает настройки канала осциллографа"""
         if not self.connected or not self.oscilloscope:
@@ -390,6 +412,44 @@ def get_channel_history(channel_name, limit=20):
         session.close()
 
 
+def iter_channel_history(channel_name, limit=20):
+    """Отдаёт последние limit осциллограмм канала по одной, от старых к
+    новым, не склеивая их в общие списки"""
+    import base64
+
+    session = Session()
+    try:
+        latest = (
+            session.query(OscilloscopeData.id)
+            .filter(OscilloscopeData.channel == channel_name)
+            .order_by(OscilloscopeData.id.desc())
+            .limit(limit)
+            .subquery()
+        )
+        rows = (
+            session.query(OscilloscopeData)
+            .filter(OscilloscopeData.id.in_(session.query(latest.c.id)))
+            .order_by(OscilloscopeData.id)
+            .yield_per(1)
+        )
+        for row in rows:
+            try:
+                t = np.frombuffer(base64.b64decode(row.time_data), dtype=np.float32)
+                v = np.frombuffer(
+                    base64.b64decode(row.voltage_data), dtype=np.float32
+                )
+            except Exception:
+                continue
+            yield {
+                'id': row.id,
+                'timestamp': row.timestamp,
+                'time': t.tolist(),
+                'voltage': v.tolist(),
+            }
+    finally:
+        session.close()
+
+
 async def update_oscilloscope_data():
     try:
         if not global_visualizer or not global_visualizer.connected:
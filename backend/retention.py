@@ -0,0 +1,381 @@
+"""
+Хранение данных: очистка рабочих таблиц, свёртки и архив испытаний.
+
+Сырые записи рабочих таблиц живут raw_days суток. Перед удалением показания
+мультиметра и датчиков UART сворачиваются в поминутные таблицы
+multimeter_rollup и uart_rollup, которые хранятся rollup_days суток.
+Файлы завершённых испытаний, закончившихся раньше ARCHIVE_TESTS_AFTER_DAYS
+суток назад, переносятся в каталог archive/ и остаются доступны через каталог
+испытаний (backend.catalog).
+
+Всё выполняется небольшими пачками в пуле потоков БД с паузами между
+ними, чтобы не мешать записи живых данных. Освободившиеся страницы
+возвращаются системе через incremental_vacuum.
+"""
+
+import asyncio
+import os
+import time
+import traceback
+
+from sqlalchemy import text
+
+from backend.catalog import (TEST_TABLE_PREFIXES, fan_out, get_entry,
+                             list_entries, move_test_file, set_test_status)
+from backend.engine import Session, engine, run_db
+from backend.lifecycle import STATUS_ABORTED, STATUS_COMPLETED, test_lifecycle
+from backend.models import (MULTIMETER_SI_UNITS, MultimeterData,
+                            MultimeterRollup, OscilloscopeData, UARTData,
+                            UARTRollup)
+from backend.timestamps import now_ns
+
+RETENTION_INTERVAL = 15 * 60
+RETENTION_BATCH_ROWS = 2000
+RETENTION_BATCH_PAUSE = 0.05
+ROLLUP_BUCKET_SECONDS = 60
+ROLLUP_WINDOW_SECONDS = 3600
+INCREMENTAL_VACUUM_PAGES = 2000
+FULL_VACUUM_FREE_RATIO = 0.25
+ARCHIVE_DIR = 'archive'
+ARCHIVE_TESTS_AFTER_DAYS = 30
+# архивируются только испытания, которые уже не пишутся: starting и running
+# (в том числе только что выделенный номер) не трогаются
+ARCHIVABLE_STATUSES = (STATUS_COMPLETED, STATUS_ABORTED)
+
+DAY_NS = 86400 * 1_000_000_000
+UART_SENSOR_COLUMNS = (
+    'temp600_1',
+    'temp600_2',
+    'tempNormal1',
+    'tempNormal2',
+    'thrust1',
+)
+
+
+class RetentionPolicy:
+    """Срок хранения сырых записей таблицы и, если есть свёртка, её срока"""
+
+    def __init__(self, table, raw_days, rollup=None, rollup_days=None):
+        self.table = table
+        self.raw_days = raw_days
+        self.rollup = rollup
+        self.rollup_days = rollup_days
+
+
+RETENTION_POLICIES = (
+    RetentionPolicy(OscilloscopeData.__tablename__, raw_days=7),
+    RetentionPolicy(
+        MultimeterData.__tablename__,
+        raw_days=30,
+        rollup=MultimeterRollup.__tablename__,
+        rollup_days=365,
+    ),
+    RetentionPolicy(
+        UARTData.__tablename__,
+        raw_days=14,
+        rollup=UARTRollup.__tablename__,
+        rollup_days=365,
+    ),
+)
+
+last_report = None
+
+
+def _cutoff_ns(days):
+    return now_ns() - int(days * DAY_NS)
+
+
+def _si_unit_sql():
+    """Единица СИ по unit_code: свёртка идёт по величине, а не по единице
+    прибора (mV и V — одна серия)"""
+    cases = ' '.join(
+        f"WHEN {int(code)} THEN '{unit}'" for code, unit in MULTIMETER_SI_UNITS.items()
+    )
+    return f"CASE unit_code {cases} ELSE '' END"
+
+
+def _rollup_sql(policy):
+    if policy.rollup == MultimeterRollup.__tablename__:
+        return (
+            f'INSERT INTO "{policy.rollup}" (bucket_ns, bucket_seconds, unit, '
+            "unit_code, avg_si, min_si, max_si, count, overloads) "
+            "SELECT ts_ns / :bucket_ns * :bucket_ns AS bucket, :bucket_seconds, "
+            f"{_si_unit_sql()}, unit_code, AVG(value_si), MIN(value_si), "
+            f'MAX(value_si), COUNT(value_si), SUM(overload) FROM "{policy.table}" '
+            "WHERE ts_ns >= :start AND ts_ns < :end "
+            "GROUP BY bucket, unit_code"
+        )
+    columns = ['bucket_ns', 'bucket_seconds', 'count']
+    aggregates = []
+    for name in UART_SENSOR_COLUMNS:
+        for func in ('avg', 'min', 'max'):
+            columns.append(f'{name}_{func}')
+            aggregates.append(f'{func.upper()}({name})')
+    return (
+        f'INSERT INTO "{policy.rollup}" ({", ".join(columns)}) '
+        "SELECT ts_ns / :bucket_ns * :bucket_ns AS bucket, :bucket_seconds, "
+        f'COUNT(*), {", ".join(aggregates)} FROM "{policy.table}" '
+        "WHERE ts_ns >= :start AND ts_ns < :end AND data_type = 'sensor_data' "
+        "GROUP BY bucket"
+    )
+
+
+def next_rollup_start(policy, after=None, bucket_seconds=ROLLUP_BUCKET_SECONDS):
+    """Начало интервала с первой ещё не свёрнутой записью не раньше after
+    (None — свёртывать нечего). Пустые промежутки между записями
+    пропускаются, а не перебираются окнами"""
+    bucket_ns = bucket_seconds * 1_000_000_000
+    session = Session()
+    try:
+        if after is None:
+            last_bucket = session.execute(
+                text(
+                    f'SELECT MAX(bucket_ns) FROM "{policy.rollup}" '
+                    "WHERE bucket_seconds = :bucket_seconds"
+                ),
+                {'bucket_seconds': bucket_seconds},
+            ).scalar()
+            after = 1 if last_bucket is None else last_bucket + bucket_ns
+        first = session.execute(
+            text(f'SELECT MIN(ts_ns) FROM "{policy.table}" WHERE ts_ns >= :after'),
+            {'after': after},
+        ).scalar()
+        return None if first is None else first // bucket_ns * bucket_ns
+    finally:
+        session.close()
+
+
+def rollup_window(policy, start, end, bucket_seconds=ROLLUP_BUCKET_SECONDS):
+    """Сворачивает записи [start, end) одной транзакцией, возвращает число
+    добавленных интервалов"""
+    session = Session()
+    try:
+        result = session.execute(
+            text(_rollup_sql(policy)),
+            {
+                'bucket_ns': bucket_seconds * 1_000_000_000,
+                'bucket_seconds': bucket_seconds,
+                'start': start,
+                'end': end,
+            },
+        )
+        session.commit()
+        return result.rowcount
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def delete_batch(table, column, cutoff_ns, batch_size=RETENTION_BATCH_ROWS):
+    """Удаляет не больше batch_size записей старше cutoff_ns"""
+    session = Session()
+    try:
+        result = session.execute(
+            text(
+                f'DELETE FROM "{table}" WHERE id IN (SELECT id FROM "{table}" '
+                f"WHERE {column} < :cutoff ORDER BY {column} LIMIT :limit)"
+            ),
+            {'cutoff': cutoff_ns, 'limit': batch_size},
+        )
+        session.commit()
+        return result.rowcount
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+async def delete_older_than(table, column, cutoff_ns):
+    """Удаляет записи пачками, уступая между ними запись живых данных"""
+    deleted = 0
+    while True:
+        count = await run_db(delete_batch, table, column, cutoff_ns)
+        deleted += count
+        if count < RETENTION_BATCH_ROWS:
+            return deleted
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+
+async def apply_policy(policy):
+    """Сворачивает и удаляет устаревшие записи одной таблицы"""
+    report = {'table': policy.table, 'rollup_buckets': 0}
+    cutoff = _cutoff_ns(policy.raw_days)
+    if policy.rollup:
+        bucket_ns = ROLLUP_BUCKET_SECONDS * 1_000_000_000
+        window_ns = ROLLUP_WINDOW_SECONDS * 1_000_000_000
+        end = cutoff // bucket_ns * bucket_ns
+        start = await run_db(next_rollup_start, policy)
+        while start is not None and start < end:
+            stop = min(start + window_ns, end)
+            report['rollup_buckets'] += await run_db(
+                rollup_window, policy, start, stop
+            )
+            await asyncio.sleep(RETENTION_BATCH_PAUSE)
+            start = await run_db(next_rollup_start, policy, stop)
+        # сырые записи удаляются только за уже свёрнутые интервалы
+        cutoff = end
+        report['rollup_deleted'] = await delete_older_than(
+            policy.rollup, 'bucket_ns', _cutoff_ns(policy.rollup_days)
+        )
+    report['deleted'] = await delete_older_than(policy.table, 'ts_ns', cutoff)
+    return report
+
+
+def _latest_ts_ns(session, test_number):
+    latest = 0
+    for prefix in TEST_TABLE_PREFIXES:
+        table = f'{prefix}_{test_number}'
+        if session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name = :name"),
+            {'name': table},
+        ).scalar():
+            value = session.execute(text(f'SELECT MAX(ts_ns) FROM "{table}"')).scalar()
+            latest = max(latest, value or 0)
+    return latest
+
+
+def _is_archivable(entry, current):
+    return (
+        entry is not None
+        and entry.status in ARCHIVABLE_STATUSES
+        and entry.number != current
+    )
+
+
+def list_archivable_tests(older_than_days):
+    """Номера завершённых испытаний, закончившихся больше older_than_days
+    суток назад. Время окончания берётся из каталога; у испытаний без него
+    (перенесённых из общей БД) — по последней записи, а испытания без
+    записей пропускаются"""
+    cutoff = _cutoff_ns(older_than_days)
+    current = test_lifecycle.test_number
+    finished = {}
+    without_finish = []
+    for entry in list_entries():
+        if not _is_archivable(entry, current):
+            continue
+        if entry.finished_ns:
+            finished[entry.number] = entry.finished_ns
+        else:
+            without_finish.append(entry.number)
+    finished.update(fan_out(_latest_ts_ns, without_finish))
+    return sorted(
+        number for number, value in finished.items() if value and value < cutoff
+    )
+
+
+def archive_test(test_number):
+    """Переносит файл испытания в ARCHIVE_DIR; испытание остаётся в каталоге
+    и доступно для чтения. Состояние проверяется ещё раз перед переносом;
+    None, если испытание за это время перестало подходить"""
+    if not _is_archivable(get_entry(test_number), test_lifecycle.test_number):
+        return None
+    path = move_test_file(test_number, ARCHIVE_DIR)
+    set_test_status(test_number, 'archived')
+    return path
+
+
+def database_space():
+    """Размер файлов БД и число свободных страниц"""
+    path = engine.url.database
+    with engine.connect() as connection:
+        page_size = connection.exec_driver_sql('PRAGMA page_size').scalar()
+        page_count = connection.exec_driver_sql('PRAGMA page_count').scalar()
+        freelist = connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+        auto_vacuum = connection.exec_driver_sql('PRAGMA auto_vacuum').scalar()
+    file_bytes = 0
+    for suffix in ('', '-wal'):
+        if os.path.exists(path + suffix):
+            file_bytes += os.path.getsize(path + suffix)
+    return {
+        'file_bytes': file_bytes,
+        'page_size': page_size,
+        'page_count': page_count,
+        'free_pages': freelist,
+        'free_bytes': freelist * page_size,
+        'auto_vacuum': auto_vacuum,
+    }
+
+
+def vacuum_database(pages=INCREMENTAL_VACUUM_PAGES):
+    """Возвращает свободные страницы системе. При auto_vacuum=INCREMENTAL —
+    не больше pages страниц за вызов; БД без него один раз перестраивается
+    полным VACUUM, когда свободно больше FULL_VACUUM_FREE_RATIO страниц"""
+    space = database_space()
+    with engine.connect().execution_options(
+        isolation_level='AUTOCOMMIT'
+    ) as connection:
+        if space['auto_vacuum'] == 2:
+            connection.exec_driver_sql(f'PRAGMA incremental_vacuum({int(pages)})')
+            mode = 'incremental'
+        elif space['free_pages'] > space['page_count'] * FULL_VACUUM_FREE_RATIO:
+            connection.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+            connection.exec_driver_sql('VACUUM')
+            mode = 'full'
+        else:
+            return None
+        connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+    return mode
+
+
+async def run_retention_pass():
+    """Один проход очистки по всем политикам; возвращает отчёт"""
+    global last_report
+    started = time.time()
+    space_before = await run_db(database_space)
+    report = {'tables': [], 'archived_tests': []}
+    for policy in RETENTION_POLICIES:
+        try:
+            report['tables'].append(await apply_policy(policy))
+        except Exception as e:
+            print(f"Ошибка очистки таблицы {policy.table}: {e}")
+            traceback.print_exc()
+    if ARCHIVE_TESTS_AFTER_DAYS is not None:
+        for test_number in await run_db(
+            list_archivable_tests, ARCHIVE_TESTS_AFTER_DAYS
+        ):
+            try:
+                path = await run_db(archive_test, test_number)
+                if path is None:
+                    continue
+                report['archived_tests'].append(test_number)
+                print(f"Испытание #{test_number} перенесено в {path}")
+            except Exception as e:
+                print(f"Ошибка архивации испытания #{test_number}: {e}")
+                traceback.print_exc()
+    report['vacuum'] = await run_db(vacuum_database)
+    space_after = await run_db(database_space)
+    report['space_before'] = space_before
+    report['space_after'] = space_after
+    report['reclaimed_bytes'] = max(
+        0, space_before['file_bytes'] - space_after['file_bytes']
+    )
+    report['duration'] = round(time.time() - started, 3)
+    report['finished_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    last_report = report
+    return report
+
+
+def format_report(report):
+    deleted = sum(item['deleted'] for item in report['tables'])
+    return (
+        f"Очистка БД: удалено записей {deleted}, "
+        f"архивировано испытаний {len(report['archived_tests'])}, "
+        f"освобождено {report['reclaimed_bytes'] / 1024 / 1024:.1f} МБ "
+        f"за {report['duration']} с"
+    )
+
+
+async def run_retention(interval=RETENTION_INTERVAL):
+    """Фоновая задача: проход очистки раз в interval секунд"""
+    while True:
+        try:
+            report = await run_retention_pass()
+            print(format_report(report))
+        except Exception as e:
+            print(f"Ошибка очистки БД: {e}")
+            traceback.print_exc()
+        await asyncio.sleep(interval)
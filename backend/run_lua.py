@@ -1,156 +1,315 @@
 import asyncio
 import json
 import os
-import re
+import resource
 import signal
-import subprocess
-from concurrent.futures import ProcessPoolExecutor
+import time
 
+from backend.engine import run_db
+from backend.events import ClientEventSink, EventServer
 from backend.http_methods import *
+from backend.lifecycle import test_lifecycle
+from backend.lua_runtime import StandBindings, lupa, run_lua_file
 from backend.measurement import *
 from backend.oscillocsope_visualizer import *
+from backend.scenario import MULTIMETER_QUEUE_SIZE, multimeter_subscribers
+from backend.send_websocket import send_to_all_websocket_clients
+from backend.settings import LUA_MAX_CONCURRENT_RUNS, LUA_RUN_TIMEOUT
 from backend.setup_db import *
 
 
-def run_lua_script_sync(script_name: str) -> dict:
-    """Synchronous version of run_lua_script that runs in a separate process"""
-    try:
-        env = os.environ.copy()
-        env['LUA_PATH'] = '?.lua;' + env.get('LUA_PATH', '')
-
-        process = subprocess.Popen(
-            ['lua', script_name],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            env=env,
-            preexec_fn=os.setsid,
-        )
+LUA_KILL_GRACE = 3.0
 
-        try:
-            stdout, stderr = process.communicate(timeout=300)
-            return {
-                'success': True,
-                'output': stdout.decode('utf-8'),
-                'error': stderr.decode('utf-8'),
-            }
-        except subprocess.TimeoutExpired:
-            os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-            return {
-                'success': False,
-                'error': 'Script execution timed out after 5 minutes',
-            }
-
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
-
-
-async def run_lua_script(script_name: str) -> dict:
-    """Asynchronous wrapper for run_lua_script_sync"""
-    loop = asyncio.get_running_loop()
-    with ProcessPoolExecutor() as pool:
-        return await loop.run_in_executor(
-            pool, run_lua_script_sync, script_name
-        )
+_run_semaphore = asyncio.Semaphore(LUA_MAX_CONCURRENT_RUNS)
+_active_runs = 0
+_runs_started = 0
+
+
+class RunUsage:
+    """Учёт ресурсов одного запуска: время и прирост RUSAGE_CHILDREN.
 
+    Прирост CPU относится к этому запуску точно, если за время запуска
+    других скриптов не выполнялось (exclusive). ru_maxrss у детей — максимум
+    по всем завершённым дочерним процессам сервера, поэтому peak_rss_kb —
+    верхняя граница пиковой памяти запуска.
+    """
 
-def run_lua_script_stream(
-    script_name: str, on_line, websocket=None, loop=None
-) -> bool:
+    def __init__(self):
+        self.started = None
+        self.before = None
+        self.exclusive = True
+        self.result = None
+
+    def start(self):
+        global _active_runs, _runs_started
+        _active_runs += 1
+        _runs_started += 1
+        self.run_index = _runs_started
+        self.exclusive = _active_runs == 1
+        self.started = time.monotonic()
+        self.before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return self
+
+    def finish(self):
+        global _active_runs
+        if self.result is not None:
+            return self.result
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        _active_runs -= 1
+        self.result = {
+            'wall_time': round(time.monotonic() - self.started, 3),
+            'cpu_user': round(after.ru_utime - self.before.ru_utime, 3),
+            'cpu_system': round(after.ru_stime - self.before.ru_stime, 3),
+            'peak_rss_kb': after.ru_maxrss,
+            'exclusive': self.exclusive and _runs_started == self.run_index,
+        }
+        return self.result
+
+
+def _lua_env(base=None):
+    env = dict(os.environ if base is None else base)
+    env['LUA_PATH'] = '?.lua;' + env.get('LUA_PATH', '')
+    return env
+
+
+async def terminate_process_group(process, grace=LUA_KILL_GRACE):
+    """SIGTERM группе процессов скрипта, через grace секунд — SIGKILL"""
+    if process.returncode is not None:
+        return
     try:
-        env = os.environ.copy()
-        env['LUA_PATH'] = '?.lua;' + env.get('LUA_PATH', '')
-        process = subprocess.Popen(
-            ['lua', script_name],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            env=env,
-            preexec_fn=os.setsid,
-            bufsize=1,
-            universal_newlines=True,
-        )
-        multimeter_regex = re.compile(
-            r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\] ([\d.]+) В (DC|AC) AUTO \[Вольтметр\]'
-        )
-        for line in process.stdout:
-            on_line(line.rstrip())
-            if websocket and loop:
-                match = multimeter_regex.search(line)
-                if match:
-                    data = {
-                        'timestamp': match.group(1),
-                        'value': match.group(2),
-                        'unit': 'В',
-                        'mode': match.group(3),
-                        'range_str': 'AUTO',
-                        'measure_type': 'Вольтметр',
-                    }
-                    asyncio.run_coroutine_threadsafe(
-                        websocket.send(
-                            json.dumps({'type': 'multimeter', 'data': data})
-                        ),
-                        loop,
-                    )
-        process.wait()
-        return process.returncode == 0
-    except Exception as e:
-        on_line(f"[ERROR] {e}")
-        return False
+        os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), grace)
+        except asyncio.TimeoutError:
+            os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+            await process.wait()
+    except ProcessLookupError:
+        pass
+
+
+async def run_lua_script(script_name: str, timeout=LUA_RUN_TIMEOUT) -> dict:
+    """Выполняет Lua-скрипт и возвращает его вывод и учёт ресурсов (usage).
+    Одновременно выполняется не больше LUA_MAX_CONCURRENT_RUNS скриптов"""
+    async with _run_semaphore:
+        usage = RunUsage().start()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'lua',
+                script_name,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=_lua_env(),
+                start_new_session=True,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(), timeout
+                )
+            except asyncio.TimeoutError:
+                await terminate_process_group(process)
+                result = {
+                    'success': False,
+                    'error': f'Script execution timed out after {timeout} s',
+                }
+            else:
+                result = {
+                    'success': process.returncode == 0,
+                    'returncode': process.returncode,
+                    'output': stdout.decode('utf-8', errors='replace'),
+                    'error': stderr.decode('utf-8', errors='replace'),
+                }
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        finally:
+            result_usage = usage.finish()
+        result['usage'] = result_usage
+        return result
 
 
 async def run_lua_script_stream_async(script_name, websocket):
-    loop = asyncio.get_running_loop()
+    return await run_lua_test_parallel_async(script_name, websocket)
 
-    def send_line(line):
-        asyncio.run_coroutine_threadsafe(
-            websocket.send(json.dumps({'type': 'lua_output', 'line': line})),
-            loop,
-        )
 
-    success = await loop.run_in_executor(
-        None, run_lua_script_stream, script_name, send_line, websocket, loop
-    )
-    await websocket.send(
-        json.dumps({'type': 'lua_status', 'success': success})
-    )
-
-
-async def run_lua_test_parallel_async(script_name, websocket):
-    """Запускает main.lua, разбирает вывод и отправляет данные по типу устройства в WebSocket"""
-    process = await asyncio.create_subprocess_exec(
-        'lua',
-        script_name,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.STDOUT,
-    )
-    try:
-        while True:
-            line = await process.stdout.readline()
-            if not line:
-                break
-            decoded = line.decode('utf-8').rstrip()
-            if decoded.startswith('[OSC]'):
-                await websocket.send(
-                    json.dumps(
-                        {'type': 'oscilloscope', 'line': decoded[5:].lstrip()}
+async def run_lua_test_parallel_async(
+    script_name, websocket, on_process=None, timeout=LUA_RUN_TIMEOUT
+):
+    """Запускает Lua-сценарий. Вывод скрипта уходит клиенту пачками строк
+    журнала, а показания и осциллограммы дочерние процессы присылают
+    событиями по каналу STAND_EVENT_SOCKET (backend/events.py).
+
+    Скрипт запускается в своей группе процессов, on_process(process)
+    получает процесс сразу после запуска (для отмены через killpg).
+    Возвращает {'success', 'returncode', 'usage'}; usage уходит и клиенту
+    в lua_status"""
+    active_test = test_lifecycle.active
+
+    async def send(message):
+        await websocket.send(json.dumps(message))
+
+    async with _run_semaphore, ClientEventSink(send) as sink:
+
+        async def handle_event(event):
+            if event.get('event') == 'reading':
+                data = event.get('data') or {}
+                await run_db(
+                    save_multimeter_data,
+                    data,
+                    force_save=True,
+                    active_test=active_test,
+                )
+                # показания общего мультиметра опрос сервера уже разослал
+                if not event.get('shared'):
+                    await send_to_all_websocket_clients(
+                        {'type': 'multimeter', 'data': data}
                     )
+            else:
+                await sink.handle(event)
+
+        usage = RunUsage().start()
+        process = None
+        result = {'success': False, 'returncode': None}
+        try:
+            async with EventServer(handle_event) as events:
+                process = await asyncio.create_subprocess_exec(
+                    'lua',
+                    script_name,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    env=_lua_env(events.env()),
+                    start_new_session=True,
                 )
-            elif decoded.startswith('[MULT]'):
-                await websocket.send(
-                    json.dumps(
-                        {'type': 'multimeter', 'line': decoded[6:].lstrip()}
+                if on_process:
+                    on_process(process)
+
+                async def pump():
+                    async for line in process.stdout:
+                        await sink.log(
+                            line.decode('utf-8', errors='replace').rstrip()
+                        )
+                    return await process.wait()
+
+                try:
+                    returncode = await asyncio.wait_for(pump(), timeout)
+                except asyncio.TimeoutError:
+                    await terminate_process_group(process)
+                    result['error'] = (
+                        f'Script execution timed out after {timeout} s'
                     )
+                    await sink.log(f"[ERROR] {result['error']}")
+                else:
+                    result['success'] = returncode == 0
+                    result['returncode'] = returncode
+        except Exception as e:
+            result['error'] = str(e)
+        finally:
+            if process is not None:
+                await terminate_process_group(process)
+            result['usage'] = usage.finish()
+        await sink.flush()
+        await sink.emit({'type': 'lua_status', **result})
+        return result
+
+
+async def run_lua_embedded(
+    script_name,
+    websocket,
+    visualizer=None,
+    multimeter=None,
+    shared_multimeter=False,
+    send_calibration=None,
+    timeout=LUA_RUN_TIMEOUT,
+):
+    """Выполняет Lua-сценарий во встроенной среде (backend/lua_runtime.py)
+    на приборах сервера. Возвращает то же, что run_lua_test_parallel_async;
+    без пакета lupa (необязательная зависимость, см. requirements.txt) —
+    ошибку, а не тихий запуск внешним lua"""
+    if lupa is None:
+        result = {
+            'success': False,
+            'returncode': None,
+            'error': (
+                "Встроенная среда Lua недоступна: не установлен пакет lupa "
+                "(pip install lupa) — запустите сценарий с engine='subprocess'"
+            ),
+        }
+        print(result['error'])
+        try:
+            await websocket.send(json.dumps({'type': 'lua_status', **result}))
+        except Exception:
+            pass
+        return result
+
+    loop = asyncio.get_running_loop()
+    active_test = test_lifecycle.active
+
+    async def send(message):
+        await websocket.send(json.dumps(message))
+
+    async with _run_semaphore, ClientEventSink(send) as sink:
+
+        async def handle_event(event):
+            if event.get('event') == 'reading':
+                data = event.get('data') or {}
+                await run_db(
+                    save_multimeter_data,
+                    data,
+                    force_save=True,
+                    active_test=active_test,
                 )
-            else:
-                await websocket.send(
-                    json.dumps({'type': 'lua_output', 'line': decoded})
+                await send_to_all_websocket_clients(
+                    {'type': 'multimeter', 'data': data}
                 )
-        returncode = await process.wait()
-        await websocket.send(
-            json.dumps({'type': 'lua_status', 'success': returncode == 0})
+            else:
+                await sink.handle(event)
+
+        multimeter_queue = None
+        if shared_multimeter:
+            multimeter_queue = asyncio.Queue(MULTIMETER_QUEUE_SIZE)
+            multimeter_subscribers.add(multimeter_queue)
+        bindings = StandBindings(
+            loop,
+            handle_event,
+            visualizer=visualizer,
+            multimeter=multimeter,
+            multimeter_queue=multimeter_queue,
+            send_calibration=send_calibration,
+            active_test=active_test,
         )
-    except Exception as e:
-        await websocket.send(
-            json.dumps(
-                {'type': 'lua_status', 'success': False, 'error': str(e)}
+
+        def run():
+            started = time.thread_time()
+            try:
+                return run_lua_file(script_name, bindings)
+            finally:
+                bindings.cpu_time = time.thread_time() - started
+
+        started = time.monotonic()
+        result = {'success': False, 'returncode': None}
+        future = loop.run_in_executor(None, run)
+        try:
+            returncode = await asyncio.wait_for(asyncio.shield(future), timeout)
+            result['success'] = returncode == 0
+            result['returncode'] = returncode
+        except asyncio.TimeoutError:
+            result['error'] = (
+                f'Script execution timed out after {timeout} s'
             )
-        )
+            await sink.log(f"[ERROR] {result['error']}")
+        except Exception as e:
+            result['error'] = str(e)
+        finally:
+            # поток среды Lua останавливается на ближайшей проверке отмены
+            bindings.cancelled.set()
+            try:
+                await future
+            except Exception:
+                pass
+            if multimeter_queue is not None:
+                multimeter_subscribers.discard(multimeter_queue)
+        result['usage'] = {
+            'wall_time': round(time.monotonic() - started, 3),
+            'cpu_thread': round(bindings.cpu_time, 3),
+        }
+        await sink.flush()
+        await sink.emit({'type': 'lua_status', **result})
+        return result
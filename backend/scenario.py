@@ -0,0 +1,281 @@
+"""
+Сценарий испытания внутри сервера.
+
+Раньше contrib/main.lua запускал через io.popen bin/rigol_reader.py и
+bin/ut803.py и читал их вывод по строке из каждого по очереди: каждый запуск
+стоил интерпретатора Lua, двух интерпретаторов Python и повторного
+подключения к приборам, которые уже открыты сервером. Теперь тот же
+сценарий (параметры из contrib/scenario.lua) выполняется здесь: осциллограф
+опрашивается через уже подключённый OscilloscopeVisualizer, показания
+мультиметра берутся у работающего опроса сервера (или, если его нет, прямо
+у UT803Reader). Осциллограф и мультиметр идут независимыми задачами, и
+медленный прибор не тормозит быстрый.
+
+Сообщения клиентам формирует ClientEventSink (backend/events.py), как и
+для Lua-сценария: журнал пачками, lua_progress, oscilloscope_waveform,
+multimeter и в конце lua_status.
+"""
+
+import asyncio
+import base64
+import re
+import traceback
+
+from backend.engine import run_db
+from backend.events import ClientEventSink, pack_float32
+
+SCENARIO_PATH = 'contrib/scenario.lua'
+# скрипты, которые заменяет встроенный сценарий; остальные по-прежнему
+# запускаются через Lua
+SCENARIO_SCRIPTS = ('contrib/main.lua', 'main.lua')
+SCENARIO_INSTRUMENTS = ('oscilloscope', 'multimeter')
+SCENARIO_DEFAULTS = {
+    'global_osc_samples': 50,
+    'global_osc_interval_sec': 0.2,
+    'global_mult_time_sec': 50,
+}
+MULTIMETER_QUEUE_SIZE = 256
+MULTIMETER_POLL_INTERVAL = 0.02
+
+_ASSIGNMENT = re.compile(r'^\s*(\w+)\s*=\s*([-+]?\d+(?:\.\d+)?)')
+
+multimeter_subscribers = set()
+
+
+async def _discard(message):
+    pass
+
+
+class Scenario:
+    def __init__(self, osc_samples, osc_interval_sec, mult_time_sec):
+        self.osc_samples = int(osc_samples)
+        self.osc_interval_sec = float(osc_interval_sec)
+        self.mult_time_sec = float(mult_time_sec)
+
+    def to_dict(self):
+        return {
+            'osc_samples': self.osc_samples,
+            'osc_interval_sec': self.osc_interval_sec,
+            'mult_time_sec': self.mult_time_sec,
+        }
+
+
+def load_scenario(path=SCENARIO_PATH, overrides=None):
+    """Читает числовые глобальные переменные из scenario.lua
+    (global_osc_samples = 50 -- комментарий); overrides — значения из
+    запроса клиента с ключами osc_samples, osc_interval_sec, mult_time_sec"""
+    values = dict(SCENARIO_DEFAULTS)
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                match = _ASSIGNMENT.match(line.split('--', 1)[0])
+                if match and match.group(1) in values:
+                    values[match.group(1)] = float(match.group(2))
+    except FileNotFoundError:
+        print(f"Файл сценария {path} не найден, используются значения по умолчанию")
+    scenario = Scenario(
+        values['global_osc_samples'],
+        values['global_osc_interval_sec'],
+        values['global_mult_time_sec'],
+    )
+    for key, value in (overrides or {}).items():
+        if key in ('osc_samples', 'osc_interval_sec', 'mult_time_sec'):
+            setattr(scenario, key, type(getattr(scenario, key))(value))
+    return scenario
+
+
+def publish_multimeter_reading(measurement):
+    """Вызывается опросом мультиметра сервера для каждого нового показания"""
+    for queue in list(multimeter_subscribers):
+        try:
+            queue.put_nowait(measurement)
+        except asyncio.QueueFull:
+            pass
+
+
+class ScenarioRun:
+    """Одно выполнение сценария.
+
+    send — корутина, отправляющая сообщение клиенту; shared_multimeter —
+    True, если показания уже читает опрос сервера и их нужно получать по
+    подписке, а не из прибора напрямую.
+    """
+
+    def __init__(
+        self,
+        scenario,
+        visualizer=None,
+        multimeter=None,
+        send=None,
+        shared_multimeter=False,
+        active_test=None,
+    ):
+        self.scenario = scenario
+        self.visualizer = visualizer
+        self.multimeter = multimeter
+        self.send = send
+        self.shared_multimeter = shared_multimeter
+        self.active_test = active_test
+        self.sink = ClientEventSink(send or _discard)
+
+    async def log(self, line):
+        await self.sink.log(line)
+
+    async def send_waveforms(self, data):
+        for channel_name, channel_data in data.get('channels', {}).items():
+            if 'voltage' not in channel_data:
+                continue
+            await self.sink.handle(
+                {
+                    'event': 'waveform',
+                    'channel': channel_name,
+                    'time': base64.b64encode(
+                        pack_float32(channel_data.get('time', []))
+                    ).decode('ascii'),
+                    'voltage': base64.b64encode(
+                        pack_float32(channel_data['voltage'])
+                    ).decode('ascii'),
+                    'color': channel_data.get('color'),
+                    'settings': channel_data.get('settings', {}),
+                }
+            )
+        trigger = data.get('trigger') or {}
+        await self.sink.handle(
+            {
+                'event': 'trigger',
+                'level': trigger.get('level', data.get('trigger_level', 0)),
+                'mode': trigger.get('mode', 'Auto'),
+                'source': trigger.get('source', 'CH1'),
+                'slope': trigger.get('slope', 'Rising'),
+            }
+        )
+
+    async def run_oscilloscope(self):
+        from backend.measurement import save_oscilloscope_data
+
+        samples = self.scenario.osc_samples
+        if samples <= 0:
+            return True
+        if self.visualizer is None:
+            await self.log("Осциллограф не инициализирован")
+            return False
+        if not self.visualizer.connected:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.visualizer.connect_to_oscilloscope)
+            if not self.visualizer.connected:
+                await self.log("Не удалось подключиться к осциллографу")
+                return False
+
+        loop = asyncio.get_running_loop()
+        success = True
+        for i in range(samples):
+            started = loop.time()
+            await self.log(f"Получение выборки {i + 1}/{samples}")
+            data = await self.visualizer.get_oscilloscope_data()
+            if 'error' in data:
+                await self.log(f"Ошибка получения данных: {data['error']}")
+                success = False
+            else:
+                saved = await run_db(
+                    save_oscilloscope_data,
+                    data,
+                    force_save=True,
+                    active_test=self.active_test,
+                )
+                success = success and saved
+                await self.send_waveforms(data)
+            await self.sink.report_progress('oscilloscope', i + 1, samples)
+            delay = self.scenario.osc_interval_sec - (loop.time() - started)
+            if delay > 0 and i + 1 < samples:
+                await asyncio.sleep(delay)
+        return success
+
+    async def _read_multimeter_direct(self):
+        reader = self.multimeter
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            lambda: reader.read_serial() if reader.serial_port else reader.read_hid(),
+        )
+
+    async def run_multimeter(self):
+        from backend.measurement import save_multimeter_data
+
+        duration = self.scenario.mult_time_sec
+        if duration <= 0:
+            return True
+        if not self.shared_multimeter and (
+            self.multimeter is None or not self.multimeter.connected
+        ):
+            await self.log("Мультиметр не подключен")
+            return False
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + duration
+        queue = None
+        if self.shared_multimeter:
+            queue = asyncio.Queue(MULTIMETER_QUEUE_SIZE)
+            multimeter_subscribers.add(queue)
+        count = 0
+        try:
+            while loop.time() < deadline:
+                measurement = None
+                if queue is not None:
+                    try:
+                        measurement = await asyncio.wait_for(
+                            queue.get(), timeout=min(1.0, deadline - loop.time())
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    measurement, _ = await self._read_multimeter_direct()
+                    if measurement:
+                        await self.sink.handle(
+                            {
+                                'event': 'reading',
+                                'source': 'multimeter',
+                                'data': measurement,
+                            }
+                        )
+                    await asyncio.sleep(MULTIMETER_POLL_INTERVAL)
+                if measurement:
+                    count += 1
+                    await run_db(
+                        save_multimeter_data,
+                        measurement,
+                        force_save=True,
+                        active_test=self.active_test,
+                    )
+                await self.sink.report_progress(
+                    'multimeter', min(duration, loop.time() - started), duration
+                )
+        finally:
+            if queue is not None:
+                multimeter_subscribers.discard(queue)
+        await self.log(f"Мультиметр: записано показаний {count}")
+        return True
+
+    async def run(self):
+        """Выполняет сценарий; True, если обе части прошли без ошибок"""
+        parts = []
+        if self.scenario.osc_samples > 0:
+            parts.append('oscilloscope')
+        if self.scenario.mult_time_sec > 0:
+            parts.append('multimeter')
+        self.sink.expect_progress(*parts)
+        async with self.sink:
+            await self.log("=== START PARALLEL TEST SCENARIO ===")
+            try:
+                results = await asyncio.gather(
+                    self.run_oscilloscope(), self.run_multimeter()
+                )
+                success = all(results)
+            except Exception as e:
+                print(f"Ошибка выполнения сценария: {e}")
+                traceback.print_exc()
+                await self.log(f"Ошибка выполнения сценария: {e}")
+                success = False
+            await self.log("=== PARALLEL TEST SCENARIO FINISHED ===")
+        await self.sink.emit({'type': 'lua_status', 'success': success})
+        return success
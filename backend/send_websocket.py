@@ -1,17 +1,57 @@
 import asyncio
 import json
+import time
+
+from websockets.protocol import State
+
+from backend.metrics import gauge, histogram, register_collector
 
 active_websockets = set()
 
+WEBSOCKET_FANOUT_SECONDS = histogram(
+    'websocket_fanout_seconds', 'Время рассылки сообщения всем клиентам'
+)
+WEBSOCKET_CLIENTS = gauge('websocket_clients', 'Подключённые клиенты WebSocket')
+WEBSOCKET_SEND_BUFFER = gauge(
+    'websocket_send_buffer_bytes', 'Неотправленные байты в буфере клиента'
+)
+
+
+def is_websocket_open(client):
+    if hasattr(client, 'open'):
+        return client.open
+    return getattr(client, 'state', None) is State.OPEN
+
+
+def _collect_client_metrics():
+    """Очередь отправки каждого клиента: медленный клиент копит байты"""
+    WEBSOCKET_CLIENTS.set(len(active_websockets))
+    buffers = {}
+    for client in list(active_websockets):
+        transport = getattr(client, 'transport', None)
+        if transport is None or not is_websocket_open(client):
+            continue
+        address = getattr(client, 'remote_address', None) or ('?', id(client))
+        name = ':'.join(str(part) for part in address[:2])
+        buffers[name] = transport.get_write_buffer_size()
+    # отключившиеся клиенты не должны оставаться в выдаче
+    WEBSOCKET_SEND_BUFFER.clear()
+    for name, size in buffers.items():
+        WEBSOCKET_SEND_BUFFER.set(size, client=name)
+
+
+register_collector(_collect_client_metrics)
+
 
 async def send_to_all_websocket_clients(message):
     global active_websockets
     if active_websockets:
+        started = time.perf_counter()
         websockets_to_remove = []
         send_tasks = []
         for client in active_websockets:
             try:
-                if hasattr(client, 'open') and client.open:
+                if is_websocket_open(client):
                     send_task = asyncio.create_task(
                         client.send(json.dumps(message))
                     )
@@ -26,3 +66,4 @@ async def send_to_all_websocket_clients(message):
                 active_websockets.remove(client)
         if send_tasks:
             await asyncio.wait(send_tasks, return_when=asyncio.ALL_COMPLETED)
+        WEBSOCKET_FANOUT_SECONDS.observe(time.perf_counter() - started)
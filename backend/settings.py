@@ -1,6 +1,4 @@
-import asyncio
-
-http_event_loop = asyncio.get_event_loop()
+import os
 
 current_uart_data = {
     'temp600_1': 0.0,
@@ -13,6 +11,29 @@ current_uart_data = {
 
 HTTP_PORT = 8080
 
+STATIC_ROOT = 'frontend'
+STATIC_MAX_AGE = 300
+
+TESTS_DIR = os.environ.get('STAND_TESTS_DIR', 'test_data')
+
+# пачек UART, ждущих записи в db_executor; сверх этого при отставании БД
+# пачки не пишутся (счётчик uart_saves_dropped_total), а не копятся в памяти
+UART_MAX_PENDING_SAVES = 64
+
+# одновременно выполняемые Lua-скрипты и время на один запуск, с
+LUA_MAX_CONCURRENT_RUNS = 2
+LUA_RUN_TIMEOUT = 300
+# 'subprocess' — внешний lua, 'embedded' — встроенная среда (нужен lupa)
+LUA_ENGINE = 'subprocess'
+
+# журнал: уровень, формат ('json' или 'text'), очередь записей и не больше
+# LOG_RATE_LIMIT записей одного шаблона за LOG_RATE_INTERVAL, с
+LOG_LEVEL = 'INFO'
+LOG_FORMAT = 'json'
+LOG_QUEUE_SIZE = 10000
+LOG_RATE_LIMIT = 10
+LOG_RATE_INTERVAL = 1.0
+
 global_multimeter = None
 last_multimeter_values = {}
 is_measurement_active = True
@@ -1,6 +1,7 @@
 import json
 import locale
 import sys
+import time
 import traceback
 from datetime import datetime
 
@@ -8,8 +9,16 @@ import numpy as np
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
+from backend.catalog import (abort_stale_tests, fan_out, get_entry,
+                             list_entries, max_test_number,
+                             move_tables_to_test_file, register_test,
+                             session_for_table, session_for_test,
+                             table_number_for)
 from backend.engine import engine, Base, Session
+from backend.log import get_logger
+from backend.measurement import multimeter_numeric_fields
 from backend.models import MultimeterData, OscilloscopeData, UARTData
+from backend.timestamps import format_timestamp, now_ns, timestamp_to_ns
 
 if sys.platform.startswith('win'):
     locale.setlocale(locale.LC_ALL, 'Russian_Russia.UTF-8')
@@ -18,10 +27,197 @@ if sys.platform.startswith('win'):
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
+logger = get_logger('db')
+
+MIGRATION_BATCH_ROWS = 5000
+MULTIMETER_NUMERIC_COLUMNS = (
+    ('value_si', 'REAL'),
+    ('overload', 'INTEGER DEFAULT 0'),
+    ('unit_code', 'INTEGER'),
+    ('mode_code', 'INTEGER'),
+    ('range_code', 'INTEGER'),
+)
+TEST_TABLE_PREFIXES = {
+    'multimeter': 'мультиметр',
+    'oscilloscope': 'осциллограф',
+    'uart': 'uart',
+}
+
+
+def add_missing_columns(session, table, columns):
+    """ALTER TABLE ADD COLUMN для колонок, которых ещё нет в таблице"""
+    existing = {
+        row[1] for row in session.execute(text(f'PRAGMA table_info("{table}")'))
+    }
+    added = []
+    for name, column_type in columns:
+        if name not in existing:
+            session.execute(
+                text(f'ALTER TABLE "{table}" ADD COLUMN {name} {column_type}')
+            )
+            added.append(name)
+    return added
+
+
+def backfill_multimeter_numeric(session, table, batch_size=MIGRATION_BATCH_ROWS):
+    """Заполняет числовые поля мультиметра по строковым значениям для
+    записей, сохранённых до их появления"""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            text(
+                f'SELECT id, value, unit, mode, range_str, raw_data FROM "{table}" '
+                "WHERE unit_code IS NULL AND id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {'last_id': last_id, 'limit': batch_size},
+        ).mappings().all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            fields = multimeter_numeric_fields(dict(row))
+            fields['id'] = row['id']
+            params.append(fields)
+        session.execute(
+            text(
+                f'UPDATE "{table}" SET value_si = :value_si, overload = :overload, '
+                'unit_code = :unit_code, mode_code = :mode_code, '
+                'range_code = :range_code WHERE id = :id'
+            ),
+            params,
+        )
+        session.commit()
+        updated += len(rows)
+        last_id = rows[-1]['id']
+    return updated
+
+
+def backfill_ts_ns(session, table, batch_size=MIGRATION_BATCH_ROWS):
+    """Заполняет ts_ns по строковому timestamp у старых записей; нераспознанные
+    метки получают 0, чтобы не разбирать их при каждом запуске"""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            text(
+                f'SELECT id, timestamp FROM "{table}" '
+                "WHERE ts_ns IS NULL AND id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {'last_id': last_id, 'limit': batch_size},
+        ).all()
+        if not rows:
+            break
+        session.execute(
+            text(f'UPDATE "{table}" SET ts_ns = :ts_ns WHERE id = :id'),
+            [
+                {'id': row_id, 'ts_ns': timestamp_to_ns(timestamp) or 0}
+                for row_id, timestamp in rows
+            ],
+        )
+        session.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+    return updated
+
+
+def list_data_tables(session):
+    """Рабочие таблицы и таблицы испытаний: [(вид, имя таблицы)]"""
+    tables = [
+        ('oscilloscope', OscilloscopeData.__tablename__),
+        ('multimeter', MultimeterData.__tablename__),
+        ('uart', UARTData.__tablename__),
+    ]
+    result = session.execute(
+        text(
+            "SELECT name FROM sqlite_master WHERE type='table' AND (name LIKE 'мультиметр_%' OR name LIKE 'осциллограф_%' OR name LIKE 'uart_%')"
+        )
+    )
+    for (name,) in result:
+        prefix, _, number = name.rpartition('_')
+        if not number.isdigit():
+            continue
+        kind = {
+            'мультиметр': 'multimeter',
+            'осциллограф': 'oscilloscope',
+            'uart': 'uart',
+        }.get(prefix)
+        if kind:
+            tables.append((kind, name))
+    return tables
+
+
+def migrate_schema():
+    """Доводит схему существующей БД до текущих моделей: недостающие колонки,
+    индексы и заполнение новых полей у старых записей"""
+    session = Session()
+    try:
+        for kind, table in list_data_tables(session):
+            columns = [('ts_ns', 'INTEGER')]
+            if kind == 'multimeter':
+                columns += MULTIMETER_NUMERIC_COLUMNS
+            added = add_missing_columns(session, table, columns)
+            if added:
+                print(f"Таблица {table}: добавлены колонки {', '.join(added)}")
+            # время ищется по ts_ns, строковый индекс больше не нужен
+            session.execute(text(f'DROP INDEX IF EXISTS "ix_{table}_timestamp"'))
+            session.execute(
+                text(
+                    f'CREATE INDEX IF NOT EXISTS "ix_{table}_ts_ns" '
+                    f'ON "{table}" (ts_ns)'
+                )
+            )
+            session.commit()
+            updated = backfill_ts_ns(session, table)
+            if updated:
+                print(f"Таблица {table}: заполнено время ts_ns у {updated} записей")
+            if kind == 'multimeter':
+                updated = backfill_multimeter_numeric(session, table)
+                if updated:
+                    print(
+                        f"Таблица {table}: заполнены числовые значения у {updated} записей"
+                    )
+    finally:
+        session.close()
+
+
+def migrate_legacy_tests():
+    """Переносит таблицы испытаний, созданные в общей БД, в отдельные файлы
+    испытаний и регистрирует их в каталоге"""
+    session = Session()
+    try:
+        numbers = sorted(
+            {
+                table_number_for(table)
+                for _, table in list_data_tables(session)
+                if table_number_for(table) is not None
+            }
+        )
+    finally:
+        session.close()
+    for test_number in numbers:
+        if get_entry(test_number) is not None:
+            print(
+                f"Испытание #{test_number} уже есть в каталоге, "
+                "таблицы в общей БД оставлены без изменений"
+            )
+            continue
+        register_test(test_number, status='completed')
+        tables = [f"{prefix}_{test_number}" for prefix in TEST_TABLE_PREFIXES.values()]
+        with engine.connect() as connection:
+            moved = move_tables_to_test_file(connection, test_number, tables)
+        print(f"Испытание #{test_number} перенесено в отдельный файл: {', '.join(moved)}")
+
+
 def setup_database():
     print("Проверка и создание рабочих таблиц базы данных...")
     try:
         Base.metadata.create_all(engine)
+        migrate_schema()
+        migrate_legacy_tests()
+        stale = abort_stale_tests()
+        if stale:
+            print(f"Прерванные при остановке сервера испытания: {stale}")
         
         session = Session()
         result = session.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))
@@ -43,40 +239,14 @@ database_initialized = setup_database()
 
 
 def get_next_test_number():
-    session = Session()
-    try:
-        result = session.execute(
-            text(
-                "SELECT name FROM sqlite_master WHERE type='table' AND (name LIKE 'мультиметр_%' OR name LIKE 'осциллограф_%' OR name LIKE 'uart_%')"
-            )
-        )
-        existing_tests = set()
-        for row in result:
-            name = row[0]
-            if (
-                name.startswith('мультиметр_')
-                or name.startswith('осциллограф_')
-                or name.startswith('uart_')
-            ):
-                try:
-                    number = int(name.split('_')[-1])
-                    existing_tests.add(number)
-                except Exception:
-                    continue
-        if not existing_tests:
-            return 1
-        return max(existing_tests) + 1
-    except Exception as e:
-        print(f"Ошибка при получении номера испытания: {e}")
-        traceback.print_exc()
-        return 1
-    finally:
-        session.close()
+    """Номер, который получит следующее испытание (сам номер выделяет
+    catalog.allocate_test_number)"""
+    return (max_test_number() or 0) + 1
 
 
 def create_uart_table(test_number):
     """Создаёт таблицу для данных UART нового испытания"""
-    session = Session()
+    session = session_for_table(f"uart_{test_number}")
     try:
         uart_table = f"uart_{test_number}"
         create_uart_sql = f"""
@@ -89,9 +259,16 @@ def create_uart_table(test_number):
             payload_len INTEGER,
             payload BLOB,
             crc_one INTEGER,
-            crc_two INTEGER
+            crc_two INTEGER,
+            ts_ns INTEGER
         )"""
         session.execute(text(create_uart_sql))
+        session.execute(
+            text(
+                f'CREATE INDEX IF NOT EXISTS "ix_{uart_table}_ts_ns" '
+                f'ON "{uart_table}" (ts_ns)'
+            )
+        )
         session.commit()
         print(f"Создана таблица испытания: {uart_table}")
         return uart_table
@@ -104,7 +281,15 @@ def create_uart_table(test_number):
 
 
 def create_test_tables(test_number):
-    session = Session()
+    """Создаёт файл испытания с его таблицами и регистрирует его в каталоге"""
+    try:
+        if get_entry(test_number) is None:
+            register_test(test_number)
+        session = session_for_test(test_number)
+    except Exception as e:
+        print(f"Ошибка при регистрации испытания: {e}")
+        traceback.print_exc()
+        return None, None, None
     try:
         mult_table = f"мультиметр_{test_number}"
         osc_table = f"осциллограф_{test_number}"
@@ -119,7 +304,13 @@ def create_test_tables(test_number):
             mode TEXT,
             range_str TEXT,
             measure_type TEXT,
-            raw_data JSON
+            raw_data JSON,
+            value_si REAL,
+            overload INTEGER DEFAULT 0,
+            unit_code INTEGER,
+            mode_code INTEGER,
+            range_code INTEGER,
+            ts_ns INTEGER
         )
         """
 
@@ -130,7 +321,8 @@ def create_test_tables(test_number):
             channel TEXT,
             time_data TEXT,
             voltage_data TEXT,
-            raw_data JSON
+            raw_data JSON,
+            ts_ns INTEGER
         )
         """
 
@@ -154,13 +346,21 @@ def create_test_tables(test_number):
             crc_two INTEGER,
             data_type TEXT,
             raw_data JSON,
-            test_number INTEGER
+            test_number INTEGER,
+            ts_ns INTEGER
         )
         """
 
         session.execute(text(create_mult_sql))
         session.execute(text(create_osc_sql))
         session.execute(text(create_uart_sql))
+        for table in (mult_table, osc_table, uart_table):
+            session.execute(
+                text(
+                    f'CREATE INDEX IF NOT EXISTS "ix_{table}_ts_ns" '
+                    f'ON "{table}" (ts_ns)'
+                )
+            )
         session.commit()
         print(f"Созданы таблицы испытания: {mult_table}, {osc_table}, {uart_table}")
         return mult_table, osc_table, uart_table
@@ -177,9 +377,10 @@ def save_oscilloscope_data_to_test(data, osc_table):
     """Сохраняет данные осциллографа в таблицу испытания"""
     if not osc_table:
         return False
-    session = Session()
+    session = session_for_table(osc_table)
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        ts_ns = now_ns()
+        timestamp = format_timestamp(datetime.fromtimestamp(ts_ns / 1e9))
         import base64
 
         if data.get('channels'):
@@ -192,13 +393,14 @@ def save_oscilloscope_data_to_test(data, osc_table):
                         channel_data['voltage'], dtype=np.float32
                     ).tobytes()
                     insert_sql = f"""
-                    INSERT INTO {osc_table} (timestamp, channel, time_data, voltage_data, raw_data)
-                    VALUES (:timestamp, :channel, :time_data, :voltage_data, :raw_data)
+                    INSERT INTO {osc_table} (timestamp, channel, time_data, voltage_data, raw_data, ts_ns)
+                    VALUES (:timestamp, :channel, :time_data, :voltage_data, :raw_data, :ts_ns)
                     """
                     session.execute(
                         text(insert_sql),
                         {
                             'timestamp': timestamp,
+                            'ts_ns': ts_ns,
                             'channel': channel_name,
                             'time_data': base64.b64encode(time_bytes).decode(
                                 'utf-8'
@@ -210,8 +412,8 @@ def save_oscilloscope_data_to_test(data, osc_table):
                         },
                     )
         session.commit()
-        print(
-            f"Данные осциллографа сохранены в таблицу испытания: {osc_table}"
+        logger.debug(
+            "Данные осциллографа сохранены в таблицу испытания: %s", osc_table
         )
         return True
     except Exception as e:
@@ -229,11 +431,17 @@ def save_multimeter_data_to_test(data, mult_table):
     """Сохраняет данные мультиметра в таблицу испытания"""
     if not mult_table:
         return False
-    session = Session()
+    session = session_for_table(mult_table)
     try:
         insert_sql = f"""
-        INSERT INTO {mult_table} (timestamp, value, unit, mode, range_str, measure_type, raw_data)
-        VALUES (:timestamp, :value, :unit, :mode, :range_str, :measure_type, :raw_data)
+        INSERT INTO {mult_table} (
+            timestamp, value, unit, mode, range_str, measure_type, raw_data,
+            value_si, overload, unit_code, mode_code, range_code, ts_ns
+        )
+        VALUES (
+            :timestamp, :value, :unit, :mode, :range_str, :measure_type, :raw_data,
+            :value_si, :overload, :unit_code, :mode_code, :range_code, :ts_ns
+        )
         """
         session.execute(
             text(insert_sql),
@@ -245,11 +453,13 @@ def save_multimeter_data_to_test(data, mult_table):
                 'range_str': data.get('range_str', ''),
                 'measure_type': data.get('measure_type', ''),
                 'raw_data': json.dumps(data.get('raw_data', {})),
+                'ts_ns': timestamp_to_ns(data.get('timestamp')) or now_ns(),
+                **multimeter_numeric_fields(data),
             },
         )
         session.commit()
-        print(
-            f"Данные мультиметра сохранены в таблицу испытания: {mult_table}"
+        logger.debug(
+            "Данные мультиметра сохранены в таблицу испытания: %s", mult_table
         )
         return True
     except Exception as e:
@@ -264,20 +474,23 @@ def save_multimeter_data_to_test(data, mult_table):
 def save_uart_data_to_test(data, uart_table):
     if not uart_table:
         return False
-    session = Session()
+    session = session_for_table(uart_table)
     try:
         insert_sql = f"""
         INSERT INTO {uart_table} (
-            timestamp, start_byte, command, status, payload_len, payload, crc_one, crc_two
+            timestamp, start_byte, command, status, payload_len, payload, crc_one, crc_two,
+            ts_ns
         )
         VALUES (
-            :timestamp, :start_byte, :command, :status, :payload_len, :payload, :crc_one, :crc_two
+            :timestamp, :start_byte, :command, :status, :payload_len, :payload, :crc_one, :crc_two,
+            :ts_ns
         )
         """
         session.execute(
             text(insert_sql),
             {
                 'timestamp': data.get('timestamp', ''),
+                'ts_ns': timestamp_to_ns(data.get('timestamp')) or now_ns(),
                 'start_byte': data.get('start_byte'),
                 'command': data.get('command'),
                 'status': data.get('status'),
@@ -288,7 +501,7 @@ def save_uart_data_to_test(data, uart_table):
             },
         )
         session.commit()
-        print(f"Данные UART сохранены в таблицу испытания: {uart_table}")
+        logger.debug("Данные UART сохранены в таблицу испытания: %s", uart_table)
         return True
     except Exception as e:
         session.rollback()
@@ -299,109 +512,159 @@ def save_uart_data_to_test(data, uart_table):
         session.close()
 
 
+def save_uart_packets_to_test(packets, uart_table):
+    """Сохраняет пачку сырых пакетов UART в таблицу испытания"""
+    if not uart_table or not packets:
+        return False
+    session = session_for_table(uart_table)
+    try:
+        session.execute(
+            text(
+                f"""
+                INSERT INTO {uart_table} (
+                    timestamp, start_byte, command, status, payload_len, payload,
+                    crc_one, crc_two, data_type, ts_ns
+                )
+                VALUES (
+                    :timestamp, :start_byte, :command, :status, :payload_len, :payload,
+                    :crc_one, :crc_two, 'raw_packet', :ts_ns
+                )
+                """
+            ),
+            [
+                {
+                    'timestamp': data.get('timestamp', ''),
+                    'ts_ns': timestamp_to_ns(data.get('timestamp')) or now_ns(),
+                    'start_byte': data.get('start_byte'),
+                    'command': data.get('command'),
+                    'status': data.get('status'),
+                    'payload_len': data.get('payload_len'),
+                    'payload': data.get('payload'),
+                    'crc_one': data.get('crc_one'),
+                    'crc_two': data.get('crc_two'),
+                }
+                for data in packets
+            ],
+        )
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        print(f"Ошибка сохранения пачки пакетов UART в таблицу испытания: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        session.close()
+
+
+def save_uart_sensor_frames_to_test(frames, uart_table):
+    """Сохраняет пачку кадров датчиков UART в таблицу испытания"""
+    if not uart_table or not frames:
+        return False
+    session = session_for_table(uart_table)
+    try:
+        params = []
+        for frame in frames:
+            sensor_data = frame.get('data', {})
+            timestamp = frame.get('timestamp') or format_timestamp()
+            params.append(
+                {
+                    'timestamp': timestamp,
+                    'ts_ns': timestamp_to_ns(timestamp) or now_ns(),
+                    'temp600_1': sensor_data.get('temp600_1'),
+                    'temp600_2': sensor_data.get('temp600_2'),
+                    'tempNormal1': sensor_data.get('tempNormal1'),
+                    'tempNormal2': sensor_data.get('tempNormal2'),
+                    'thrust1': sensor_data.get('thrust1'),
+                    'raw_data': json.dumps(sensor_data),
+                }
+            )
+        session.execute(
+            text(
+                f"""
+                INSERT INTO {uart_table} (
+                    timestamp, temp600_1, temp600_2, tempNormal1, tempNormal2, thrust1,
+                    data_type, raw_data, ts_ns
+                )
+                VALUES (
+                    :timestamp, :temp600_1, :temp600_2, :tempNormal1, :tempNormal2, :thrust1,
+                    'sensor_data', :raw_data, :ts_ns
+                )
+                """
+            ),
+            params,
+        )
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        print(f"Ошибка сохранения пачки данных датчиков в таблицу испытания: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        session.close()
+
+
 def start_new_test():
-    from main import move_working_tables_to_test
-
-    global current_test_number, current_multimeter_table, current_oscilloscope_table, current_uart_table
-    current_test_number = get_next_test_number()
-    (
-        current_multimeter_table,
-        current_oscilloscope_table,
-        current_uart_table,
-    ) = create_test_tables(current_test_number)
-    if (
-        current_multimeter_table
-        and current_oscilloscope_table
-        and current_uart_table
-    ):
-        print(f"Начато новое испытание #{current_test_number}")
-        move_working_tables_to_test(current_test_number)
-        return current_test_number
-    else:
-        print("Ошибка при создании таблиц испытания")
-        return None
+    """Начинает новое испытание; идущее при этом завершается.
+    Состояние хранит backend.lifecycle"""
+    from backend.lifecycle import test_lifecycle
 
+    return test_lifecycle.start()
 
-current_uart_table = None
+
+def _test_summary(session, test_number):
+    mult_table = f"мультиметр_{test_number}"
+    osc_table = f"осциллограф_{test_number}"
+    if not table_exists(session, mult_table) or not table_exists(session, osc_table):
+        return None
+    count_mult = session.execute(text(f"SELECT COUNT(*) FROM {mult_table}"))
+    count_osc = session.execute(text(f"SELECT COUNT(*) FROM {osc_table}"))
+    record_count = count_mult.fetchone()[0] + count_osc.fetchone()[0]
+    time_mult = session.execute(
+        text(f"SELECT MIN(timestamp), MAX(timestamp) FROM {mult_table}")
+    )
+    time_osc = session.execute(
+        text(f"SELECT MIN(timestamp), MAX(timestamp) FROM {osc_table}")
+    )
+    t1 = time_mult.fetchone()
+    t2 = time_osc.fetchone()
+    start_time = (
+        min([x for x in [t1[0], t2[0]] if x]) if t1[0] or t2[0] else "Неизвестно"
+    )
+    end_time = (
+        max([x for x in [t1[1], t2[1]] if x]) if t1[1] or t2[1] else "Неизвестно"
+    )
+    return {
+        'number': test_number,
+        'multimeter_table': mult_table,
+        'oscilloscope_table': osc_table,
+        'record_count': record_count,
+        'start_time': start_time,
+        'end_time': end_time,
+    }
 
 
 def get_test_list():
-    """Возвращает список всех испытаний"""
-    session = Session()
+    """Возвращает список всех испытаний из каталога; сводка по каждому
+    считается в его собственном файле"""
     try:
-        result = session.execute(
-            text(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'мультиметр_%' ORDER BY name"
-            )
-        )
+        entries = {entry.number: entry for entry in list_entries()}
         tests = []
-        for row in result:
-            mult_table = row[0]
-            try:
-                test_number = int(mult_table.split('_')[-1])
-                osc_table = f"осциллограф_{test_number}"
-                check_osc = session.execute(
-                    text(
-                        "SELECT name FROM sqlite_master WHERE type='table' AND name = :osc"
-                    ),
-                    {'osc': osc_table},
-                )
-                if not check_osc.fetchone():
-                    continue
-                count_mult = session.execute(
-                    text(f"SELECT COUNT(*) FROM {mult_table}")
-                )
-                count_osc = session.execute(
-                    text(f"SELECT COUNT(*) FROM {osc_table}")
-                )
-                record_count = (
-                    count_mult.fetchone()[0] + count_osc.fetchone()[0]
-                )
-                time_mult = session.execute(
-                    text(
-                        f"SELECT MIN(timestamp), MAX(timestamp) FROM {mult_table}"
-                    )
-                )
-                time_osc = session.execute(
-                    text(
-                        f"SELECT MIN(timestamp), MAX(timestamp) FROM {osc_table}"
-                    )
-                )
-                t1 = time_mult.fetchone()
-                t2 = time_osc.fetchone()
-                start_time = (
-                    min([x for x in [t1[0], t2[0]] if x])
-                    if t1[0] or t2[0]
-                    else "Неизвестно"
-                )
-                end_time = (
-                    max([x for x in [t1[1], t2[1]] if x])
-                    if t1[1] or t2[1]
-                    else "Неизвестно"
-                )
-                tests.append(
-                    {
-                        'number': test_number,
-                        'multimeter_table': mult_table,
-                        'oscilloscope_table': osc_table,
-                        'record_count': record_count,
-                        'start_time': start_time,
-                        'end_time': end_time,
-                    }
-                )
-            except Exception:
+        for test_number, summary in fan_out(_test_summary, list(entries)).items():
+            if summary is None:
                 continue
+            summary['status'] = entries[test_number].status
+            tests.append(summary)
         return sorted(tests, key=lambda x: x['number'])
     except Exception as e:
         print(f"Ошибка при получении списка испытаний: {e}")
         return []
-    finally:
-        session.close()
 
 
 def get_test_data(test_number, data_type=None, limit=100, page=1):
     """Возвращает данные конкретного испытания с поддержкой пагинации"""
-    session = Session()
+    session = session_for_table(f"мультиметр_{test_number}")
     try:
         mult_table = f"мультиметр_{test_number}"
         osc_table = f"осциллограф_{test_number}"
@@ -483,144 +746,182 @@ def get_test_data(test_number, data_type=None, limit=100, page=1):
         session.close()
 
 
-def get_oscilloscope_data_paginated(page=1, per_page=50, test_number=None):
-    session = Session()
+COUNT_CACHE_TTL = 10.0
+_count_cache = {}
+
+OSCILLOSCOPE_COLUMNS = (
+    'id', 'timestamp', 'channel', 'time_data', 'voltage_data', 'raw_data',
+)
+MULTIMETER_COLUMNS = (
+    'id', 'timestamp', 'value', 'unit', 'mode', 'range_str', 'measure_type',
+    'raw_data', 'value_si', 'overload', 'unit_code', 'mode_code', 'range_code',
+)
+UART_COLUMNS = (
+    'id', 'timestamp', 'data_type', 'temp600_1', 'temp600_2', 'tempNormal1',
+    'tempNormal2', 'thrust1', 'gauge_id', 'calibration_value', 'command',
+    'raw_data', 'test_number',
+)
+
+
+def _row_to_dict(row):
+    item = dict(row)
+    raw_data = item.get('raw_data')
+    if isinstance(raw_data, str):
+        try:
+            item['raw_data'] = json.loads(raw_data)
+        except ValueError:
+            pass
+    for key, value in item.items():
+        if isinstance(value, (bytes, memoryview)):
+            item[key] = bytes(value).hex()
+    return item
+
+
+def cached_count(session, table, where=None, params=None):
+    """COUNT(*) по таблице, запомненный на COUNT_CACHE_TTL секунд: листание
+    страниц не пересчитывает миллионы строк на каждый запрос"""
+    key = (table, where, tuple(sorted((params or {}).items())))
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached and now - cached[1] < COUNT_CACHE_TTL:
+        return cached[0]
+    sql = f'SELECT COUNT(*) FROM "{table}"'
+    if where:
+        sql += f" WHERE {where}"
+    total = session.execute(text(sql), params or {}).scalar() or 0
+    _count_cache[key] = (total, now)
+    return total
+
+
+def fetch_page(
+    session,
+    table,
+    columns=None,
+    per_page=50,
+    page=1,
+    before_id=None,
+    after_id=None,
+    where=None,
+    params=None,
+):
+    """Страница записей от новых к старым.
+
+    before_id / after_id — курсоры: записи старше или новее указанного id.
+    Выборка идёт по первичному ключу, поэтому глубокие страницы стоят столько
+    же, сколько первая, и не сдвигаются при вставке новых записей. Без
+    курсора работает прежняя нумерация страниц через OFFSET.
+    """
+    conditions = [where] if where else []
+    params = dict(params or {})
+    if before_id is not None:
+        conditions.append('id < :before_id')
+        params['before_id'] = before_id
+    elif after_id is not None:
+        conditions.append('id > :after_id')
+        params['after_id'] = after_id
+    ascending = after_id is not None and before_id is None
+
+    select = ', '.join(columns) if columns else '*'
+    sql = f'SELECT {select} FROM "{table}"'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f" ORDER BY id {'ASC' if ascending else 'DESC'} LIMIT :limit"
+    params['limit'] = per_page + 1
+    if before_id is None and after_id is None and page > 1:
+        sql += ' OFFSET :offset'
+        params['offset'] = (page - 1) * per_page
+
+    result = session.execute(text(sql), params)
+    rows = [_row_to_dict(row) for row in result.mappings()]
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if ascending:
+        rows.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_older = has_more
+        has_newer = before_id is not None or page > 1
+    return rows, {
+        'next_before_id': rows[-1]['id'] if rows and has_older else None,
+        'prev_after_id': rows[0]['id'] if rows and has_newer else None,
+    }
+
+
+def _paginated(
+    table, columns, page, per_page, before_id, after_id, where=None, params=None
+):
+    session = session_for_table(table)
     try:
-        if test_number is None:
-            total = session.query(OscilloscopeData).count()
-            results = (
-                session.query(OscilloscopeData)
-                .order_by(OscilloscopeData.id.desc())
-                .offset((page - 1) * per_page)
-                .limit(per_page)
-                .all()
-            )
-            data = [
-                {
-                    'id': row.id,
-                    'timestamp': row.timestamp,
-                    'channel': row.channel,
-                    'time_data': row.time_data,
-                    'voltage_data': row.voltage_data,
-                    'raw_data': row.raw_data,
-                }
-                for row in results
-            ]
-        else:
-            table = f"осциллограф_{test_number}"
-            offset = (page - 1) * per_page
-            total_result = session.execute(
-                text(f"SELECT COUNT(*) FROM {table}")
-            )
-            total = total_result.fetchone()[0]
-            result = session.execute(
-                text(
-                    f"SELECT * FROM {table} ORDER BY id DESC LIMIT :limit OFFSET :offset"
-                ),
-                {'limit': per_page, 'offset': offset},
-            )
-            data = [
-                {
-                    'id': row[0],
-                    'timestamp': row[1],
-                    'channel': row[2],
-                    'time_data': row[3],
-                    'voltage_data': row[4],
-                    'raw_data': row[5],
-                }
-                for row in result
-            ]
-        return {
+        data, cursors = fetch_page(
+            session,
+            table,
+            columns,
+            per_page=per_page,
+            page=page,
+            before_id=before_id,
+            after_id=after_id,
+            where=where,
+            params=params,
+        )
+        total = cached_count(session, table, where, params)
+        result = {
             'data': data,
             'total': total,
             'page': page,
             'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page,
+            'total_pages': max(1, (total + per_page - 1) // per_page),
         }
+        result.update(cursors)
+        return result
+    finally:
+        session.close()
+
+
+def _empty_page(page, per_page):
+    return {
+        'data': [],
+        'total': 0,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': 1,
+        'next_before_id': None,
+        'prev_after_id': None,
+    }
+
+
+def get_oscilloscope_data_paginated(
+    page=1, per_page=50, test_number=None, before_id=None, after_id=None
+):
+    if test_number is None:
+        table = OscilloscopeData.__tablename__
+    else:
+        table = f"осциллограф_{test_number}"
+    try:
+        return _paginated(
+            table, OSCILLOSCOPE_COLUMNS, page, per_page, before_id, after_id
+        )
     except Exception as e:
         print(f"Ошибка получения данных осциллографа с пагинацией: {e}")
         traceback.print_exc()
-        return {
-            'data': [],
-            'total': 0,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': 1,
-        }
-    finally:
-        session.close()
+        return _empty_page(page, per_page)
 
 
-def get_multimeter_data_paginated(page=1, per_page=50, test_number=None):
-    session = Session()
+def get_multimeter_data_paginated(
+    page=1, per_page=50, test_number=None, before_id=None, after_id=None
+):
+    if test_number is None:
+        table = MultimeterData.__tablename__
+    else:
+        table = f"мультиметр_{test_number}"
     try:
-        if test_number is None:
-            total = session.query(MultimeterData).count()
-            results = (
-                session.query(MultimeterData)
-                .order_by(MultimeterData.id.desc())
-                .offset((page - 1) * per_page)
-                .limit(per_page)
-                .all()
-            )
-            data = [
-                {
-                    'id': row.id,
-                    'timestamp': row.timestamp,
-                    'value': row.value,
-                    'unit': row.unit,
-                    'mode': row.mode,
-                    'range_str': row.range_str,
-                    'measure_type': row.measure_type,
-                    'raw_data': row.raw_data,
-                }
-                for row in results
-            ]
-        else:
-            table = f"мультиметр_{test_number}"
-            offset = (page - 1) * per_page
-            total_result = session.execute(
-                text(f"SELECT COUNT(*) FROM {table}")
-            )
-            total = total_result.fetchone()[0]
-            result = session.execute(
-                text(
-                    f"SELECT * FROM {table} ORDER BY id DESC LIMIT :limit OFFSET :offset"
-                ),
-                {'limit': per_page, 'offset': offset},
-            )
-            data = [
-                {
-                    'id': row[0],
-                    'timestamp': row[1],
-                    'value': row[2],
-                    'unit': row[3],
-                    'mode': row[4],
-                    'range_str': row[5],
-                    'measure_type': row[6],
-                    'raw_data': row[7],
-                }
-                for row in result
-            ]
-        return {
-            'data': data,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page,
-        }
+        return _paginated(
+            table, MULTIMETER_COLUMNS, page, per_page, before_id, after_id
+        )
     except Exception as e:
         print(f"Ошибка получения данных мультиметра с пагинацией: {e}")
         traceback.print_exc()
-        return {
-            'data': [],
-            'total': 0,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': 1,
-        }
-    finally:
-        session.close()
+        return _empty_page(page, per_page)
+
 
 def save_uart_sensor_data(sensor_data, test_number=None):
     """Сохраняет данные датчиков UART в основную таблицу"""
@@ -639,7 +940,7 @@ def save_uart_sensor_data(sensor_data, test_number=None):
         )
         session.add(db_record)
         session.commit()
-        print(f"Данные датчиков UART сохранены: {sensor_data}")
+        logger.debug("Данные датчиков UART сохранены: %s", sensor_data)
         return True
     except Exception as e:
         session.rollback()
@@ -649,6 +950,38 @@ def save_uart_sensor_data(sensor_data, test_number=None):
     finally:
         session.close()
 
+def save_uart_sensor_data_batch(frames, test_number=None):
+    """Сохраняет пачку кадров датчиков UART одной транзакцией"""
+    session = Session()
+    try:
+        records = []
+        for frame in frames:
+            sensor_data = frame.get('data', {})
+            records.append(
+                UARTData(
+                    timestamp=frame.get('timestamp')
+                    or datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                    temp600_1=sensor_data.get('temp600_1'),
+                    temp600_2=sensor_data.get('temp600_2'),
+                    tempNormal1=sensor_data.get('tempNormal1'),
+                    tempNormal2=sensor_data.get('tempNormal2'),
+                    thrust1=sensor_data.get('thrust1'),
+                    data_type='sensor_data',
+                    raw_data=sensor_data,
+                    test_number=test_number,
+                )
+            )
+        session.add_all(records)
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        print(f"Ошибка сохранения пачки данных датчиков UART: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        session.close()
+
 def save_uart_calibration_data(gauge_id, value, command=0x3D, test_number=None):
     """Сохраняет данные калибровки UART"""
     session = Session()
@@ -688,12 +1021,12 @@ def save_uart_raw_packet(data, test_number=None):
             crc_one=data.get('crc_one'),
             crc_two=data.get('crc_two'),
             data_type='raw_packet',
-            raw_data=data,
+            raw_data={'packet': bytes(data.get('packet', b'')).hex()},
             test_number=test_number
         )
         session.add(db_record)
         session.commit()
-        print(f"Сырые данные UART пакета сохранены: CMD={data.get('command')}")
+        logger.debug("Сырой пакет UART сохранён: CMD=%s", data.get('command'))
         return True
     except Exception as e:
         session.rollback()
@@ -703,27 +1036,61 @@ def save_uart_raw_packet(data, test_number=None):
     finally:
         session.close()
 
+def save_uart_raw_packets(packets, test_number=None):
+    """Сохраняет пачку сырых пакетов UART одной транзакцией"""
+    session = Session()
+    try:
+        session.add_all(
+            [
+                UARTData(
+                    timestamp=data.get('timestamp', ''),
+                    start_byte=data.get('start_byte'),
+                    command=data.get('command'),
+                    status=data.get('status'),
+                    payload_len=data.get('payload_len'),
+                    payload=data.get('payload'),
+                    crc_one=data.get('crc_one'),
+                    crc_two=data.get('crc_two'),
+                    data_type='raw_packet',
+                    raw_data={'packet': bytes(data.get('packet', b'')).hex()},
+                    test_number=test_number,
+                )
+                for data in packets
+            ]
+        )
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        print(f"Ошибка сохранения пачки сырых пакетов UART: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        session.close()
+
 def save_uart_sensor_data_to_test(sensor_data, uart_table):
     """Сохраняет данные датчиков UART в таблицу испытания"""
     if not uart_table:
         return False
-    session = Session()
+    session = session_for_table(uart_table)
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        ts_ns = now_ns()
+        timestamp = format_timestamp(datetime.fromtimestamp(ts_ns / 1e9))
         insert_sql = f"""
         INSERT INTO {uart_table} (
             timestamp, temp600_1, temp600_2, tempNormal1, tempNormal2, thrust1, 
-            data_type, raw_data
+            data_type, raw_data, ts_ns
         )
         VALUES (
             :timestamp, :temp600_1, :temp600_2, :tempNormal1, :tempNormal2, :thrust1,
-            :data_type, :raw_data
+            :data_type, :raw_data, :ts_ns
         )
         """
         session.execute(
             text(insert_sql),
             {
                 'timestamp': timestamp,
+                'ts_ns': ts_ns,
                 'temp600_1': sensor_data.get('temp600_1'),
                 'temp600_2': sensor_data.get('temp600_2'),
                 'tempNormal1': sensor_data.get('tempNormal1'),
@@ -734,7 +1101,7 @@ def save_uart_sensor_data_to_test(sensor_data, uart_table):
             },
         )
         session.commit()
-        print(f"Данные датчиков UART сохранены в таблицу испытания: {uart_table}")
+        logger.debug("Данные датчиков UART сохранены в таблицу испытания: %s", uart_table)
         return True
     except Exception as e:
         session.rollback()
@@ -744,104 +1111,88 @@ def save_uart_sensor_data_to_test(sensor_data, uart_table):
     finally:
         session.close()
 
-def get_uart_data_paginated(page=1, per_page=50, test_number=None, data_type=None):
+def get_uart_data_paginated(
+    page=1,
+    per_page=50,
+    test_number=None,
+    data_type=None,
+    before_id=None,
+    after_id=None,
+):
     """Получает данные UART с пагинацией"""
-    session = Session()
+    if test_number is None:
+        table = UARTData.__tablename__
+        columns = UART_COLUMNS
+    else:
+        table = f"uart_{test_number}"
+        columns = None
+    where = 'data_type = :data_type' if data_type else None
+    params = {'data_type': data_type} if data_type else None
     try:
-        if test_number is None:
-            query = session.query(UARTData)
-            if data_type:
-                query = query.filter(UARTData.data_type == data_type)
-            
-            total = query.count()
-            results = (
-                query.order_by(UARTData.id.desc())
-                .offset((page - 1) * per_page)
-                .limit(per_page)
-                .all()
-            )
-            
-            data = []
-            for row in results:
-                item = {
-                    'id': row.id,
-                    'timestamp': row.timestamp,
-                    'data_type': row.data_type,
-                    'temp600_1': row.temp600_1,
-                    'temp600_2': row.temp600_2,
-                    'tempNormal1': row.tempNormal1,
-                    'tempNormal2': row.tempNormal2,
-                    'thrust1': row.thrust1,
-                    'gauge_id': row.gauge_id,
-                    'calibration_value': row.calibration_value,
-                    'command': row.command,
-                    'raw_data': row.raw_data,
-                    'test_number': row.test_number
-                }
-                data.append(item)
-        else:
-            table = f"uart_{test_number}"
-            offset = (page - 1) * per_page
-            
-            base_sql = f"SELECT * FROM {table}"
-            count_sql = f"SELECT COUNT(*) FROM {table}"
-            
-            if data_type:
-                base_sql += f" WHERE data_type = '{data_type}'"
-                count_sql += f" WHERE data_type = '{data_type}'"
-            
-            base_sql += " ORDER BY id DESC LIMIT :limit OFFSET :offset"
-            
-            total_result = session.execute(text(count_sql))
-            total = total_result.fetchone()[0]
-            
-            result = session.execute(
-                text(base_sql),
-                {'limit': per_page, 'offset': offset}
-            )
-            
-            data = []
-            for row in result:
-                raw_data = json.loads(row[17]) if row[17] else {}
-                item = {
-                    'id': row[0],
-                    'timestamp': row[1],
-                    'temp600_1': row[2],
-                    'temp600_2': row[3],
-                    'tempNormal1': row[4],
-                    'tempNormal2': row[5],
-                    'thrust1': row[6],
-                    'gauge_id': row[7],
-                    'calibration_value': row[8],
-                    'command': row[9],
-                    'start_byte': row[10],
-                    'status': row[11],
-                    'payload_len': row[12],
-                    'payload': row[13],
-                    'crc_one': row[14],
-                    'crc_two': row[15],
-                    'data_type': row[16],
-                    'raw_data': raw_data,
-                    'test_number': row[18]
-                }
-                data.append(item)
-        
-        return {
-            'data': data,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': max(1, (total + per_page - 1) // per_page),
-        }
+        return _paginated(
+            table, columns, page, per_page, before_id, after_id, where, params
+        )
     except Exception as e:
         print(f"Ошибка получения данных UART с пагинацией: {e}")
         traceback.print_exc()
-        return {
-            'data': [],
-            'total': 0,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': 1,
-        }
+        return _empty_page(page, per_page)
+
+
+STREAM_BATCH_ROWS = 500
+
+
+def table_exists(session, table):
+    result = session.execute(
+        text("SELECT name FROM sqlite_master WHERE type='table' AND name = :name"),
+        {'name': table},
+    )
+    return result.fetchone() is not None
+
+
+def iter_table_rows(table, where=None, params=None, batch_size=STREAM_BATCH_ROWS):
+    """Построчно отдаёт записи таблицы по возрастанию id.
+
+    Строки читаются с курсора пачками по batch_size и не собираются в память
+    целиком, поэтому годится для выгрузки таблиц любого размера.
+    """
+    session = session_for_table(table)
+    try:
+        if not table_exists(session, table):
+            return
+        sql = f'SELECT * FROM "{table}"'
+        if where:
+            sql += f" WHERE {where}"
+        sql += " ORDER BY id"
+        result = session.execute(
+            text(sql), params or {}, execution_options={'yield_per': batch_size}
+        )
+        for row in result.mappings():
+            yield _row_to_dict(row)
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+def iter_test_rows(test_number, data_type=None):
+    """Построчно отдаёт записи испытания; у каждой записи поле type
+    указывает источник (multimeter, oscilloscope, uart)"""
+    for kind, prefix in TEST_TABLE_PREFIXES.items():
+        if data_type and data_type != kind:
+            continue
+        for row in iter_table_rows(f"{prefix}_{test_number}"):
+            row['type'] = kind
+            yield row
+
+
+def iter_data_rows(kind, test_number=None, data_type=None):
+    """Построчно отдаёт записи рабочей таблицы или таблицы испытания"""
+    if test_number is None:
+        table = {
+            'multimeter': MultimeterData.__tablename__,
+            'oscilloscope': OscilloscopeData.__tablename__,
+            'uart': UARTData.__tablename__,
+        }[kind]
+    else:
+        table = f"{TEST_TABLE_PREFIXES[kind]}_{test_number}"
+    if kind == 'uart' and data_type:
+        return iter_table_rows(table, 'data_type = :data_type', {'data_type': data_type})
+    return iter_table_rows(table)
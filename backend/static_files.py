@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from backend.settings import STATIC_ROOT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTENT_TYPES = {
+    '.html': 'text/html',
+    '.js': 'text/javascript',
+    '.css': 'text/css',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+}
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 512
+WATCH_INTERVAL = 1.0
+
+
+class StaticAsset:
+    """Файл фронтенда в памяти вместе со сжатыми вариантами и строгим ETag"""
+
+    def __init__(self, path, content_type, body, mtime):
+        self.path = path
+        self.content_type = content_type
+        self.body = body
+        self.mtime = mtime
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.encodings = {}
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(
+            COMPRESSIBLE_TYPES
+        ):
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body)
+
+    def select_encoding(self, accept_encoding):
+        """Возвращает (кодировка, тело) для заголовка Accept-Encoding"""
+        accepted = set()
+        for item in (accept_encoding or '').split(','):
+            name, _, params = item.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00'):
+                continue
+            accepted.add(name.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and encoding in accepted:
+                return encoding, self.encodings[encoding]
+        return None, self.body
+
+    def is_not_modified(self, headers):
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or self.etag in tags or ('W/' + self.etag) in tags
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.mtime) <= since
+        return False
+
+
+class StaticFileCache:
+    """Кэш статических файлов фронтенда.
+
+    Все файлы читаются и сжимаются один раз при старте; в режиме разработки
+    watch() следит за временем изменения и перечитывает изменённые файлы.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.assets = {}
+        self.dev_mode = False
+
+    def _resolve(self, relative_path):
+        path = os.path.abspath(os.path.join(self.root, relative_path.lstrip('/')))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    def _load_file(self, path, content_type=None):
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            body = f.read()
+        if content_type is None:
+            content_type = CONTENT_TYPES.get(
+                os.path.splitext(path)[1].lower(), 'application/octet-stream'
+            )
+        asset = StaticAsset(path, content_type, body, stat.st_mtime)
+        self.assets[path] = asset
+        return asset
+
+    def preload(self):
+        """Загружает в память все известные типы файлов из каталога фронтенда"""
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() in CONTENT_TYPES:
+                    self._load_file(os.path.join(directory, filename))
+        return len(self.assets)
+
+    def get(self, relative_path, content_type=None):
+        """Возвращает StaticAsset или None, если файла нет"""
+        path = self._resolve(relative_path)
+        if path is None:
+            return None
+        asset = self.assets.get(path)
+        if asset is not None:
+            return asset
+        if not os.path.isfile(path):
+            return None
+        return self._load_file(path, content_type)
+
+    def refresh(self):
+        """Перечитывает изменённые файлы и забывает удалённые"""
+        changed = []
+        for path, asset in list(self.assets.items()):
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                del self.assets[path]
+                changed.append(path)
+                continue
+            if mtime != asset.mtime:
+                self._load_file(path, asset.content_type)
+                changed.append(path)
+        return changed
+
+    async def watch(self, interval=WATCH_INTERVAL):
+        self.dev_mode = True
+        while True:
+            await asyncio.sleep(interval)
+            for path in self.refresh():
+                print(f"Статический файл обновлён: {os.path.relpath(path, self.root)}")
+
+
+static_cache = StaticFileCache(STATIC_ROOT)
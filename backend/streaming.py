@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+
+from backend.engine import stream_executor
+
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_QUEUE_SIZE = 8
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+_END = object()
+
+
+class _StreamError:
+    def __init__(self, error):
+        self.error = error
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def encode_rows(rows, stream_format='ndjson', chunk_size=STREAM_CHUNK_SIZE):
+    """Кодирует строки в NDJSON или JSON-массив и отдаёт куски около
+    chunk_size байт, не держа в памяти весь ответ"""
+    buffer = []
+    buffered = 0
+    separator = '\n' if stream_format == 'ndjson' else ','
+    if stream_format == 'json':
+        buffer.append('[')
+    first = True
+    for row in rows:
+        item = json.dumps(row, ensure_ascii=False, default=_json_default)
+        if stream_format == 'ndjson':
+            buffer.append(item + separator)
+        else:
+            buffer.append(item if first else separator + item)
+        first = False
+        buffered += len(item) + 1
+        if buffered >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            buffered = 0
+    if stream_format == 'json':
+        buffer.append(']')
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+async def iterate_in_thread(factory, *args, queue_size=STREAM_QUEUE_SIZE):
+    """Асинхронно перебирает синхронный генератор factory(*args), который
+    выполняется в отдельном пуле потоков выгрузок (stream_executor).
+
+    Очередь ограничена, поэтому медленный клиент притормаживает чтение из
+    БД, а не копит ответ в памяти. Если потребитель прекращает перебор
+    (клиент отключился), генератор закрывается и освобождает курсор.
+    Больше STREAM_WORKERS выгрузок одновременно не читают БД, остальные
+    ждут; запись показаний в db_executor от них не зависит.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(queue_size)
+    cancelled = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        iterator = factory(*args)
+        try:
+            for item in iterator:
+                if cancelled.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            if not cancelled.is_set():
+                put(_StreamError(e))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()
+            if not cancelled.is_set():
+                put(_END)
+
+    future = loop.run_in_executor(stream_executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, _StreamError):
+                raise item.error
+            yield item
+    finally:
+        cancelled.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await asyncio.shield(future)
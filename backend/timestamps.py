@@ -0,0 +1,47 @@
+import time
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+PARSE_FORMATS = (
+    TIMESTAMP_FORMAT,
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+)
+
+
+def format_timestamp(moment=None):
+    """Строка метки времени в формате таблиц: 2024-01-31 12:00:00.123"""
+    return (moment or datetime.now()).strftime(TIMESTAMP_FORMAT)[:-3]
+
+
+def _datetime_to_ns(moment):
+    seconds = int(moment.replace(microsecond=0).timestamp())
+    return seconds * 1_000_000_000 + moment.microsecond * 1000
+
+
+def timestamp_to_ns(value):
+    """Метка времени (строка таблиц, datetime или секунды) -> наносекунды
+    Unix-эпохи; None, если разобрать не удалось. Строки без часового пояса
+    считаются местным временем, как и при записи через datetime.now()"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return _datetime_to_ns(value)
+    if isinstance(value, (int, float)):
+        return int(value * 1e9)
+    for fmt in PARSE_FORMATS:
+        try:
+            moment = datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+        return _datetime_to_ns(moment)
+    return None
+
+
+def ns_to_timestamp(ns):
+    return format_timestamp(datetime.fromtimestamp(ns / 1e9))
+
+
+def now_ns():
+    return time.time_ns()
@@ -0,0 +1,145 @@
+"""
+Сквозные задержки показаний: от чтения прибора до отрисовки в браузере.
+
+Каждое показание (кадр UART, показание мультиметра, кадр осциллографа)
+получает Trace: номер и монотонную метку захвата (time.monotonic_ns). По
+пути показания вызывается trace.mark(stage) — длительность от предыдущей
+отметки записывается как задержка этапа для этого потока:
+
+    uart         decode -> uplink_queue -> uplink -> ingest -> fanout, persist
+    multimeter   decode -> fanout
+    oscilloscope acquire -> send
+
+Мост UART (bin/uart.py) передаёт метки захвата, разбора и отправки в поле
+'trace' кадра; CLOCK_MONOTONIC общий для процессов одной машины, так что
+метки разных процессов сравнимы.
+
+Сообщение клиенту несёт номер трассы в поле 'trace' (каждое
+TRACE_ACK_EVERY-е, чтобы не удваивать трафик подтверждениями). Клиент
+отвечает {'action': 'trace_ack', 'trace', 'handled_ms', 'render_ms'}:
+handled_ms — от получения сообщения до отправки ответа, render_ms — время
+отрисовки. Часы браузера с серверными не сравниваются: доставка считается
+как половина круга (ответ пришёл − сообщение ушло − handled_ms).
+
+Задержки копятся в скользящем окне TRACE_WINDOW на пару (поток, этап);
+report() даёт p50/p90/p99 в миллисекундах, они же идут в гистограмму
+trace_stage_seconds для /metrics.
+"""
+
+import collections
+import itertools
+import threading
+import time
+
+from backend.metrics import histogram
+
+TRACE_WINDOW = 1000
+TRACE_PENDING_LIMIT = 4096
+TRACE_ACK_EVERY = 10
+PERCENTILES = (50, 90, 99)
+
+TRACE_STAGE_SECONDS = histogram(
+    'trace_stage_seconds', 'Задержка этапа на пути показания к клиенту'
+)
+
+_trace_ids = itertools.count(1)
+
+
+class Trace:
+    __slots__ = ('id', 'stream', 'capture_ns', 'last_ns', 'sent_ns')
+
+    def __init__(self, stream, capture_ns=None):
+        self.id = next(_trace_ids)
+        self.stream = stream
+        self.capture_ns = capture_ns or time.monotonic_ns()
+        self.last_ns = self.capture_ns
+        self.sent_ns = None
+
+    @property
+    def sampled(self):
+        """Номер трассы отправляется клиенту и ждёт подтверждения"""
+        return self.id % TRACE_ACK_EVERY == 0
+
+    def mark(self, stage, at_ns=None):
+        """Этап закончился в at_ns (по умолчанию сейчас)"""
+        at_ns = at_ns or time.monotonic_ns()
+        tracer.record(self.stream, stage, at_ns - self.last_ns)
+        self.last_ns = at_ns
+
+    def measure(self, stage, started_ns):
+        """Этап, идущий параллельно основному пути (запись в БД)"""
+        tracer.record(self.stream, stage, time.monotonic_ns() - started_ns)
+
+    def message(self, message):
+        """Добавляет номер трассы к сообщению клиенту"""
+        if self.sampled:
+            message['trace'] = self.id
+        return message
+
+
+class Tracer:
+    def __init__(self, window=TRACE_WINDOW, pending_limit=TRACE_PENDING_LIMIT):
+        self.window = window
+        self.pending_limit = pending_limit
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.pending = collections.OrderedDict()
+
+    def record(self, stream, stage, duration_ns):
+        # метки другого процесса могут немного расходиться с нашими
+        duration_ns = max(0, duration_ns)
+        with self.lock:
+            samples = self.samples.get((stream, stage))
+            if samples is None:
+                samples = collections.deque(maxlen=self.window)
+                self.samples[(stream, stage)] = samples
+            samples.append(duration_ns)
+        TRACE_STAGE_SECONDS.observe(duration_ns / 1e9, stream=stream, stage=stage)
+
+    def sent(self, trace):
+        """Сообщение с трассой разослано; ждём подтверждений клиентов"""
+        trace.sent_ns = time.monotonic_ns()
+        self.record(trace.stream, 'server_total', trace.sent_ns - trace.capture_ns)
+        if not trace.sampled:
+            return
+        with self.lock:
+            self.pending[trace.id] = trace
+            while len(self.pending) > self.pending_limit:
+                self.pending.popitem(last=False)
+
+    def acknowledge(self, trace_id, handled_ms=0.0, render_ms=0.0):
+        """Подтверждение клиента; одну трассу подтверждает каждый клиент"""
+        now = time.monotonic_ns()
+        with self.lock:
+            trace = self.pending.get(trace_id)
+        if trace is None:
+            return False
+        handled_ns = int(float(handled_ms) * 1e6)
+        delivery_ns = max(0, now - trace.sent_ns - handled_ns) // 2
+        render_ns = int(float(render_ms) * 1e6)
+        self.record(trace.stream, 'client_delivery', delivery_ns)
+        self.record(trace.stream, 'client_render', render_ns)
+        self.record(
+            trace.stream,
+            'end_to_end',
+            trace.sent_ns - trace.capture_ns + delivery_ns + render_ns,
+        )
+        return True
+
+    def report(self):
+        """{поток: {этап: {count, p50, p90, p99, max}}}, задержки в мс"""
+        with self.lock:
+            items = [(key, sorted(values)) for key, values in self.samples.items()]
+        result = {}
+        for (stream, stage), values in items:
+            if not values:
+                continue
+            entry = {'count': len(values), 'max': values[-1] / 1e6}
+            for percentile in PERCENTILES:
+                index = min(len(values) - 1, len(values) * percentile // 100)
+                entry[f'p{percentile}'] = values[index] / 1e6
+            result.setdefault(stream, {})[stage] = entry
+        return result
+
+
+tracer = Tracer()
@@ -0,0 +1,210 @@
+"""
+Файл записи сырых кадров UART.
+
+Формат (все числа little-endian):
+    заголовок, 32 байта: magic b'UARTCAP1', версия u16, шаг индекса u16,
+        резерв u32, wall-clock при создании u64 (нс),
+        monotonic при создании u64 (нс)
+    записи подряд: длина кадра u32, monotonic-время приёма u64 (нс), кадр
+
+Файл только дописывается и читается через mmap без разбора целиком.
+Рядом лежит индекс <файл>.idx: каждые index_every кадров запись
+(номер кадра u64, смещение u64, время u64) для быстрого перехода.
+Если индекса нет, CaptureReader строит его одним проходом.
+Дописывать существующий файл имеет смысл только в пределах одной загрузки
+системы: monotonic-время после перезагрузки начинается заново. Недописанная
+последняя запись (обрыв при сбое) перед дозаписью отрезается вместе с
+записями индекса за ней, иначе все новые кадры оказались бы нечитаемыми.
+"""
+
+import mmap
+import os
+import struct
+import time
+
+CAPTURE_MAGIC = b'UARTCAP1'
+CAPTURE_VERSION = 1
+DEFAULT_INDEX_EVERY = 1024
+
+HEADER = struct.Struct('<8sHHIQQ')
+RECORD = struct.Struct('<IQ')
+INDEX_ENTRY = struct.Struct('<QQQ')
+
+
+class CaptureWriter:
+    def __init__(self, path, index_every=DEFAULT_INDEX_EVERY):
+        self.path = path
+        self.index_every = index_every
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        if exists:
+            with open(path, 'rb') as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+            if header[0] != CAPTURE_MAGIC:
+                raise ValueError(f"{path}: не файл записи UART")
+            self.index_every = header[2]
+            self.frames = self._truncate_partial_tail()
+        self.file = open(path, 'ab')
+        self.index_file = open(path + '.idx', 'ab')
+        if not exists:
+            self.file.write(
+                HEADER.pack(
+                    CAPTURE_MAGIC,
+                    CAPTURE_VERSION,
+                    self.index_every,
+                    0,
+                    time.time_ns(),
+                    time.monotonic_ns(),
+                )
+            )
+            self.frames = 0
+        self.offset = self.file.tell()
+
+    def _truncate_partial_tail(self):
+        """Отрезает недописанную запись в конце файла и записи индекса
+        после последнего целого кадра. Возвращает число целых кадров"""
+        frames, end = count_records(self.path)
+        if os.path.getsize(self.path) > end:
+            os.truncate(self.path, end)
+        index_path = self.path + '.idx'
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                data = f.read()
+            keep = 0
+            for pos in range(0, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size):
+                number, _, _ = INDEX_ENTRY.unpack_from(data, pos)
+                if number >= frames:
+                    break
+                keep = pos + INDEX_ENTRY.size
+            if keep < len(data):
+                os.truncate(index_path, keep)
+        return frames
+
+    def write(self, frame, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        if self.frames % self.index_every == 0:
+            self.index_file.write(
+                INDEX_ENTRY.pack(self.frames, self.offset, timestamp_ns)
+            )
+        self.file.write(RECORD.pack(len(frame), timestamp_ns))
+        self.file.write(frame)
+        self.offset += RECORD.size + len(frame)
+        self.frames += 1
+
+    def flush(self):
+        self.file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index_file.close()
+
+
+class CaptureReader:
+    """Чтение записи через mmap. Кадры отдаются как memoryview без
+    копирования; кадры, которые нужны после close(), надо скопировать"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            self.version,
+            self.index_every,
+            _,
+            self.created_wall_ns,
+            self.created_monotonic_ns,
+        ) = HEADER.unpack_from(self.map, 0)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f"{path}: не файл записи UART")
+        self.view = memoryview(self.map)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        index_path = self.path + '.idx'
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            return [
+                INDEX_ENTRY.unpack_from(data, pos)
+                for pos in range(0, usable, INDEX_ENTRY.size)
+            ]
+        index = []
+        for number, (offset, timestamp_ns, _) in enumerate(self._scan(HEADER.size)):
+            if number % self.index_every == 0:
+                index.append((number, offset, timestamp_ns))
+        return index
+
+    def _scan(self, offset):
+        size = len(self.map)
+        while offset + RECORD.size <= size:
+            length, timestamp_ns = RECORD.unpack_from(self.map, offset)
+            end = offset + RECORD.size + length
+            if end > size:
+                break
+            yield offset, timestamp_ns, self.view[offset + RECORD.size : end]
+            offset = end
+
+    def __iter__(self):
+        for _, timestamp_ns, frame in self._scan(HEADER.size):
+            yield timestamp_ns, frame
+
+    def seek_frame(self, number):
+        """Итератор кадров начиная с номера number"""
+        start_number, offset = 0, HEADER.size
+        for entry_number, entry_offset, _ in self.index:
+            if entry_number > number:
+                break
+            start_number, offset = entry_number, entry_offset
+        for current, (_, timestamp_ns, frame) in enumerate(
+            self._scan(offset), start_number
+        ):
+            if current >= number:
+                yield timestamp_ns, frame
+
+    def seek_time(self, timestamp_ns):
+        """Итератор кадров с monotonic-временем не раньше timestamp_ns"""
+        offset = HEADER.size
+        for _, entry_offset, entry_ts in self.index:
+            if entry_ts > timestamp_ns:
+                break
+            offset = entry_offset
+        for _, frame_ts, frame in self._scan(offset):
+            if frame_ts >= timestamp_ns:
+                yield frame_ts, frame
+
+    def wall_time_ns(self, timestamp_ns):
+        return self.created_wall_ns + (timestamp_ns - self.created_monotonic_ns)
+
+    def close(self):
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+
+def count_records(path):
+    """Число целых записей и смещение конца последней из них (для дозаписи);
+    кадры не читаются"""
+    size = os.path.getsize(path)
+    frames = 0
+    offset = HEADER.size
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                break
+            length, _ = RECORD.unpack(head)
+            end = offset + RECORD.size + length
+            if end > size:
+                break
+            f.seek(end)
+            frames += 1
+            offset = end
+    return frames, offset
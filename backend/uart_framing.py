@@ -0,0 +1,120 @@
+import binascii
+import re
+
+PACKET_SIZE = 64
+CRC_OFFSET = 4
+CRC_END = 62
+
+START_SEQ_TEMPATURE = bytes([0x01, 0x02, 0x03, 0x04])
+START_SEQ_HIGH_TEMPATURE = bytes([0x03, 0x03, 0x03, 0x03])
+START_SEQ_TRACTION = bytes([0x05, 0x02, 0x03, 0x04])
+START_SEQUENCES = (
+    START_SEQ_TEMPATURE,
+    START_SEQ_HIGH_TEMPATURE,
+    START_SEQ_TRACTION,
+)
+
+BUFFER_CAPACITY = 64 * 1024
+
+
+def calc_crc16(data) -> int:
+    """CRC16-CCITT (полином 0x1021, начальное значение 0xFFFF).
+
+    binascii.crc_hqx считает ту же CRC по таблице на C и принимает
+    bytes, bytearray и memoryview без копирования.
+    """
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def compile_start_pattern(start_sequences):
+    """Одно регулярное выражение для поиска любой стартовой
+    последовательности за один проход"""
+    return re.compile(
+        b'|'.join(re.escape(seq) for seq in start_sequences)
+    )
+
+
+class PacketFramer:
+    """Выделяет 64-байтовые пакеты из потока байт UART.
+
+    Буфер фиксированного размера читается по смещению: принятый пакет не
+    сдвигает данные (нет del buffer[:n]), непрочитанный хвост переносится в
+    начало буфера только когда заканчивается место. Поиск стартовой
+    последовательности делается одним проходом регулярного выражения,
+    проверка CRC идёт по memoryview, копируется только валидный пакет.
+    """
+
+    def __init__(self, start_sequences=START_SEQUENCES, capacity=BUFFER_CAPACITY):
+        self.start_sequences = tuple(start_sequences)
+        self.start_pattern = compile_start_pattern(self.start_sequences)
+        self.seq_len = len(self.start_sequences[0])
+        self.buffer = bytearray(max(capacity, PACKET_SIZE * 2))
+        self.start = 0
+        self.end = 0
+
+        self.packets = 0
+        self.crc_errors = 0
+        self.discarded_bytes = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _append(self, data):
+        size = len(data)
+        if self.end + size > len(self.buffer):
+            pending = self.end - self.start
+            if pending + size > len(self.buffer):
+                new_buffer = bytearray(max(len(self.buffer) * 2, pending + size))
+                new_buffer[:pending] = self.buffer[self.start : self.end]
+                self.buffer = new_buffer
+            else:
+                self.buffer[:pending] = self.buffer[self.start : self.end]
+            self.start = 0
+            self.end = pending
+        self.buffer[self.end : self.end + size] = data
+        self.end += size
+
+    def feed(self, data):
+        """Добавляет принятые байты и возвращает список (start_seq, packet)
+        для всех пакетов с корректной CRC"""
+        self._append(data)
+
+        result = []
+        buffer = self.buffer
+        search = self.start_pattern.search
+        pos = self.start
+        end = self.end
+        view = memoryview(buffer)
+        try:
+            while end - pos >= self.seq_len:
+                match = search(buffer, pos, end)
+                if match is None:
+                    keep_from = max(pos, end - self.seq_len + 1)
+                    self.discarded_bytes += keep_from - pos
+                    pos = keep_from
+                    break
+                found = match.start()
+                self.discarded_bytes += found - pos
+                pos = found
+                if end - pos < PACKET_SIZE:
+                    break
+
+                recv_crc = (buffer[pos + CRC_END] << 8) | buffer[pos + CRC_END + 1]
+                if calc_crc16(view[pos + CRC_OFFSET : pos + CRC_END]) == recv_crc:
+                    result.append(
+                        (match.group(), bytes(view[pos : pos + PACKET_SIZE]))
+                    )
+                    self.packets += 1
+                    pos += PACKET_SIZE
+                else:
+                    self.crc_errors += 1
+                    self.discarded_bytes += 1
+                    pos += 1
+        finally:
+            view.release()
+
+        if pos == end:
+            self.start = self.end = 0
+        else:
+            self.start = pos
+        return result
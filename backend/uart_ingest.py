@@ -0,0 +1,154 @@
+import asyncio
+import time
+import traceback
+from datetime import datetime
+
+from backend.engine import db_executor
+from backend.lifecycle import test_lifecycle
+from backend.metrics import counter, gauge
+from backend.send_websocket import send_to_all_websocket_clients
+from backend.settings import UART_MAX_PENDING_SAVES, current_uart_data
+from backend.tracing import Trace, tracer
+from backend.uart_framing import PacketFramer
+from backend.uart_packets import decode_packet, registered_start_sequences
+
+UART_SAVES_PENDING = gauge('uart_saves_pending', 'Пачки UART в очереди записи')
+UART_SAVES_DROPPED = counter(
+    'uart_saves_dropped_total', 'Пачки UART, не записанные из-за отставания БД'
+)
+
+_pending_saves = 0
+
+
+def _save_done(future):
+    global _pending_saves
+    _pending_saves -= 1
+    UART_SAVES_PENDING.set(_pending_saves)
+    if not future.cancelled() and future.exception():
+        print(f"Ошибка записи пачки UART: {future.exception()}")
+
+
+def submit_save(func, *args):
+    """Ставит запись пачки в db_executor. Очередь пула не ограничена, так что
+    число ждущих записей держим здесь: сверх UART_MAX_PENDING_SAVES пачка
+    отбрасывается и учитывается. Возвращает future или None.
+
+    Вызывается из цикла событий, там же выполняется _save_done."""
+    global _pending_saves
+    if _pending_saves >= UART_MAX_PENDING_SAVES:
+        UART_SAVES_DROPPED.inc(kind=func.__name__)
+        return None
+    _pending_saves += 1
+    UART_SAVES_PENDING.set(_pending_saves)
+    future = asyncio.get_running_loop().run_in_executor(db_executor, func, *args)
+    future.add_done_callback(_save_done)
+    return future
+
+
+def start_trace(frames, received_ns):
+    """Трасса пачки по самому старому кадру: его задержка наибольшая"""
+    marks = frames[0].get('trace') or {}
+    if not marks.get('capture_ns'):
+        return Trace('uart', received_ns)
+    trace = Trace('uart', marks['capture_ns'])
+    for stage, key in (('decode', 'decoded_ns'), ('uplink_queue', 'sent_ns')):
+        if marks.get(key):
+            trace.mark(stage, marks[key])
+    trace.mark('uplink', received_ns)
+    return trace
+
+
+def save_sensor_frames(frames, active_test):
+    from backend import setup_db
+
+    test_number = active_test.number if active_test else None
+    setup_db.save_uart_sensor_data_batch(frames, test_number)
+    if active_test:
+        setup_db.save_uart_sensor_frames_to_test(frames, active_test.table('uart'))
+
+
+async def ingest_sensor_frames(frames, active_test=None, trace=None):
+    """Принимает пачку декодированных кадров датчиков UART: обновляет текущее
+    состояние, сохраняет кадры в БД в фоновом потоке и рассылает клиентам
+    одно сообщение с последними значениями.
+
+    Испытание, в которое попадут кадры, фиксируется здесь, в момент приёма,
+    а не при записи в пуле потоков."""
+    if not frames:
+        return
+    received_ns = time.monotonic_ns()
+    trace = trace or start_trace(frames, received_ns)
+    active_test = active_test or test_lifecycle.active
+
+    merged = {}
+    for frame in frames:
+        merged.update(frame.get('data', {}))
+    current_uart_data.update(merged)
+
+    try:
+        future = submit_save(save_sensor_frames, frames, active_test)
+        if future is not None:
+            future.add_done_callback(
+                lambda _: trace.measure('persist', received_ns)
+            )
+    except Exception as e:
+        print(f"Ошибка сохранения пачки данных UART: {e}")
+        traceback.print_exc()
+
+    trace.mark('ingest')
+    await send_to_all_websocket_clients(
+        trace.message({'type': 'sensor_data', 'data': merged})
+    )
+    trace.mark('fanout')
+    tracer.sent(trace)
+
+
+def split_raw_packets(message):
+    """Разбирает бинарное сообщение из одного или нескольких 64-байтовых
+    кадров в записи сырых пакетов и декодированные кадры датчиков"""
+    framer = PacketFramer(registered_start_sequences(), capacity=len(message))
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    raw_packets = []
+    frames = []
+    for start_seq, packet in framer.feed(message):
+        raw_packets.append(
+            {
+                'timestamp': timestamp,
+                'start_byte': packet[0],
+                'command': packet[4],
+                'status': packet[5],
+                'payload_len': packet[6],
+                'payload': packet[7:62],
+                'crc_one': packet[62],
+                'crc_two': packet[63],
+                'packet': packet,
+            }
+        )
+        packet_type, sensor_data = decode_packet(start_seq, packet)
+        if sensor_data:
+            frames.append({'timestamp': timestamp, 'data': sensor_data})
+    if framer.crc_errors:
+        print(f"UART: отброшено пакетов с неверной CRC: {framer.crc_errors}")
+    return raw_packets, frames
+
+
+def save_raw_packets(raw_packets, active_test):
+    from backend import setup_db
+
+    test_number = active_test.number if active_test else None
+    setup_db.save_uart_raw_packets(raw_packets, test_number)
+    if active_test:
+        setup_db.save_uart_packets_to_test(raw_packets, active_test.table('uart'))
+
+
+async def ingest_raw_packets(message):
+    """Полный путь бинарных кадров UART: декодирование, рассылка клиентам и
+    сохранение сырых пакетов и значений датчиков"""
+    active_test = test_lifecycle.active
+    trace = Trace('uart')
+    raw_packets, frames = split_raw_packets(message)
+    trace.mark('decode')
+    if raw_packets:
+        submit_save(save_raw_packets, raw_packets, active_test)
+    await ingest_sensor_frames(frames, active_test, trace)
+    return len(raw_packets)
@@ -0,0 +1,122 @@
+import struct
+
+from backend.uart_framing import (START_SEQ_HIGH_TEMPATURE,
+                                  START_SEQ_TEMPATURE, START_SEQ_TRACTION)
+
+COMMAND_OFFSET = 4
+PAYLOAD_OFFSET = 7
+PAYLOAD_SIZE = 55
+
+
+class PacketType:
+    """Описание типа пакета UART.
+
+    Пакет определяется стартовой последовательностью и, при необходимости,
+    командой (command=None — любая команда). Полезная нагрузка разбирается
+    либо struct-форматом fmt (смещение offset от начала payload, значения
+    делятся на divisor и раскладываются по ключам keys), либо произвольной
+    функцией decoder(payload, command) -> dict.
+    """
+
+    def __init__(
+        self,
+        name,
+        start_seq,
+        keys=(),
+        fmt=None,
+        offset=0,
+        divisor=1,
+        command=None,
+        decoder=None,
+    ):
+        if fmt is None and decoder is None:
+            raise ValueError(f"Packet type {name}: нужен fmt или decoder")
+        self.name = name
+        self.start_seq = bytes(start_seq)
+        self.command = command
+        self.keys = tuple(keys)
+        self.offset = offset
+        self.decoder = decoder
+        self.struct = struct.Struct(fmt) if fmt else None
+        if self.struct:
+            if isinstance(divisor, (int, float)):
+                divisor = (divisor,) * len(self.keys)
+            self.divisor = tuple(divisor)
+            if len(self.keys) != len(self.divisor):
+                raise ValueError(f"Packet type {name}: keys и divisor разной длины")
+            if offset + self.struct.size > PAYLOAD_SIZE:
+                raise ValueError(f"Packet type {name}: формат не помещается в payload")
+
+    def decode(self, packet):
+        """Разбирает полный 64-байтовый пакет в словарь значений датчиков"""
+        if self.struct is not None:
+            values = self.struct.unpack_from(packet, PAYLOAD_OFFSET + self.offset)
+            return {
+                key: value / divisor
+                for key, value, divisor in zip(self.keys, values, self.divisor)
+            }
+        return self.decoder(
+            packet[PAYLOAD_OFFSET : PAYLOAD_OFFSET + PAYLOAD_SIZE],
+            packet[COMMAND_OFFSET],
+        )
+
+
+packet_types = {}
+
+
+def register_packet_type(packet_type):
+    """Регистрирует тип пакета. Фреймеры, созданные до регистрации, новую
+    стартовую последовательность не увидят — их нужно пересоздать"""
+    packet_types[(packet_type.start_seq, packet_type.command)] = packet_type
+    return packet_type
+
+
+def registered_start_sequences():
+    seen = []
+    for start_seq, _ in packet_types:
+        if start_seq not in seen:
+            seen.append(start_seq)
+    return tuple(seen)
+
+
+def lookup_packet_type(start_seq, command):
+    return packet_types.get((start_seq, command)) or packet_types.get(
+        (start_seq, None)
+    )
+
+
+def decode_packet(start_seq, packet):
+    """Возвращает (тип пакета, данные датчиков) или (None, None), если тип
+    не зарегистрирован"""
+    packet_type = lookup_packet_type(start_seq, packet[COMMAND_OFFSET])
+    if packet_type is None:
+        return None, None
+    return packet_type, packet_type.decode(packet)
+
+
+register_packet_type(
+    PacketType(
+        'temperature',
+        START_SEQ_TEMPATURE,
+        keys=('tempNormal1', 'tempNormal2'),
+        fmt='<HH',
+        divisor=100,
+    )
+)
+register_packet_type(
+    PacketType(
+        'traction',
+        START_SEQ_TRACTION,
+        keys=('thrust1',),
+        fmt='<2xH',
+        divisor=1000,
+    )
+)
+register_packet_type(
+    PacketType(
+        'high_temperature',
+        START_SEQ_HIGH_TEMPATURE,
+        keys=('temp600_1', 'temp600_2'),
+        fmt='<ff',
+    )
+)
@@ -0,0 +1,81 @@
+"""
+Бенчмарк рассылки send_to_all_websocket_clients: N имитированных клиентов,
+время рассылки одного сообщения (медиана, p90, p99) и сообщений клиентам в
+секунду. Клиент имитирует websockets: state OPEN и корутина send.
+
+    python3 benchmarks/run.py --only broadcast --clients 200
+"""
+
+import asyncio
+
+from websockets.protocol import State
+
+from benchmarks.harness import latency, throughput
+
+
+class SimulatedClient:
+    def __init__(self, delay=0.0):
+        self.state = State.OPEN
+        self.remote_address = ('127.0.0.1', id(self))
+        self.transport = None
+        self.delay = delay
+        self.received = 0
+        self.bytes = 0
+
+    async def send(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            await asyncio.sleep(0)
+        self.received += 1
+        self.bytes += len(message)
+
+
+def sensor_message():
+    return {
+        'type': 'sensor_data',
+        'data': {
+            'temp600_1': 512.25,
+            'temp600_2': 498.5,
+            'tempNormal1': 24.75,
+            'tempNormal2': 25.0,
+            'thrust1': 12.125,
+        },
+    }
+
+
+async def _broadcast(clients, messages):
+    from backend import send_websocket
+
+    send_websocket.active_websockets.clear()
+    send_websocket.active_websockets.update(clients)
+    loop = asyncio.get_running_loop()
+    durations = []
+    message = sensor_message()
+    for _ in range(messages):
+        started = loop.time()
+        await send_websocket.send_to_all_websocket_clients(message)
+        durations.append(loop.time() - started)
+    send_websocket.active_websockets.clear()
+    return durations
+
+
+def run(args):
+    results = []
+    for count in sorted({1, 10, args.clients}):
+        clients = [SimulatedClient() for _ in range(count)]
+        durations = asyncio.run(_broadcast(clients, args.messages))
+        elapsed = sum(durations)
+        results.append(
+            latency(f'broadcast.{count}_clients.latency', durations, clients=count)
+        )
+        results.append(
+            throughput(
+                f'broadcast.{count}_clients.deliveries',
+                sum(client.received for client in clients),
+                elapsed,
+                'messages/s',
+                clients=count,
+            )
+        )
+    return results
@@ -0,0 +1,146 @@
+"""
+Бенчмарк записи в БД: пропускная способность каждой функции save_* на
+рабочих таблицах и таблицах испытания (строк в секунду).
+
+Работает с временной БД (harness.isolated_database), рабочая БД стенда не
+затрагивается.
+
+    python3 benchmarks/run.py --only db_insert --inserts 5000
+"""
+
+import contextlib
+import os
+import random
+import time
+
+from benchmarks.harness import throughput
+
+BENCH_TEST_NUMBER = 1
+BATCH_SIZE = 200
+OSCILLOSCOPE_POINTS = 600
+
+
+def multimeter_reading(rnd, timestamp):
+    value = rnd.uniform(0, 20)
+    return {
+        'timestamp': timestamp,
+        'value': f"{value:.4f}",
+        'unit': 'V',
+        'mode': 'DC',
+        'range_str': 'AUTO',
+        'measure_type': 'Voltage',
+        'raw_data': {'packet': list(range(11)), 'is_overload': False},
+    }
+
+
+def oscilloscope_frame(rnd):
+    time_data = [i * 1e-5 for i in range(OSCILLOSCOPE_POINTS)]
+    channels = {}
+    for channel in ('CH1', 'CH2'):
+        channels[channel] = {
+            'time': time_data,
+            'voltage': [rnd.uniform(-1, 1) for _ in range(OSCILLOSCOPE_POINTS)],
+            'settings': {'volts_div': 1.0, 'offset': 0.0},
+            'color': 'yellow',
+        }
+    return {'time_base': 0.001, 'channels': channels}
+
+
+def raw_packet(rnd, timestamp):
+    payload = bytes(rnd.getrandbits(8) for _ in range(55))
+    packet = b'\xaa\x55\xaa\x55' + bytes([0x3B, 0, 55]) + payload + b'\x00\x00'
+    return {
+        'timestamp': timestamp,
+        'start_byte': packet[0],
+        'command': packet[4],
+        'status': packet[5],
+        'payload_len': packet[6],
+        'payload': packet[7:62],
+        'crc_one': packet[62],
+        'crc_two': packet[63],
+        'packet': packet,
+    }
+
+
+def sensor_data(rnd):
+    return {
+        'temp600_1': rnd.uniform(0, 600),
+        'temp600_2': rnd.uniform(0, 600),
+        'tempNormal1': rnd.uniform(0, 100),
+        'tempNormal2': rnd.uniform(0, 100),
+        'thrust1': rnd.uniform(0, 50),
+    }
+
+
+def _measure(name, calls, rows_per_call, func):
+    """save_* ловят ошибки сами и возвращают False: такой вызов — провал
+    бенчмарка, а не быстрая запись"""
+    started = time.perf_counter()
+    for i in range(calls):
+        if not func(i):
+            raise RuntimeError(f"{name}: вызов {i} не записал данные")
+    elapsed = time.perf_counter() - started
+    return throughput(
+        name, calls * rows_per_call, elapsed, 'rows/s', calls=calls
+    )
+
+
+def run(args):
+    from backend import measurement, setup_db
+    from backend.timestamps import format_timestamp
+
+    rnd = random.Random(1)
+    timestamp = format_timestamp()
+    mult_table, osc_table, uart_table = setup_db.create_test_tables(
+        BENCH_TEST_NUMBER
+    )
+    inserts = args.inserts
+    frames = max(1, inserts // 20)
+    batches = max(1, inserts // BATCH_SIZE)
+
+    reading = multimeter_reading(rnd, timestamp)
+    frame = oscilloscope_frame(rnd)
+    packet = raw_packet(rnd, timestamp)
+    sensors = sensor_data(rnd)
+    packet_batch = [raw_packet(rnd, timestamp) for _ in range(BATCH_SIZE)]
+    frame_batch = [
+        {'timestamp': timestamp, 'data': sensor_data(rnd)}
+        for _ in range(BATCH_SIZE)
+    ]
+
+    cases = [
+        ('save_multimeter_data', inserts, 1,
+         lambda i: measurement.save_multimeter_data(reading, force_save=True)),
+        ('save_multimeter_data_to_test', inserts, 1,
+         lambda i: setup_db.save_multimeter_data_to_test(reading, mult_table)),
+        ('save_oscilloscope_data', frames, 2,
+         lambda i: measurement.save_oscilloscope_data(frame, force_save=True)),
+        ('save_oscilloscope_data_to_test', frames, 2,
+         lambda i: setup_db.save_oscilloscope_data_to_test(frame, osc_table)),
+        ('save_uart_data', inserts, 1,
+         lambda i: measurement.save_uart_data(packet)),
+        ('save_uart_data_to_test', inserts, 1,
+         lambda i: setup_db.save_uart_data_to_test(packet, uart_table)),
+        ('save_uart_raw_packet', inserts, 1,
+         lambda i: setup_db.save_uart_raw_packet(packet)),
+        ('save_uart_sensor_data', inserts, 1,
+         lambda i: setup_db.save_uart_sensor_data(sensors)),
+        ('save_uart_sensor_data_to_test', inserts, 1,
+         lambda i: setup_db.save_uart_sensor_data_to_test(sensors, uart_table)),
+        ('save_uart_calibration_data', inserts, 1,
+         lambda i: setup_db.save_uart_calibration_data('gauge1', float(i))),
+        ('save_uart_raw_packets', batches, BATCH_SIZE,
+         lambda i: setup_db.save_uart_raw_packets(packet_batch)),
+        ('save_uart_packets_to_test', batches, BATCH_SIZE,
+         lambda i: setup_db.save_uart_packets_to_test(packet_batch, uart_table)),
+        ('save_uart_sensor_data_batch', batches, BATCH_SIZE,
+         lambda i: setup_db.save_uart_sensor_data_batch(frame_batch)),
+        ('save_uart_sensor_frames_to_test', batches, BATCH_SIZE,
+         lambda i: setup_db.save_uart_sensor_frames_to_test(frame_batch, uart_table)),
+    ]
+    results = []
+    # сообщения функций о каждой записи входят в замер, но не в вывод
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, calls, rows, func in cases:
+            results.append(_measure(f'db_insert.{name}', calls, rows, func))
+    return results
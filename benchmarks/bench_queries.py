@@ -0,0 +1,170 @@
+"""
+Бенчмарк запросов истории и испытаний на сгенерированных данных: функции,
+которые обслуживают /history/* и /tests/{n}, на наборах от 1e5 до 1e7
+строк мультиметра (осциллограмм — в OSCILLOSCOPE_RATIO раз меньше).
+
+Данные пишутся во временную БД (harness.isolated_database): рабочая таблица
+мультиметра заполняется заново для каждого размера, испытание получает
+отдельный файл.
+
+    python3 benchmarks/run.py --only queries --rows 100000,1000000
+"""
+
+import base64
+import contextlib
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.harness import latency, time_calls
+
+QUERY_TEST_BASE = 100
+GENERATE_CHUNK_ROWS = 50000
+OSCILLOSCOPE_RATIO = 1000
+OSCILLOSCOPE_POINTS = 100
+# данные укладываются в последние DATASET_SPAN_SECONDS, чтобы попасть в
+# период 'hour'
+DATASET_SPAN_SECONDS = 50 * 60
+
+MULTIMETER_COLUMNS = (
+    'timestamp', 'value', 'unit', 'mode', 'range_str', 'measure_type',
+    'raw_data', 'value_si', 'overload', 'unit_code', 'mode_code',
+    'range_code', 'ts_ns',
+)
+
+
+def _multimeter_rows(rows, rnd):
+    from backend.timestamps import format_timestamp, now_ns
+
+    end_ns = now_ns()
+    step_ns = DATASET_SPAN_SECONDS * 1_000_000_000 // max(1, rows)
+    start_ns = end_ns - step_ns * rows
+    raw_data = json.dumps({'packet': list(range(11)), 'is_overload': False})
+    for i in range(rows):
+        ts_ns = start_ns + i * step_ns
+        value = rnd.uniform(0, 20)
+        yield (
+            format_timestamp(datetime.fromtimestamp(ts_ns / 1e9)),
+            f"{value:.4f}",
+            'V',
+            'DC',
+            'AUTO',
+            'Voltage',
+            raw_data,
+            value,
+            0,
+            1,
+            1,
+            0,
+            ts_ns,
+        )
+
+
+def _fill(connection, table, columns, rows):
+    placeholders = ', '.join('?' for _ in columns)
+    sql = f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({placeholders})'
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= GENERATE_CHUNK_ROWS:
+            connection.exec_driver_sql(sql, chunk)
+            chunk = []
+    if chunk:
+        connection.exec_driver_sql(sql, chunk)
+
+
+def _oscilloscope_rows(frames, rnd):
+    from backend.timestamps import format_timestamp, now_ns
+
+    end_ns = now_ns()
+    step_ns = DATASET_SPAN_SECONDS * 1_000_000_000 // max(1, frames)
+    time_data = base64.b64encode(
+        np.linspace(0, 1e-3, OSCILLOSCOPE_POINTS, dtype=np.float32).tobytes()
+    ).decode('ascii')
+    for i in range(frames):
+        voltage = np.array(
+            [rnd.uniform(-1, 1) for _ in range(OSCILLOSCOPE_POINTS)],
+            dtype=np.float32,
+        )
+        ts_ns = end_ns - (frames - i) * step_ns
+        for channel in ('CH1', 'CH2'):
+            yield (
+                format_timestamp(datetime.fromtimestamp(ts_ns / 1e9)),
+                channel,
+                time_data,
+                base64.b64encode(voltage.tobytes()).decode('ascii'),
+                json.dumps({'settings': {'volts_div': 1.0}}),
+                ts_ns,
+            )
+
+
+def generate_dataset(rows, test_number, seed=1):
+    """Заполняет рабочие таблицы и файл испытания test_number"""
+    from backend import setup_db
+    from backend.engine import engine
+    from backend.catalog import engine_for_test
+
+    rnd = random.Random(seed)
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        connection.exec_driver_sql('DELETE FROM "мультиметр"')
+        connection.exec_driver_sql('DELETE FROM "осциллограф"')
+        _fill(connection, 'мультиметр', MULTIMETER_COLUMNS, _multimeter_rows(rows, rnd))
+        _fill(
+            connection,
+            'осциллограф',
+            ('timestamp', 'channel', 'time_data', 'voltage_data', 'raw_data', 'ts_ns'),
+            _oscilloscope_rows(max(1, rows // OSCILLOSCOPE_RATIO), rnd),
+        )
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        setup_db.create_test_tables(test_number)
+    with engine_for_test(test_number).begin() as connection:
+        _fill(
+            connection,
+            f'мультиметр_{test_number}',
+            MULTIMETER_COLUMNS,
+            _multimeter_rows(rows, rnd),
+        )
+    return time.perf_counter() - started
+
+
+def parse_rows(value):
+    return [int(float(item)) for item in str(value).split(',') if item]
+
+
+def run(args):
+    from backend import measurement, setup_db
+
+    results = []
+    for index, rows in enumerate(parse_rows(args.rows)):
+        test_number = QUERY_TEST_BASE + index
+        generated = generate_dataset(rows, test_number)
+        print(f"  набор {rows} строк сгенерирован за {generated:.1f} с")
+        last_page = max(1, rows // 100)
+        cases = [
+            ('history.multimeter', lambda: measurement.get_multimeter_history('hour')),
+            ('history.multimeter_stats',
+             lambda: measurement.get_multimeter_stats(None, 'hour')),
+            ('history.multimeter_stats_test',
+             lambda: measurement.get_multimeter_stats(test_number)),
+            ('history.multimeter_rollup',
+             lambda: measurement.get_multimeter_rollup('hour', 60)),
+            ('history.multimeter_rollup_test',
+             lambda: measurement.get_multimeter_rollup('hour', 60, test_number)),
+            ('history.oscilloscope', lambda: measurement.get_oscilloscope_history('hour')),
+            ('tests.list', setup_db.get_test_list),
+            ('tests.first_page',
+             lambda: setup_db.get_test_data(test_number, 'multimeter', 100, 1)),
+            ('tests.last_page',
+             lambda: setup_db.get_test_data(test_number, 'multimeter', 100, last_page)),
+        ]
+        for name, func in cases:
+            # сообщения функций (число точек и т. п.) не нужны в выводе
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                durations = time_calls(func, args.repeat)
+            results.append(latency(f'queries.{rows}.{name}', durations, rows=rows))
+    return results
@@ -0,0 +1,187 @@
+"""
+Бенчмарк разбора потока UART: пакеты в секунду и МБ/с на синтетическом
+трафике с мусором и битой CRC. Можно подать записанный поток через --input.
+
+    python3 benchmarks/bench_uart_framing.py --megabytes 8
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.uart_framing import (PACKET_SIZE, START_SEQUENCES, PacketFramer,
+                                  calc_crc16)
+
+
+def legacy_calc_crc16(data: bytes) -> int:
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+    return crc
+
+
+class LegacyFramer:
+    """Прежний алгоритм UARTProtocol (без print) для сравнения"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.waiting_for_packet = False
+        self.expected_packet_start = None
+        self.packets = 0
+
+    def feed(self, data):
+        self.buffer.extend(data)
+        while True:
+            if not self.waiting_for_packet:
+                if not self._find_start_sequence():
+                    break
+            if self.waiting_for_packet:
+                if len(self.buffer) < PACKET_SIZE:
+                    break
+                self._read_complete_packet()
+                if len(self.buffer) < PACKET_SIZE:
+                    break
+
+    def _find_start_sequence(self):
+        positions = []
+        for seq in START_SEQUENCES:
+            pos = self.buffer.find(seq)
+            if pos != -1:
+                positions.append((pos, seq))
+        if not positions:
+            if len(self.buffer) > 64:
+                del self.buffer[:10]
+            else:
+                self.buffer.clear()
+            return False
+        pos, seq = min(positions, key=lambda x: x[0])
+        if pos > 0:
+            del self.buffer[:pos]
+        self.expected_packet_start = seq
+        self.waiting_for_packet = True
+        return True
+
+    def _read_complete_packet(self):
+        packet = bytes(self.buffer[:PACKET_SIZE])
+        if packet[:4] != self.expected_packet_start:
+            self.waiting_for_packet = False
+            del self.buffer[0]
+            self._find_start_sequence()
+            return
+        recv_crc = (packet[62] << 8) | packet[63]
+        if legacy_calc_crc16(packet[4:62]) == recv_crc:
+            del self.buffer[:PACKET_SIZE]
+            self.packets += 1
+            self.waiting_for_packet = False
+            if len(self.buffer) > 0:
+                self._find_start_sequence()
+        else:
+            del self.buffer[0]
+            self.waiting_for_packet = False
+            self._find_start_sequence()
+
+
+def build_packet(start_seq, command, payload):
+    body = bytes([command, 0x00, len(payload)]) + payload.ljust(55, b'\0')
+    return start_seq + body + struct.pack('>H', calc_crc16(body))
+
+
+def generate_traffic(megabytes, garbage_ratio, crc_error_ratio, seed=1):
+    """Синтетический поток: валидные пакеты всех типов, вставки мусора и
+    пакеты с испорченной CRC. Возвращает (поток, число валидных пакетов)"""
+    rnd = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    chunks = []
+    size = 0
+    valid = 0
+    while size < target:
+        if rnd.random() < garbage_ratio:
+            garbage = bytes(rnd.getrandbits(8) for _ in range(rnd.randint(1, 40)))
+            chunks.append(garbage)
+            size += len(garbage)
+        payload = bytes(rnd.getrandbits(8) for _ in range(8))
+        packet = bytearray(
+            build_packet(rnd.choice(START_SEQUENCES), 0x3B, payload)
+        )
+        if rnd.random() < crc_error_ratio:
+            packet[10] ^= 0xFF
+        else:
+            valid += 1
+        chunks.append(bytes(packet))
+        size += PACKET_SIZE
+    return b''.join(chunks), valid
+
+
+def split_reads(stream, max_read, seed=2):
+    """Режет поток на куски, как их отдаёт последовательный порт"""
+    rnd = random.Random(seed)
+    reads = []
+    pos = 0
+    while pos < len(stream):
+        n = rnd.randint(1, max_read)
+        reads.append(stream[pos : pos + n])
+        pos += n
+    return reads
+
+
+def run(framer, reads):
+    started = time.perf_counter()
+    count = 0
+    for chunk in reads:
+        result = framer.feed(chunk)
+        if result:
+            count += len(result)
+    elapsed = time.perf_counter() - started
+    return elapsed, count or getattr(framer, 'packets', 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк разбора пакетов UART')
+    parser.add_argument('--megabytes', type=float, default=4.0)
+    parser.add_argument('--garbage-ratio', type=float, default=0.05)
+    parser.add_argument('--crc-error-ratio', type=float, default=0.02)
+    parser.add_argument('--max-read', type=int, default=512)
+    parser.add_argument(
+        '--input', help='Записанный сырой поток UART вместо синтетического'
+    )
+    parser.add_argument(
+        '--legacy', action='store_true', help='Также прогнать прежний алгоритм'
+    )
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, 'rb') as f:
+            stream = f.read()
+        valid = None
+    else:
+        stream, valid = generate_traffic(
+            args.megabytes, args.garbage_ratio, args.crc_error_ratio
+        )
+    reads = split_reads(stream, args.max_read)
+    megabytes = len(stream) / (1024 * 1024)
+    print(f"Поток: {megabytes:.2f} МБ, {len(reads)} чтений, валидных пакетов: {valid}")
+
+    framers = [('PacketFramer', PacketFramer())]
+    if args.legacy:
+        framers.append(('legacy', LegacyFramer()))
+    for name, framer in framers:
+        elapsed, packets = run(framer, reads)
+        print(
+            f"{name:>12}: {packets} пакетов за {elapsed:.3f} с — "
+            f"{packets / elapsed:,.0f} пакетов/с, {megabytes / elapsed:.2f} МБ/с"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Бенчмарк приёма UART в мосте: UARTProtocol.data_received (поиск кадров,
+CRC, разбор пакета, постановка в очередь отправки) и отдельно PacketFramer
+на том же потоке.
+
+    python3 benchmarks/run.py --only uart
+"""
+
+import time
+
+from benchmarks.bench_uart_framing import generate_traffic, split_reads
+from benchmarks.harness import throughput
+
+
+def run(args):
+    from backend.uart_framing import PacketFramer
+    from backend.uart_packets import registered_start_sequences
+    from bin.uart import SensorUplink, UARTProtocol
+
+    stream, valid = generate_traffic(args.megabytes, 0.05, 0.02)
+    reads = split_reads(stream, 512)
+    megabytes = len(stream) / (1024 * 1024)
+
+    framer = PacketFramer(registered_start_sequences())
+    started = time.perf_counter()
+    for chunk in reads:
+        framer.feed(chunk)
+    framing = time.perf_counter() - started
+
+    protocol = UARTProtocol(uplink=SensorUplink(max_queue=len(stream)))
+    started = time.perf_counter()
+    for chunk in reads:
+        protocol.data_received(chunk)
+    received = time.perf_counter() - started
+
+    return [
+        throughput(
+            'uart_framing', valid, framing, 'packets/s', megabytes=megabytes
+        ),
+        throughput(
+            'uart_data_received',
+            valid,
+            received,
+            'packets/s',
+            megabytes=megabytes,
+            crc_errors=protocol.framer.crc_errors,
+        ),
+    ]
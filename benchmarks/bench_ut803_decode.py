@@ -0,0 +1,48 @@
+"""
+Бенчмарк разбора пакетов UT803 (UT803Reader._decode_binary_packet и
+универсальный decode_ut803_data) на наборе пакетов разных величин.
+
+    python3 benchmarks/run.py --only ut803
+"""
+
+import random
+import time
+
+from benchmarks.harness import throughput
+
+# 11-байтовые пакеты: порядок, 4 цифры, величина, 3 флага, CR LF
+MEASUREMENT_TYPES = b'123469;='
+
+
+def generate_packets(count, seed=1):
+    rnd = random.Random(seed)
+    packets = []
+    for _ in range(count):
+        digits = bytes(0x30 + rnd.randint(0, 9) for _ in range(4))
+        packet = (
+            bytes([0x30 + rnd.randint(0, 4)])
+            + digits
+            + bytes([rnd.choice(MEASUREMENT_TYPES)])
+            + bytes([0x30 + rnd.choice((0, 4)), 0x30, 0x30 + rnd.choice((2, 10))])
+            + b'\r\n'
+        )
+        packets.append(packet)
+    return packets
+
+
+def run(args):
+    from backend.multimetrUT803 import UT803Reader
+
+    reader = UT803Reader()
+    packets = generate_packets(args.packets)
+    results = []
+    for name, decode in (
+        ('ut803_decode_binary', reader._decode_binary_packet),
+        ('ut803_decode', reader.decode_ut803_data),
+    ):
+        started = time.perf_counter()
+        for packet in packets:
+            decode(packet)
+        elapsed = time.perf_counter() - started
+        results.append(throughput(name, len(packets), elapsed, 'packets/s'))
+    return results
@@ -0,0 +1,130 @@
+"""
+Общие функции бенчмарков: замеры, результаты в JSON и сравнение с базовыми.
+
+Результат бенчмарка — словарь:
+
+    {'name': 'ut803_decode', 'value': 123456.0, 'unit': 'packets/s',
+     'higher_is_better': True, ...дополнительные поля}
+
+Бенчмарки БД должны работать с отдельной БД: isolated_database() задаёт
+STAND_DATABASE_URL и STAND_TESTS_DIR и вызывается до импорта backend.
+"""
+
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+# результат хуже базового больше чем на столько считается регрессией
+REGRESSION_THRESHOLD = 0.15
+
+
+def isolated_database(directory=None):
+    """Временная БД и каталог испытаний для бенчмарков"""
+    directory = directory or tempfile.mkdtemp(prefix='stand_bench_')
+    os.makedirs(directory, exist_ok=True)
+    os.environ['STAND_DATABASE_URL'] = (
+        f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    )
+    os.environ['STAND_TESTS_DIR'] = os.path.join(directory, 'test_data')
+    return directory
+
+
+def throughput(name, count, elapsed, unit, **extra):
+    return {
+        'name': name,
+        'value': count / elapsed if elapsed else 0.0,
+        'unit': unit,
+        'higher_is_better': True,
+        'count': count,
+        'seconds': elapsed,
+        **extra,
+    }
+
+
+def latency(name, durations, **extra):
+    """Задержка по списку длительностей (с): значение — медиана, мс"""
+    ordered = sorted(durations)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, len(ordered) * p // 100)] * 1000
+
+    return {
+        'name': name,
+        'value': statistics.median(ordered) * 1000,
+        'unit': 'ms',
+        'higher_is_better': False,
+        'p90': percentile(90),
+        'p99': percentile(99),
+        'max': ordered[-1] * 1000,
+        'runs': len(ordered),
+        **extra,
+    }
+
+
+def time_calls(func, repeat, warmup=1):
+    """Длительности repeat вызовов func() после warmup прогревочных"""
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': environment(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    return document
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return {item['name']: item for item in json.load(f)['results']}
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Сравнивает с базовыми результатами. Возвращает (строки отчёта,
+    имена регрессий); изменение > 0 — улучшение"""
+    lines = []
+    regressions = []
+    for result in results:
+        base = baseline.get(result['name'])
+        if base is None or not base['value']:
+            lines.append(f"{result['name']:<40} {result['value']:>14.2f} {result['unit']:<10} (нет базового)")
+            continue
+        change = (result['value'] - base['value']) / base['value']
+        if not result['higher_is_better']:
+            change = -change
+        mark = ''
+        if change < -threshold:
+            mark = '  РЕГРЕССИЯ'
+            regressions.append(result['name'])
+        lines.append(
+            f"{result['name']:<40} {result['value']:>14.2f} {result['unit']:<10} "
+            f"база {base['value']:>14.2f} {change:+7.1%}{mark}"
+        )
+    return lines, regressions
@@ -0,0 +1,124 @@
+"""
+Набор бенчмарков стенда без приборов и сети:
+
+    ut803       разбор пакетов UT803
+    uart        PacketFramer и UARTProtocol.data_received моста UART
+    db_insert   функции save_* на рабочих таблицах и таблицах испытания
+    broadcast   send_to_all_websocket_clients с N имитированными клиентами
+    queries     /history/* и /tests/{n} на наборах 1e5..1e7 строк
+
+Результаты пишутся в JSON (benchmarks/results/<дата>.json) и сравниваются с
+базовыми (benchmarks/baseline.json): результат хуже базового больше чем на
+--threshold — регрессия, код выхода 1.
+
+    python3 benchmarks/run.py                       все, размеры по умолчанию
+    python3 benchmarks/run.py --only ut803,uart
+    python3 benchmarks/run.py --rows 100000,1000000,10000000
+    python3 benchmarks/run.py --save-baseline       записать как базовые
+
+Базовые результаты имеют смысл только для той же машины: их записывают на
+компьютере стенда.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import (DEFAULT_BASELINE, REGRESSION_THRESHOLD,
+                                RESULTS_DIR, compare, isolated_database,
+                                load_results, write_results)
+
+BENCHMARKS = {
+    'ut803': 'benchmarks.bench_ut803_decode',
+    'uart': 'benchmarks.bench_uart_protocol',
+    'db_insert': 'benchmarks.bench_db_insert',
+    'broadcast': 'benchmarks.bench_broadcast',
+    'queries': 'benchmarks.bench_queries',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Бенчмарки стенда')
+    parser.add_argument(
+        '--only', help=f"Через запятую: {', '.join(BENCHMARKS)}"
+    )
+    parser.add_argument('--packets', type=int, default=200000,
+                        help='Пакетов UT803 для разбора')
+    parser.add_argument('--megabytes', type=float, default=4.0,
+                        help='Объём синтетического потока UART, МБ')
+    parser.add_argument('--inserts', type=int, default=2000,
+                        help='Строк на каждую функцию save_*')
+    parser.add_argument('--clients', type=int, default=100,
+                        help='Имитированных клиентов WebSocket')
+    parser.add_argument('--messages', type=int, default=500,
+                        help='Сообщений в рассылке')
+    parser.add_argument('--rows', default='100000',
+                        help='Размеры наборов для запросов через запятую (1e5..1e7)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Повторов каждого запроса')
+    parser.add_argument('--output', help='Файл результатов JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Базовые результаты для сравнения')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Записать результаты как базовые')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Допустимое ухудшение (доля), по умолчанию %(default)s')
+    parser.add_argument('--workdir', help='Каталог временной БД')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Неизвестные бенчмарки: {', '.join(unknown)}")
+
+    # до импорта backend: модули открывают БД при загрузке
+    workdir = isolated_database(args.workdir)
+    print(f"Временная БД: {workdir}")
+    # журнал в замеры не входит: только ошибки
+    from backend.log import setup_logging
+
+    setup_logging('ERROR', 'text')
+
+    results = []
+    for name in names:
+        print(f"== {name}")
+        module = importlib.import_module(BENCHMARKS[name])
+        started = time.perf_counter()
+        for result in module.run(args):
+            print(f"  {result['name']:<48} {result['value']:>14.2f} {result['unit']}")
+            results.append(result)
+        print(f"  ({time.perf_counter() - started:.1f} с)")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    write_results(results, output)
+    print(f"Результаты: {output}")
+
+    if args.save_baseline:
+        write_results(results, args.baseline)
+        print(f"Базовые результаты записаны: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("Базовых результатов нет, сравнение пропущено (--save-baseline)")
+        return 0
+
+    lines, regressions = compare(results, load_results(args.baseline), args.threshold)
+    print("\nСравнение с базовыми:")
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"\nРегрессии: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,647 @@
+"""
+Синтетическая нагрузка на main.py: эмуляция полного стенда и панелей.
+
+Источники (каждый со своим темпом, 0 — выключен):
+
+    uart        бинарные кадры UART по WebSocket (путь моста bin/uart.py)
+    uart_http   POST /uart-data с JSON sensor_data
+    multimeter  показания мультиметра JSON по WebSocket с force_save
+
+Панели — WebSocket-клиенты, как браузер: шлют get_uart_data и
+get_oscilloscope_data с заданной частотой и отвечают trace_ack на
+сообщения с номером трассы.
+
+Каждое отправленное показание несёт номер: в кадрах температуры UART он
+лежит в tempNormal1/tempNormal2, в /uart-data — в temp600_1, у мультиметра —
+в raw_data.loadgen_seq. Панель по номеру находит время отправки; так
+считаются задержка доставки и потери (показание, не дошедшее до панели за
+время прогона и --drain). Задержка серверных этапов берётся из
+/trace/latency (окно последних показаний, см. backend/tracing.py).
+
+    python3 bin/loadgen.py                                   панели 1,10,50
+    python3 bin/loadgen.py --dashboards 10,50,100,200 --uart-rate 100,500
+    python3 bin/loadgen.py --multimeter-rate 0 --scope-rate 0 --json out.json
+
+Перебор идёт по темпам UART, внутри — по числу панелей; при потерях больше
+--max-drop или p99 доставки больше --max-latency-ms шаг считается
+насыщением и большее число панелей не проверяется. Без осциллографа сервер
+не отвечает на get_oscilloscope_data — такие запросы попадут в «без ответа».
+
+Генератор сам работает в одном цикле событий: если задержка его цикла
+(«цикл нагрузки») сравнима с задержками доставки, упёрлись в генератор, а
+не в сервер — запустите несколько генераторов с разных машин.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import websockets
+from websockets.exceptions import ConnectionClosed, WebSocketException
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.uart_framing import (START_SEQ_TEMPATURE, START_SEQ_TRACTION,
+                                  calc_crc16)
+
+SERVER_WEBSOCKET_URL = 'ws://127.0.0.1:8767'
+SERVER_HTTP_URL = 'http://127.0.0.1:8080'
+UART_COMMAND = 0x3B
+PAYLOAD_SIZE = 55
+CONNECT_TIMEOUT = 10.0
+LOOP_LAG_INTERVAL = 0.05
+PERCENTILES = (50, 90, 99)
+
+
+def timestamp_now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def build_packet(start_seq, payload, command=UART_COMMAND):
+    body = bytes([command, 0x00, len(payload)]) + payload.ljust(PAYLOAD_SIZE, b'\0')
+    return start_seq + body + struct.pack('>H', calc_crc16(body))
+
+
+def build_uart_message(seq, frames, rnd):
+    """Пачка кадров: первый — температура с номером (сервер сливает пачку в
+    одно сообщение, номер доходит до панелей), остальные — тяга"""
+    packets = [
+        build_packet(
+            START_SEQ_TEMPATURE, struct.pack('<HH', seq & 0xFFFF, (seq >> 16) & 0xFFFF)
+        )
+    ]
+    for _ in range(frames - 1):
+        packets.append(
+            build_packet(START_SEQ_TRACTION, struct.pack('<2xH', rnd.randrange(65536)))
+        )
+    return b''.join(packets)
+
+
+def uart_seq(data):
+    return round(data['tempNormal1'] * 100) | (round(data['tempNormal2'] * 100) << 16)
+
+
+def summarize(durations):
+    """{count, p50, p90, p99, max} в мс по длительностям в секундах"""
+    if not durations:
+        return {'count': 0}
+    ordered = sorted(durations)
+    summary = {'count': len(ordered), 'max': ordered[-1] * 1000}
+    for percentile in PERCENTILES:
+        index = min(len(ordered) - 1, len(ordered) * percentile // 100)
+        summary[f'p{percentile}'] = ordered[index] * 1000
+    return summary
+
+
+def format_summary(summary):
+    if not summary.get('count'):
+        return 'нет данных'
+    return (
+        f"p50 {summary['p50']:.2f} p90 {summary['p90']:.2f} "
+        f"p99 {summary['p99']:.2f} max {summary['max']:.2f} мс"
+    )
+
+
+class HttpClient:
+    """Минимальный клиент HTTP/1.1 с keep-alive для цикла событий (requests
+    блокирующий)"""
+
+    def __init__(self, base_url):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        try:
+            self.writer.write(head.encode() + body)
+            await self.writer.drain()
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionError("Сервер закрыл соединение")
+            status = int(status_line.split()[1])
+            length = 0
+            chunked = False
+            close = False
+            while True:
+                line = await self.reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                name = name.strip().lower()
+                value = value.strip().lower()
+                if name == 'content-length':
+                    length = int(value)
+                elif name == 'transfer-encoding':
+                    chunked = 'chunked' in value
+                elif name == 'connection':
+                    close = value == 'close'
+            if chunked:
+                payload = await self._read_chunked()
+            else:
+                payload = await self.reader.readexactly(length)
+        except BaseException:
+            self.close()
+            raise
+        if close:
+            self.close()
+        return status, payload
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if not size:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    async def post_json(self, path, data):
+        return await self.request('POST', path, json.dumps(data).encode())
+
+    async def get_json(self, path):
+        status, payload = await self.request('GET', path)
+        return json.loads(payload) if status == 200 else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+
+class Source:
+    """Источник показаний: номер -> время отправки, ошибки и время самой
+    отправки (для HTTP — до ответа сервера)"""
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate
+        self.sent_at = {}
+        self.numbers = itertools.count(1)
+        self.errors = 0
+        self.send_durations = []
+        self.elapsed = 0.0
+
+    def next(self):
+        seq = next(self.numbers)
+        self.sent_at[seq] = time.perf_counter()
+        return seq
+
+    def report(self):
+        sent = len(self.sent_at)
+        return {
+            'target_rate': self.rate,
+            'rate': sent / self.elapsed if self.elapsed else 0.0,
+            'sent': sent,
+            'errors': self.errors,
+            'send': summarize(self.send_durations),
+        }
+
+
+async def paced(rate, duration, send):
+    """Вызывает send() rate раз в секунду в течение duration; отставание
+    догоняется подряд, так что достигнутый темп виден по числу отправок"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    interval = 1.0 / rate
+    for n in itertools.count():
+        due = started + n * interval
+        if due >= started + duration:
+            break
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await send()
+    return max(duration, loop.time() - started)
+
+
+async def discard_incoming(websocket):
+    """Сервер рассылает показания и источникам; непрочитанные сообщения
+    упёрлись бы в буфер и замедлили рассылку"""
+    try:
+        async for _ in websocket:
+            pass
+    except ConnectionClosed:
+        pass
+
+
+async def run_websocket_source(url, source, duration, make_message):
+    async with websockets.connect(
+        url, max_size=None, compression=None, ping_interval=None
+    ) as websocket:
+        drain = asyncio.create_task(discard_incoming(websocket))
+
+        async def send():
+            message = make_message(source.next())
+            started = time.perf_counter()
+            try:
+                await websocket.send(message)
+            except ConnectionClosed:
+                source.errors += 1
+                raise
+            source.send_durations.append(time.perf_counter() - started)
+
+        try:
+            source.elapsed = await paced(source.rate, duration, send)
+        finally:
+            drain.cancel()
+
+
+async def run_uart_source(args, source):
+    rnd = random.Random(1)
+    await run_websocket_source(
+        args.url,
+        source,
+        args.duration,
+        lambda seq: build_uart_message(seq, args.uart_batch, rnd),
+    )
+
+
+async def run_multimeter_source(args, source):
+    rnd = random.Random(2)
+
+    def make_message(seq):
+        return json.dumps(
+            {
+                'timestamp': timestamp_now(),
+                'value': f"{rnd.uniform(0, 20):.3f}",
+                'unit': 'V',
+                'mode': 'DC',
+                'range_str': 'AUTO',
+                'measure_type': 'Voltage',
+                'raw_data': {'loadgen_seq': seq},
+                'force_save': args.force_save,
+            }
+        )
+
+    await run_websocket_source(args.url, source, args.duration, make_message)
+
+
+async def run_uart_http_source(args, source):
+    rnd = random.Random(3)
+    connections = max(1, args.http_connections)
+
+    async def worker():
+        client = HttpClient(args.http)
+
+        async def send():
+            seq = source.next()
+            data = {
+                'type': 'sensor_data',
+                'timestamp': timestamp_now(),
+                'data': {'temp600_1': float(seq), 'temp600_2': rnd.uniform(20, 600)},
+            }
+            started = time.perf_counter()
+            try:
+                status, _ = await client.post_json('/uart-data', data)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                source.errors += 1
+                return
+            source.send_durations.append(time.perf_counter() - started)
+            if status != 200:
+                source.errors += 1
+
+        try:
+            return await paced(source.rate / connections, args.duration, send)
+        finally:
+            client.close()
+
+    source.elapsed = max(await asyncio.gather(*(worker() for _ in range(connections))))
+
+
+class Dashboard:
+    """Панель в браузере: опрос сервера и учёт доставленных показаний"""
+
+    REQUESTS = {'get_uart_data': 'uart_poll_rate', 'get_oscilloscope_data': 'scope_rate'}
+
+    def __init__(self, index, args, sources):
+        self.index = index
+        self.args = args
+        self.sources = sources
+        self.connected = asyncio.Event()
+        self.error = None
+        self.delivered = {name: [] for name in sources}
+        self.last_seq = {}
+        self.requests = {action: 0 for action in self.REQUESTS}
+        self.pending = {action: [] for action in self.REQUESTS}
+        self.replies = {action: [] for action in self.REQUESTS}
+        self.trace_acks = 0
+
+    async def run(self, stop):
+        try:
+            async with websockets.connect(
+                self.args.url, max_size=None, compression=None, ping_interval=None
+            ) as websocket:
+                self.connected.set()
+                tasks = [asyncio.create_task(self.read(websocket))]
+                for action, rate_option in self.REQUESTS.items():
+                    rate = getattr(self.args, rate_option)
+                    if rate > 0:
+                        tasks.append(
+                            asyncio.create_task(self.poll(websocket, action, rate))
+                        )
+                await stop.wait()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (OSError, WebSocketException) as e:
+            self.error = str(e)
+            self.connected.set()
+
+    async def poll(self, websocket, action, rate):
+        """Как setInterval в браузере: запрос раз в 1/rate с, не дожидаясь ответа"""
+        interval = 1.0 / rate
+        await asyncio.sleep(random.uniform(0, interval))
+        message = json.dumps({'action': action})
+        while True:
+            self.pending[action].append(time.perf_counter())
+            self.requests[action] += 1
+            await websocket.send(message)
+            await asyncio.sleep(interval)
+
+    async def read(self, websocket):
+        async for message in websocket:
+            received = time.perf_counter()
+            if isinstance(message, bytes):
+                continue
+            data = json.loads(message)
+            self.handle(data, received)
+            if 'trace' in data:
+                await websocket.send(
+                    json.dumps(
+                        {
+                            'action': 'trace_ack',
+                            'trace': data['trace'],
+                            'handled_ms': (time.perf_counter() - received) * 1000,
+                            'render_ms': 0.0,
+                        }
+                    )
+                )
+                self.trace_acks += 1
+
+    def reply(self, action, received):
+        if self.pending[action]:
+            self.replies[action].append(received - self.pending[action].pop(0))
+
+    def deliver(self, name, seq, received):
+        # повтор того же номера (ответ на get_uart_data) не считается
+        if self.last_seq.get(name) == seq:
+            return
+        sent_at = self.sources[name].sent_at.get(seq)
+        if sent_at is not None:
+            self.last_seq[name] = seq
+            self.delivered[name].append(received - sent_at)
+
+    def handle(self, message, received):
+        kind = message.get('type')
+        if kind == 'sensor_data':
+            data = message.get('data', {})
+            # полное состояние — начальное сообщение или ответ на get_uart_data,
+            # рассылка несёт только ключи пришедшей пачки
+            if 'tempNormal1' in data and 'temp600_1' in data:
+                self.reply('get_uart_data', received)
+            elif 'tempNormal1' in data and 'uart' in self.sources:
+                self.deliver('uart', uart_seq(data), received)
+            elif 'temp600_1' in data and 'uart_http' in self.sources:
+                self.deliver('uart_http', int(data['temp600_1']), received)
+        elif kind == 'multimeter':
+            seq = (message.get('data', {}).get('raw_data') or {}).get('loadgen_seq')
+            if seq is not None and 'multimeter' in self.sources:
+                self.deliver('multimeter', seq, received)
+        elif 'channels' in message:
+            self.reply('get_oscilloscope_data', received)
+
+
+async def watch_loop_lag(samples):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        samples.append(max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+
+async def fetch_server_latency(args):
+    client = HttpClient(args.http)
+    try:
+        return await client.get_json('/trace/latency')
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        print(f"  /trace/latency недоступен: {e}")
+        return None
+    finally:
+        client.close()
+
+
+async def run_step(args, dashboards_count, uart_rate):
+    sources = {}
+    runners = {
+        'uart': (uart_rate, run_uart_source),
+        'uart_http': (args.http_rate, run_uart_http_source),
+        'multimeter': (args.multimeter_rate, run_multimeter_source),
+    }
+    for name, (rate, _) in runners.items():
+        if rate > 0:
+            sources[name] = Source(name, rate)
+
+    stop = asyncio.Event()
+    dashboards = [Dashboard(i, args, sources) for i in range(dashboards_count)]
+    dashboard_tasks = [asyncio.create_task(d.run(stop)) for d in dashboards]
+    await asyncio.wait_for(
+        asyncio.gather(*(d.connected.wait() for d in dashboards)), CONNECT_TIMEOUT
+    )
+
+    lag = []
+    lag_task = asyncio.create_task(watch_loop_lag(lag))
+    results = await asyncio.gather(
+        *(runners[name][1](args, source) for name, source in sources.items()),
+        return_exceptions=True,
+    )
+    for name, result in zip(sources, results):
+        if isinstance(result, BaseException):
+            print(f"  Источник {name} остановлен: {result}")
+    await asyncio.sleep(args.drain)
+    stop.set()
+    await asyncio.gather(*dashboard_tasks)
+    lag_task.cancel()
+
+    connected = [d for d in dashboards if d.error is None]
+    delivery = {}
+    for name, source in sources.items():
+        expected = len(source.sent_at) * len(connected)
+        durations = [value for d in connected for value in d.delivered[name]]
+        delivery[name] = {
+            'expected': expected,
+            'received': len(durations),
+            'drop_rate': 1 - len(durations) / expected if expected else 0.0,
+            'latency': summarize(durations),
+        }
+    requests = {}
+    for action in Dashboard.REQUESTS:
+        sent = sum(d.requests[action] for d in connected)
+        durations = [value for d in connected for value in d.replies[action]]
+        requests[action] = {
+            'sent': sent,
+            'answered': len(durations),
+            'no_reply': sent - len(durations),
+            'latency': summarize(durations),
+        }
+    return {
+        'dashboards': dashboards_count,
+        'connect_errors': dashboards_count - len(connected),
+        'uart_rate': uart_rate,
+        'uart_batch': args.uart_batch,
+        'duration': args.duration,
+        'sources': {name: source.report() for name, source in sources.items()},
+        'delivery': delivery,
+        'requests': requests,
+        'trace_acks': sum(d.trace_acks for d in connected),
+        'loop_lag': summarize(lag),
+        'server': await fetch_server_latency(args),
+    }
+
+
+def print_step(report):
+    for name, source in report['sources'].items():
+        print(
+            f"  {name:<22} отправлено {source['sent']} "
+            f"({source['rate']:.1f}/с из {source['target_rate']}/с), "
+            f"ошибок {source['errors']}; отправка {format_summary(source['send'])}"
+        )
+    for name, item in report['delivery'].items():
+        print(
+            f"  доставка {name:<13} {item['received']}/{item['expected']}, "
+            f"потери {item['drop_rate']:.2%}; {format_summary(item['latency'])}"
+        )
+    for action, item in report['requests'].items():
+        if item['sent']:
+            print(
+                f"  {action:<22} ответов {item['answered']}/{item['sent']}; "
+                f"{format_summary(item['latency'])}"
+            )
+    for stream, stages in (report['server'] or {}).items():
+        for stage in ('server_total', 'client_delivery', 'end_to_end'):
+            if stage in stages:
+                print(
+                    f"  сервер {stream}.{stage:<20} p50 {stages[stage]['p50']:.2f} "
+                    f"p99 {stages[stage]['p99']:.2f} мс"
+                )
+    if report['connect_errors']:
+        print(f"  не подключились панели: {report['connect_errors']}")
+    print(f"  цикл нагрузки: {format_summary(report['loop_lag'])}")
+
+
+def saturated(report, args):
+    if report['connect_errors']:
+        return True
+    for item in report['delivery'].values():
+        if item['drop_rate'] > args.max_drop:
+            return True
+        if item['latency'].get('p99', 0) > args.max_latency_ms:
+            return True
+    return False
+
+
+async def run(args):
+    reports = []
+    capacity = []
+    for uart_rate in args.uart_rate:
+        for dashboards_count in args.dashboards:
+            print(
+                f"== Панелей: {dashboards_count}, UART {uart_rate} сообщ/с "
+                f"по {args.uart_batch} кадров, {args.duration} с"
+            )
+            try:
+                report = await run_step(args, dashboards_count, uart_rate)
+            except asyncio.TimeoutError:
+                print(f"  Не удалось подключить {dashboards_count} панелей")
+                break
+            reports.append(report)
+            print_step(report)
+            if saturated(report, args):
+                print("  НАСЫЩЕНИЕ: дальше не увеличиваем число панелей")
+                break
+            capacity.append((uart_rate, dashboards_count))
+
+    print()
+    best = {}
+    for uart_rate, dashboards_count in capacity:
+        best[uart_rate] = max(best.get(uart_rate, 0), dashboards_count)
+    for uart_rate, dashboards_count in best.items():
+        print(f"UART {uart_rate} сообщ/с: выдержано панелей {dashboards_count}")
+    if not best:
+        print("Ни один шаг не прошёл без насыщения")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"Отчёт: {args.json}")
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def float_list(value):
+    return [float(item) for item in value.split(',') if item]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Синтетическая нагрузка: эмуляция стенда и панелей'
+    )
+    parser.add_argument('--url', default=SERVER_WEBSOCKET_URL)
+    parser.add_argument('--http', default=SERVER_HTTP_URL)
+    parser.add_argument('--dashboards', type=int_list, default=[1, 10, 50],
+                        help='Число панелей, через запятую для перебора')
+    parser.add_argument('--uart-rate', type=float_list, default=[50.0],
+                        help='Бинарных сообщений UART в секунду (через запятую)')
+    parser.add_argument('--uart-batch', type=int, default=8,
+                        help='Кадров UART в одном сообщении')
+    parser.add_argument('--http-rate', type=float, default=5.0,
+                        help='POST /uart-data в секунду')
+    parser.add_argument('--http-connections', type=int, default=2)
+    parser.add_argument('--multimeter-rate', type=float, default=5.0,
+                        help='Показаний мультиметра в секунду')
+    parser.add_argument('--force-save', action=argparse.BooleanOptionalAction,
+                        default=True, help='Флаг force_save в показаниях мультиметра')
+    parser.add_argument('--uart-poll-rate', type=float, default=1.0,
+                        help='get_uart_data в секунду на панель')
+    parser.add_argument('--scope-rate', type=float, default=2.0,
+                        help='get_oscilloscope_data в секунду на панель')
+    parser.add_argument('--duration', type=float, default=20.0,
+                        help='Длительность шага, с')
+    parser.add_argument('--drain', type=float, default=2.0,
+                        help='Ожидание доставки после остановки источников, с')
+    parser.add_argument('--max-drop', type=float, default=0.001,
+                        help='Допустимая доля потерь')
+    parser.add_argument('--max-latency-ms', type=float, default=250.0,
+                        help='Допустимая p99 задержка доставки, мс')
+    parser.add_argument('--json', help='Записать отчёт по шагам в файл')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        print("Нагрузка прервана")
@@ -7,18 +7,22 @@ import asyncio
 import base64
 import json
 import locale
+import os
 import threading
 import time
 import traceback
-from datetime import datetime
 
 import numpy as np
 import pyvisa
 import websockets
-from sqlalchemy import (JSON, Column, DateTime, Float, Integer, String,
-                        create_engine)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.engine import Session
+from backend.events import EventWriter
+from backend.models import OscilloscopeData
+from backend.setup_db import database_initialized  # создаёт и мигрирует схему БД
+from backend.timestamps import format_timestamp
 
 if sys.platform.startswith('win'):
     locale.setlocale(locale.LC_ALL, 'Russian_Russia.UTF-8')
@@ -28,32 +32,10 @@ if sys.platform.startswith('win'):
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
 oscilloscope_lock = threading.Lock()
-
-DATABASE_PATH = 'my_database.db'
+# при запуске из сервера данные идут по каналу событий, иначе в stdout
+events = EventWriter()
 
 WEBSOCKET_PORT = 8767
-DATABASE_URL = 'sqlite:///my_database.db'
-
-engine = create_engine(DATABASE_URL, echo=False)
-Base = declarative_base()
-
-
-class OscilloscopeData(Base):
-    __tablename__ = 'осциллограф'
-    id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime)
-    channel = Column(String)
-    time_data = Column(String)
-    voltage_data = Column(String)
-    raw_data = Column(JSON)
-    time_base = Column(Float)
-    time_offset = Column(Float)
-    trigger_level = Column(Float)
-
-
-Base.metadata.drop_all(engine)
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
 
 
 class OscilloscopeReader:
@@ -368,58 +350,36 @@ def save_to_database(data):
                 voltage_bytes = np.array(
                     channel_data['voltage'], dtype=np.float32
                 ).tobytes()
+                raw_data = dict(channel_data)
+                raw_data['time_base'] = data['data']['time_base']
+                raw_data['time_offset'] = data['data']['time_offset']
+                raw_data['trigger_level'] = data['data']['trigger_level']
                 record = OscilloscopeData(
-                    timestamp=datetime.now(),
+                    timestamp=format_timestamp(),
                     channel=channel_name,
                     time_data=base64.b64encode(time_bytes).decode('utf-8'),
                     voltage_data=base64.b64encode(voltage_bytes).decode(
                         'utf-8'
                     ),
-                    raw_data=channel_data,
-                    time_base=data['data']['time_base'],
-                    time_offset=data['data']['time_offset'],
-                    trigger_level=data['data']['trigger_level'],
+                    raw_data=raw_data,
                 )
                 session.add(record)
-                print(
-                    json.dumps(
-                        {
-                            "type": "oscilloscope_test",
-                            "channel": channel_name,
-                            "time": channel_data.get('time', []),
-                            "voltage": channel_data.get('voltage', []),
-                            "color": channel_data.get('color'),
-                            "settings": settings,
-                        }
-                    )
+                events.waveform(
+                    channel_name,
+                    channel_data['time'],
+                    channel_data['voltage'],
+                    channel_data.get('color'),
+                    settings,
                 )
             else:
-                print(
-                    json.dumps(
-                        {
-                            "type": "oscilloscope_test",
-                            "channel": channel_name,
-                            "time": [],
-                            "voltage": [],
-                            "color": channel_data.get('color'),
-                            "settings": settings,
-                        }
-                    )
+                events.waveform(
+                    channel_name, [], [], channel_data.get('color'), settings
                 )
-        trigger_level = data['data'].get('trigger_level', 0)
-        trigger_mode = data['data'].get('trigger_mode', 'Auto')
-        trigger_source = data['data'].get('trigger_source', 'CH1')
-        trigger_slope = data['data'].get('trigger_slope', 'Rising')
-        print(
-            json.dumps(
-                {
-                    "type": "trigger",
-                    "level": trigger_level,
-                    "mode": trigger_mode,
-                    "source": trigger_source,
-                    "slope": trigger_slope,
-                }
-            )
+        events.trigger(
+            data['data'].get('trigger_level', 0),
+            data['data'].get('trigger_mode', 'Auto'),
+            data['data'].get('trigger_source', 'CH1'),
+            data['data'].get('trigger_slope', 'Rising'),
         )
     session.commit()
     return True
@@ -568,6 +528,7 @@ async def main_async(args):
                 print("Ошибка при сохранении данных в БД")
 
             await update_oscilloscope_data()
+            events.progress('oscilloscope', i + 1, args.samples)
 
             await asyncio.sleep(args.interval)
 
@@ -581,6 +542,7 @@ async def main_async(args):
             reader.close()
             server.close()
             await server.wait_closed()
+            events.close()
             print("Работа программы завершена")
 
 
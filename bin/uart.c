@@ -20,6 +20,9 @@
 #define PACKET_SIZE 64
 #define HTTP_SERVER_URL "http://127.0.0.1:8080/uart-data"
 #define MAX_PORTS 2
+#define UPLINK_QUEUE_SIZE 1024
+#define UPLINK_BATCH_SIZE 64
+#define UPLINK_FRAME_JSON_MAX 256
 
 static const uint8_t START_SEQ_TEMPERATURE[] = {0x01, 0x02, 0x03, 0x04};
 static const uint8_t START_SEQ_HIGH_TEMPERATURE[] = {0x03, 0x03, 0x03, 0x03};
@@ -29,14 +32,29 @@ static int uart_fd = -1;
 static volatile bool running = true;
 static pthread_mutex_t uart_mutex = PTHREAD_MUTEX_INITIALIZER;
 
+enum {
+    FIELD_TEMP_NORMAL = 1 << 0,
+    FIELD_TEMP_600 = 1 << 1,
+    FIELD_THRUST = 1 << 2,
+};
+
 typedef struct {
     double tempNormal1;
     double tempNormal2;
     double temp600_1;
     double temp600_2;
     double thrust1;
+    uint32_t fields;
+    char timestamp[32];
 } sensor_data_t;
 
+static sensor_data_t uplink_queue[UPLINK_QUEUE_SIZE];
+static size_t uplink_head = 0;
+static size_t uplink_count = 0;
+static unsigned long uplink_dropped = 0;
+static pthread_mutex_t uplink_mutex = PTHREAD_MUTEX_INITIALIZER;
+static pthread_cond_t uplink_cond = PTHREAD_COND_INITIALIZER;
+
 uint16_t calc_crc16(const uint8_t *data, size_t len) {
     uint16_t crc = 0xFFFF;
     for (size_t i = 0; i < len; i++) {
@@ -57,51 +75,114 @@ static size_t write_callback(void *contents, size_t size, size_t nmemb, void *us
     return size * nmemb;
 }
 
-void send_uart_data_via_http(const sensor_data_t *sensor_data) {
-    CURL *curl;
-    CURLcode res;
-    
-    curl = curl_easy_init();
-    
-    if(curl) {
-        char json_data[512];
-        snprintf(json_data, sizeof(json_data),
-                "{\"type\":\"sensor_data\",\"data\":{"
-                "\"tempNormal1\":%.2f,"
-                "\"tempNormal2\":%.2f,"
-                "\"temp600_1\":%.2f,"
-                "\"temp600_2\":%.2f,"
-                "\"thrust1\":%.3f}}",
-                sensor_data->tempNormal1,
-                sensor_data->tempNormal2,
-                sensor_data->temp600_1,
-                sensor_data->temp600_2,
-                sensor_data->thrust1);
-        
-        printf("Sending JSON: %s\n", json_data);
-        
-        curl_easy_setopt(curl, CURLOPT_URL, HTTP_SERVER_URL);
+static void format_timestamp(char *out, size_t len) {
+    struct timeval tv;
+    struct tm tm_info;
+    gettimeofday(&tv, NULL);
+    localtime_r(&tv.tv_sec, &tm_info);
+    size_t n = strftime(out, len, "%Y-%m-%d %H:%M:%S", &tm_info);
+    snprintf(out + n, len - n, ".%03ld", (long)(tv.tv_usec / 1000));
+}
+
+/* Кладёт кадр в очередь отправки. Никогда не ждёт сеть: при переполнении
+   вытесняется самый старый кадр. */
+void uplink_push(const sensor_data_t *sensor_data) {
+    pthread_mutex_lock(&uplink_mutex);
+    if (uplink_count == UPLINK_QUEUE_SIZE) {
+        uplink_head = (uplink_head + 1) % UPLINK_QUEUE_SIZE;
+        uplink_count--;
+        uplink_dropped++;
+    }
+    uplink_queue[(uplink_head + uplink_count) % UPLINK_QUEUE_SIZE] = *sensor_data;
+    uplink_count++;
+    pthread_cond_signal(&uplink_cond);
+    pthread_mutex_unlock(&uplink_mutex);
+}
+
+static size_t format_frame_json(const sensor_data_t *d, char *out, size_t len) {
+    int n = snprintf(out, len, "{\"timestamp\":\"%s\",\"data\":{", d->timestamp);
+    const char *sep = "";
+    if (d->fields & FIELD_TEMP_NORMAL) {
+        n += snprintf(out + n, len - n, "\"tempNormal1\":%.2f,\"tempNormal2\":%.2f",
+                      d->tempNormal1, d->tempNormal2);
+        sep = ",";
+    }
+    if (d->fields & FIELD_TEMP_600) {
+        n += snprintf(out + n, len - n, "%s\"temp600_1\":%.2f,\"temp600_2\":%.2f",
+                      sep, d->temp600_1, d->temp600_2);
+        sep = ",";
+    }
+    if (d->fields & FIELD_THRUST) {
+        n += snprintf(out + n, len - n, "%s\"thrust1\":%.3f", sep, d->thrust1);
+    }
+    n += snprintf(out + n, len - n, "}}");
+    return (size_t)n;
+}
+
+/* Поток отправки: одно постоянное keep-alive соединение с main.py,
+   кадры уходят пачками типа sensor_batch. */
+void* uplink_thread(void* arg) {
+    CURL *curl = curl_easy_init();
+    if (!curl) {
+        fprintf(stderr, "Failed to init curl handle\n");
+        return NULL;
+    }
+
+    struct curl_slist *headers = NULL;
+    headers = curl_slist_append(headers, "Content-Type: application/json");
+    curl_easy_setopt(curl, CURLOPT_URL, HTTP_SERVER_URL);
+    curl_easy_setopt(curl, CURLOPT_HTTPHEADER, headers);
+    curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, write_callback);
+    curl_easy_setopt(curl, CURLOPT_TIMEOUT_MS, 2000L);
+    curl_easy_setopt(curl, CURLOPT_TCP_KEEPALIVE, 1L);
+
+    static sensor_data_t batch[UPLINK_BATCH_SIZE];
+    static char json_data[UPLINK_BATCH_SIZE * UPLINK_FRAME_JSON_MAX + 64];
+
+    while (running) {
+        pthread_mutex_lock(&uplink_mutex);
+        while (uplink_count == 0 && running) {
+            struct timespec deadline;
+            clock_gettime(CLOCK_REALTIME, &deadline);
+            deadline.tv_nsec += 100 * 1000000L;
+            if (deadline.tv_nsec >= 1000000000L) {
+                deadline.tv_sec++;
+                deadline.tv_nsec -= 1000000000L;
+            }
+            pthread_cond_timedwait(&uplink_cond, &uplink_mutex, &deadline);
+        }
+        size_t count = uplink_count < UPLINK_BATCH_SIZE ? uplink_count : UPLINK_BATCH_SIZE;
+        for (size_t i = 0; i < count; i++) {
+            batch[i] = uplink_queue[(uplink_head + i) % UPLINK_QUEUE_SIZE];
+        }
+        uplink_head = (uplink_head + count) % UPLINK_QUEUE_SIZE;
+        uplink_count -= count;
+        pthread_mutex_unlock(&uplink_mutex);
+
+        if (count == 0) {
+            continue;
+        }
+
+        size_t n = snprintf(json_data, sizeof(json_data), "{\"type\":\"sensor_batch\",\"data\":[");
+        for (size_t i = 0; i < count; i++) {
+            if (i > 0) {
+                json_data[n++] = ',';
+            }
+            n += format_frame_json(&batch[i], json_data + n, sizeof(json_data) - n);
+        }
+        snprintf(json_data + n, sizeof(json_data) - n, "]}");
+
         curl_easy_setopt(curl, CURLOPT_POSTFIELDS, json_data);
-        curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, write_callback);
-        curl_easy_setopt(curl, CURLOPT_TIMEOUT_MS, 2000L);
-        
-        struct curl_slist *headers = NULL;
-        headers = curl_slist_append(headers, "Content-Type: application/json");
-        curl_easy_setopt(curl, CURLOPT_HTTPHEADER, headers);
-        
-        res = curl_easy_perform(curl);
-        
-        if(res != CURLE_OK) {
-            fprintf(stderr, "HTTP send error: %s\n", curl_easy_strerror(res));
-        } else {
-            long response_code;
-            curl_easy_getinfo(curl, CURLINFO_RESPONSE_CODE, &response_code);
-            printf("UART data sent via HTTP (status: %ld)\n", response_code);
+        CURLcode res = curl_easy_perform(curl);
+        if (res != CURLE_OK) {
+            fprintf(stderr, "HTTP send error: %s (batch of %zu dropped, total dropped %lu)\n",
+                    curl_easy_strerror(res), count, uplink_dropped);
         }
-        
-        curl_slist_free_all(headers);
-        curl_easy_cleanup(curl);
     }
+
+    curl_slist_free_all(headers);
+    curl_easy_cleanup(curl);
+    return NULL;
 }
 
 void decode_high_temperature_payload(const uint8_t *payload, uint8_t command, 
@@ -138,6 +219,38 @@ bool compare_start_seq(const uint8_t *seq1, const uint8_t *seq2, size_t len) {
     return memcmp(seq1, seq2, len) == 0;
 }
 
+static void decode_temperature_packet(const uint8_t *payload, uint8_t command, sensor_data_t *out) {
+    decode_temperature_payload(payload, command, &out->tempNormal1, &out->tempNormal2);
+    out->fields |= FIELD_TEMP_NORMAL;
+    printf("Decoded temperatures: temp1=%.2f, temp2=%.2f\n", out->tempNormal1, out->tempNormal2);
+}
+
+static void decode_traction_packet(const uint8_t *payload, uint8_t command, sensor_data_t *out) {
+    out->thrust1 = decode_traction_payload(payload, command);
+    out->fields |= FIELD_THRUST;
+    printf("Decoded weight: weight=%.3f\n", out->thrust1);
+}
+
+static void decode_high_temperature_packet(const uint8_t *payload, uint8_t command, sensor_data_t *out) {
+    decode_high_temperature_payload(payload, command, &out->temp600_1, &out->temp600_2);
+    out->fields |= FIELD_TEMP_600;
+    printf("Decoded high temperatures: high_temp1=%.2f, high_temp2=%.2f\n", out->temp600_1, out->temp600_2);
+}
+
+/* Таблица типов пакетов: новый датчик добавляется строкой, цикл разбора не меняется.
+   Должна совпадать с реестром backend/uart_packets.py. */
+typedef struct {
+    const uint8_t *start_seq;
+    void (*decode)(const uint8_t *payload, uint8_t command, sensor_data_t *out);
+} packet_type_t;
+
+static const packet_type_t PACKET_TYPES[] = {
+    {START_SEQ_TEMPERATURE, decode_temperature_packet},
+    {START_SEQ_HIGH_TEMPERATURE, decode_high_temperature_packet},
+    {START_SEQ_TRACTION, decode_traction_packet},
+};
+#define PACKET_TYPES_COUNT (sizeof(PACKET_TYPES) / sizeof(PACKET_TYPES[0]))
+
 int uart_init(const char *port) {
     int fd = open(port, O_RDWR | O_NOCTTY | O_SYNC);
     if (fd < 0) {
@@ -175,60 +288,33 @@ int uart_init(const char *port) {
     return fd;
 }
 
-int find_start_sequence(const uint8_t *buffer, size_t len, const uint8_t **found_seq) {
+int find_start_sequence(const uint8_t *buffer, size_t len, const packet_type_t **found_type) {
+    if (len < 4) return -1;
     for (size_t i = 0; i <= len - 4; i++) {
-        if (compare_start_seq(&buffer[i], START_SEQ_TEMPERATURE, 4)) {
-            *found_seq = START_SEQ_TEMPERATURE;
-            return i;
-        }
-        if (compare_start_seq(&buffer[i], START_SEQ_HIGH_TEMPERATURE, 4)) {
-            *found_seq = START_SEQ_HIGH_TEMPERATURE;
-            return i;
-        }
-        if (compare_start_seq(&buffer[i], START_SEQ_TRACTION, 4)) {
-            *found_seq = START_SEQ_TRACTION;
-            return i;
+        for (size_t t = 0; t < PACKET_TYPES_COUNT; t++) {
+            if (compare_start_seq(&buffer[i], PACKET_TYPES[t].start_seq, 4)) {
+                *found_type = &PACKET_TYPES[t];
+                return i;
+            }
         }
     }
     return -1;
 }
 
-void process_complete_packet(const uint8_t *packet, const uint8_t *expected_start) {
+void process_complete_packet(const uint8_t *packet, const packet_type_t *packet_type) {
     uint8_t command = packet[4];
-    uint8_t resp_ok = packet[5];
-    uint8_t payload_len = packet[6];
 
-    
     uint16_t calc_crc = calc_crc16(&packet[4], 58);
     uint16_t recv_crc = (packet[62] << 8) | packet[63];
     
-    
     if (calc_crc == recv_crc) {
         printf("Valid packet received - Command: 0x%02X\n", command);
         
         sensor_data_t sensor_data = {0};
-        const uint8_t *payload = &packet[7];
-        
-        if (compare_start_seq(expected_start, START_SEQ_TEMPERATURE, 4)) {
-            decode_temperature_payload(payload, command, 
-                                     &sensor_data.tempNormal1, 
-                                     &sensor_data.tempNormal2);
-            printf("Decoded temperatures: temp1=%.2f, temp2=%.2f\n",
-                   sensor_data.tempNormal1, sensor_data.tempNormal2);
-        }
-        else if (compare_start_seq(expected_start, START_SEQ_TRACTION, 4)) {
-            sensor_data.thrust1 = decode_traction_payload(payload, command);
-            printf("Decoded weight: weight=%.3f\n", sensor_data.thrust1);
-        }
-        else if (compare_start_seq(expected_start, START_SEQ_HIGH_TEMPERATURE, 4)) {
-            decode_high_temperature_payload(payload, command,
-                                          &sensor_data.temp600_1,
-                                          &sensor_data.temp600_2);
-            printf("Decoded high temperatures: high_temp1=%.2f, high_temp2=%.2f\n",
-                   sensor_data.temp600_1, sensor_data.temp600_2);
-        }
+        format_timestamp(sensor_data.timestamp, sizeof(sensor_data.timestamp));
+        packet_type->decode(&packet[7], command, &sensor_data);
         
-        send_uart_data_via_http(&sensor_data);
+        uplink_push(&sensor_data);
     } else {
         printf("Invalid CRC (got %04X, calc %04X)\n", recv_crc, calc_crc);
     }
@@ -238,7 +324,7 @@ void* uart_reader_thread(void* arg) {
     uint8_t buffer[512];
     size_t buffer_len = 0;
     bool waiting_for_packet = false;
-    const uint8_t *expected_packet_start = NULL;
+    const packet_type_t *expected_packet_type = NULL;
     
     while (running) {
         if (uart_fd == -1) {
@@ -252,8 +338,8 @@ void* uart_reader_thread(void* arg) {
             
             while (buffer_len >= 4) {
                 if (!waiting_for_packet) {
-                    const uint8_t *found_seq = NULL;
-                    int pos = find_start_sequence(buffer, buffer_len, &found_seq);
+                    const packet_type_t *found_type = NULL;
+                    int pos = find_start_sequence(buffer, buffer_len, &found_type);
                     
                     if (pos == -1) {
                         if (buffer_len > 64) {
@@ -269,29 +355,30 @@ void* uart_reader_thread(void* arg) {
                             buffer_len -= pos;
                         }
                         
-                        expected_packet_start = found_seq;
+                        expected_packet_type = found_type;
                         waiting_for_packet = true;
+                        const uint8_t *found_seq = found_type->start_seq;
                         printf("Start sequence found (type: %02X%02X%02X%02X), buffer_len=%zu\n",
                                found_seq[0], found_seq[1], found_seq[2], found_seq[3], buffer_len);
                     }
                 }
                 
                 if (waiting_for_packet && buffer_len >= PACKET_SIZE) {
-                    if (!compare_start_seq(buffer, expected_packet_start, 4)) {
+                    if (!compare_start_seq(buffer, expected_packet_type->start_seq, 4)) {
                         printf("Unexpected packet start, resetting search\n");
                         waiting_for_packet = false;
-                        expected_packet_start = NULL;
+                        expected_packet_type = NULL;
                         memmove(buffer, buffer + 1, buffer_len - 1);
                         buffer_len--;
                         continue;
                     }
                     
-                    process_complete_packet(buffer, expected_packet_start);
+                    process_complete_packet(buffer, expected_packet_type);
                     
                     memmove(buffer, buffer + PACKET_SIZE, buffer_len - PACKET_SIZE);
                     buffer_len -= PACKET_SIZE;
                     waiting_for_packet = false;
-                    expected_packet_start = NULL;
+                    expected_packet_type = NULL;
                 } else {
                     break;
                 }
@@ -449,10 +536,16 @@ int main() {
     
     curl_global_init(CURL_GLOBAL_DEFAULT);
     
-    pthread_t reader_thread, sender_thread;
+    pthread_t reader_thread, sender_thread, uplink;
     
     printf("Starting UART application...\n");
     
+    if (pthread_create(&uplink, NULL, uplink_thread, NULL) != 0) {
+        fprintf(stderr, "Error creating uplink thread\n");
+        curl_global_cleanup();
+        return 1;
+    }
+    
     if (pthread_create(&reader_thread, NULL, uart_reader_thread, NULL) != 0) {
         fprintf(stderr, "Error creating reader thread\n");
         curl_global_cleanup();
@@ -469,6 +562,8 @@ int main() {
     
     pthread_join(reader_thread, NULL);
     pthread_join(sender_thread, NULL);
+    pthread_cond_broadcast(&uplink_cond);
+    pthread_join(uplink, NULL);
     
     if (uart_fd != -1) {
         close(uart_fd);
@@ -1,23 +1,50 @@
 # uart.py
+import argparse
 import asyncio
+import collections
 import os
 import struct
 import sys
 import json
-import requests
+import logging
 import serial_asyncio
+import websockets
+from datetime import datetime
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import threading
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from backend.uart_framing import (START_SEQ_HIGH_TEMPATURE,
+                                  START_SEQ_TEMPATURE, START_SEQ_TRACTION,
+                                  PacketFramer, calc_crc16)
+from backend.settings import LOG_FORMAT, LOG_LEVEL
+from backend.log import get_logger, setup_logging, shutdown_logging
+from backend.metrics import (PROMETHEUS_CONTENT_TYPE, counter,
+                             render_prometheus)
+from backend.uart_capture import CaptureWriter
+from backend.uart_packets import decode_packet, registered_start_sequences
+
 UART_BAUDRATE = 115200
-PACKET_SIZE = 64
-START_SEQ_TEMPATURE = bytes([0x01, 0x02, 0x03, 0x04])
-START_SEQ_HIGH_TEMPATURE = bytes([0x03, 0x03, 0x03, 0x03])
-START_SEQ_TRACTION = bytes([0x05, 0x02, 0x03, 0x04])
+
+SERVER_WEBSOCKET_URL = 'ws://127.0.0.1:8767'
+UPLINK_QUEUE_SIZE = 10000
+UPLINK_BATCH_SIZE = 200
+UPLINK_FLUSH_INTERVAL = 0.02
+UPLINK_RECONNECT_DELAY = 1.0
+
+POLL_COMMAND = 0x3B
+POLL_TIMEOUT = 0.2
+POLL_RETRIES = 2
+POLL_STATS_INTERVAL = 10.0
 
 protocol_instance = None
+poll_scheduler = None
+logger = get_logger('uart')
+
+UART_PACKETS = counter('uart_packets_total', 'Разобранные пакеты UART')
+UART_CRC_ERRORS = counter('uart_crc_errors_total', 'Пакеты UART с неверной CRC')
 
 class UARTCommandHandler(BaseHTTPRequestHandler):
     def do_POST(self):
@@ -48,6 +75,23 @@ class UARTCommandHandler(BaseHTTPRequestHandler):
         else:
             self.send_response(404)
             self.end_headers()
+
+    def do_GET(self):
+        if self.path == '/poll_stats':
+            stats = poll_scheduler.stats() if poll_scheduler else {}
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(stats).encode())
+        elif self.path == '/metrics':
+            body = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', PROMETHEUS_CONTENT_TYPE)
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(404)
+            self.end_headers()
     
     def log_message(self, format, *args):
         pass
@@ -57,63 +101,97 @@ def run_http_server():
     print("UART HTTP server started on port 9999")
     server.serve_forever()
 
-def send_uart_data_via_http(sensor_data):
-    """Отправляет UART данные через HTTP на main.py"""
-    try:
-        requests.post(
-            'http://127.0.0.1:8080/uart-data',
-            json={'type': 'sensor_data', 'data': sensor_data},
-            timeout=2,
-        )
-        print(f"UART data sent via HTTP: {sensor_data}")
-    except Exception as e:
-        print(f"HTTP send error: {e}")
-
-def calc_crc16(data: bytes) -> int:
-    crc = 0xFFFF
-    for b in data:
-        crc ^= b << 8
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
-            else:
-                crc <<= 1
-            crc &= 0xFFFF
-    return crc
-
-def decode_high_temperature_payload(payload: bytes, command: int) -> tuple[float, float]:
-    try:
-        high_temp1 = struct.unpack('<f', bytes(payload[0:4]))[0]
-        high_temp2 = struct.unpack('<f', bytes(payload[4:8]))[0]
-        return high_temp1, high_temp2
-    except Exception as e:
-        print(f"Error decoding high temperature: {e}")
-        return 0.0, 0.0
-
-def decode_temperature_payload(payload: bytes, command: int) -> tuple[float, float]:
-    try:
-        temp1 = payload[0] | (payload[1] << 8)
-        temp2 = payload[2] | (payload[3] << 8)
-        return temp1 / 100, temp2 / 100
-    except Exception as e:
-        print(f"Error decoding temperature: {e}")
-        return 0.0, 0.0
-
-def decode_traction_payload(payload: bytes, command: int) -> float:
-    try:
-        weight = payload[2] | (payload[3] << 8)
-        return weight / 1000
-    except Exception as e:
-        print(f"Error decoding traction: {e}")
-        return 0.0
+class SensorUplink:
+    """Постоянное WebSocket-соединение с main.py с очередью исходящих кадров.
+
+    push() вызывается из data_received и никогда не ждёт сеть: кадр кладётся
+    в очередь, а отдельная задача отправляет накопленное пачками.
+    """
+
+    def __init__(
+        self,
+        url=SERVER_WEBSOCKET_URL,
+        max_queue=UPLINK_QUEUE_SIZE,
+        batch_size=UPLINK_BATCH_SIZE,
+        flush_interval=UPLINK_FLUSH_INTERVAL,
+    ):
+        self.url = url
+        self.queue = collections.deque(maxlen=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, sensor_data, trace=None):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        frame = {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            'data': sensor_data,
+        }
+        if trace:
+            frame['trace'] = trace
+        self.queue.append(frame)
+        self.pending.set()
+
+    def _take_batch(self):
+        count = min(len(self.queue), self.batch_size)
+        return [self.queue.popleft() for _ in range(count)]
+
+    async def run(self):
+        while True:
+            try:
+                async with websockets.connect(
+                    self.url,
+                    ping_interval=20,
+                    ping_timeout=20,
+                    close_timeout=5,
+                    compression=None,
+                ) as websocket:
+                    print(f"Uplink connected to {self.url}")
+                    while True:
+                        if not self.queue:
+                            self.pending.clear()
+                            await self.pending.wait()
+                        if len(self.queue) < self.batch_size:
+                            await asyncio.sleep(self.flush_interval)
+                        batch = self._take_batch()
+                        sent_ns = time.monotonic_ns()
+                        for frame in batch:
+                            if 'trace' in frame:
+                                frame['trace']['sent_ns'] = sent_ns
+                        try:
+                            await websocket.send(
+                                json.dumps({'type': 'sensor_batch', 'data': batch})
+                            )
+                        except Exception:
+                            # вернуть в очередь столько, сколько влезает:
+                            # extendleft в полную deque молча вытеснил бы
+                            # новые кадры справа
+                            free = self.queue.maxlen - len(self.queue)
+                            keep = batch[len(batch) - free:] if free else []
+                            self.dropped += len(batch) - len(keep)
+                            self.queue.extendleft(reversed(keep))
+                            raise
+                        self.sent += len(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(
+                    f"Uplink error: {e}, queued={len(self.queue)}, "
+                    f"dropped={self.dropped}. Reconnecting in {UPLINK_RECONNECT_DELAY}s"
+                )
+                await asyncio.sleep(UPLINK_RECONNECT_DELAY)
 
 class UARTProtocol(asyncio.Protocol):
-    def __init__(self):
-        self.buffer = bytearray()
+    def __init__(self, uplink=None, capture=None):
+        self.uplink = uplink
+        self.capture = capture
+        self.scheduler = None
+        self.framer = PacketFramer(registered_start_sequences())
         self.transport = None
         self.connection_ready = asyncio.Event()
-        self.waiting_for_packet = False
-        self.expected_packet_start = None
         
         global protocol_instance
         protocol_instance = self
@@ -124,106 +202,57 @@ class UARTProtocol(asyncio.Protocol):
         self.connection_ready.set()
 
     def data_received(self, data):
-        self.buffer.extend(data)
-        while True:
-            if not self.waiting_for_packet:
-                found = self._find_start_sequence()
-                if not found:
-                    break
-            if self.waiting_for_packet:
-                if len(self.buffer) < PACKET_SIZE:
-                    break
-                self._read_complete_packet()
-                if len(self.buffer) < PACKET_SIZE:
-                    break
-
-    def _find_start_sequence(self):
-        pos_temp = self.buffer.find(START_SEQ_TEMPATURE)
-        pos_high_temp = self.buffer.find(START_SEQ_HIGH_TEMPATURE)
-        pos_trac = self.buffer.find(START_SEQ_TRACTION)
-
-        positions = []
-        if pos_temp != -1:
-            positions.append((pos_temp, START_SEQ_TEMPATURE))
-        if pos_trac != -1:
-            positions.append((pos_trac, START_SEQ_TRACTION))
-        if pos_high_temp != -1:
-            positions.append((pos_high_temp, START_SEQ_HIGH_TEMPATURE))
-
-        if not positions:
-            if len(self.buffer) > 64:
-                print(f"No start sequence found. Discarding first 10 bytes. Sample: {self.buffer[:10].hex()}")
-                del self.buffer[:10]
-            else:
-                print("No start sequence found. Clearing buffer", self.buffer.hex())
-                self.buffer.clear()
-            return False
-
-        pos, seq = min(positions, key=lambda x: x[0])
-        if pos > 0:
-            del self.buffer[:pos]
-        self.expected_packet_start = seq
-        self.waiting_for_packet = True
-        print(f"Start sequence found at position {pos} (type: {seq.hex()})")
-        return True
-
-    def _read_complete_packet(self):
-        packet = bytes(self.buffer[:PACKET_SIZE])
-        if packet[:4] != self.expected_packet_start:
-            self.waiting_for_packet = False
-            self.expected_packet_start = None
-            del self.buffer[0]
-            self._find_start_sequence()
-            return
-
-        calc_crc = calc_crc16(packet[4:62])
-        recv_crc = (packet[62] << 8) | packet[63]
-        if calc_crc == recv_crc:
-            del self.buffer[:PACKET_SIZE]
-            command = packet[4]
-            payload_len = packet[6]
-            print(f"Valid packet received - Command: 0x{command:02X}, Payload length: {payload_len}, Raw: {packet.hex()}")
-
-            sensor_data = {}
-
-            if self.expected_packet_start == START_SEQ_TEMPATURE:
-                temp1, temp2 = decode_temperature_payload(packet[7 : 7 + 55], command)
-                sensor_data['tempNormal1'] = temp1
-                sensor_data['tempNormal2'] = temp2
-                print(f"Decoded temperatures: temp1={temp1}, temp2={temp2}")
-
-            elif self.expected_packet_start == START_SEQ_TRACTION:
-                weight = decode_traction_payload(packet[7 : 7 + 55], command)
-                sensor_data['thrust1'] = weight
-                print(f"Decoded weight: weight={weight}")
-
-            elif self.expected_packet_start == START_SEQ_HIGH_TEMPATURE:
-                high_temp1, high_temp2 = decode_high_temperature_payload(packet[7 : 7 + 55], command)
-                sensor_data['temp600_1'] = high_temp1
-                sensor_data['temp600_2'] = high_temp2
-                print(f"Decoded high temperatures: high_temp1={high_temp1}, high_temp2={high_temp2}")
+        # метка захвата для трассировки задержек (backend/tracing.py)
+        capture_ns = time.monotonic_ns()
+        crc_errors = self.framer.crc_errors
+        for start_seq, packet in self.framer.feed(data):
+            self._handle_packet(start_seq, packet, capture_ns)
+        if self.framer.crc_errors != crc_errors:
+            UART_CRC_ERRORS.inc(self.framer.crc_errors - crc_errors)
+            logger.warning("Invalid CRC: %d candidate packet(s) discarded", self.framer.crc_errors - crc_errors)
+
+    def _handle_packet(self, start_seq, packet, capture_ns=None):
+        if self.capture:
+            self.capture.write(packet)
+
+        command = packet[4]
+        payload_len = packet[6]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Valid packet received - Command: 0x%02X, Payload length: %d, Raw: %s", command, payload_len, packet.hex())
 
-            try:
-                send_uart_data_via_http(sensor_data)
-            except Exception as e:
-                print(f"Error sending via HTTP: {e}")
+        try:
+            packet_type, sensor_data = decode_packet(start_seq, packet)
+        except Exception as e:
+            logger.debug(
+                "Error decoding packet %s: %s", start_seq.hex(), e,
+                extra={'sample': 100},
+            )
+            return
+        if packet_type is None:
+            logger.debug(
+                "Unknown packet type: start=%s, command=0x%02X",
+                start_seq.hex(), command,
+                extra={'sample': 100},
+            )
+            UART_PACKETS.inc(type='unknown')
+            return
+        UART_PACKETS.inc(type=packet_type.name)
+        logger.debug("Decoded %s: %s", packet_type.name, sensor_data)
 
-            self.waiting_for_packet = False
-            self.expected_packet_start = None
+        if self.scheduler:
+            self.scheduler.on_response(packet_type.name)
 
-            if len(self.buffer) > 0:
-                self._find_start_sequence()
-        else:
-            print(f"Invalid CRC (got {recv_crc:04X}, calc {calc_crc:04X}), discarding one byte")
-            del self.buffer[0]
-            self.waiting_for_packet = False
-            self.expected_packet_start = None
-            self._find_start_sequence()
+        if self.uplink and sensor_data:
+            trace = None
+            if capture_ns is not None:
+                trace = {'capture_ns': capture_ns, 'decoded_ns': time.monotonic_ns()}
+            self.uplink.push(sensor_data, trace)
 
     def send(self, data: bytes):
         if self.transport:
             self.transport.write(data)
-            print(f"Sent {len(data)} bytes: {data.hex()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Sent %d bytes: %s", len(data), data.hex())
         else:
             print("UART transport not connected")
 
@@ -340,9 +369,9 @@ def build_uart_packet_sent_calibration_value(command: int, value: int) -> bytes:
     print(f"Built calibration packet with command 0x{command:02X} and value: {value}")
     return packet
 
-async def uart_reader():
+async def uart_reader(uplink=None, capture=None):
     loop = asyncio.get_running_loop()
-    protocol_instance = UARTProtocol()
+    protocol_instance = UARTProtocol(uplink, capture)
     ports = ['/dev/ttyUSB1', '/dev/ttyUSB0']
     for port in ports:
         try:
@@ -354,7 +383,126 @@ async def uart_reader():
             print(f'Failed to connect to {port}')
     return None
 
+class PollTarget:
+    """Опрашиваемый датчик: заранее собранный кадр запроса, целевая частота
+    и измеренные частота ответов и задержка"""
+
+    def __init__(self, name, frame, rate_hz, timeout=POLL_TIMEOUT, retries=POLL_RETRIES):
+        self.name = name
+        self.frame = frame
+        self.rate_hz = rate_hz
+        self.interval = 1.0 / rate_hz if rate_hz else 0.0
+        self.timeout = timeout
+        self.retries = retries
+        self.next_due = 0.0
+
+        self.requests = 0
+        self.responses = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.response_times = collections.deque(maxlen=200)
+        self.latencies = collections.deque(maxlen=200)
+
+    def record_response(self, now, latency):
+        self.responses += 1
+        self.response_times.append(now)
+        self.latencies.append(latency)
+
+    def stats(self):
+        achieved = 0.0
+        if len(self.response_times) > 1:
+            span = self.response_times[-1] - self.response_times[0]
+            if span > 0:
+                achieved = (len(self.response_times) - 1) / span
+        latency_avg = latency_p95 = None
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            latency_avg = round(sum(latencies) / len(latencies) * 1000, 2)
+            latency_p95 = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2)
+        return {
+            'target_hz': self.rate_hz,
+            'achieved_hz': round(achieved, 2),
+            'latency_avg_ms': latency_avg,
+            'latency_p95_ms': latency_p95,
+            'requests': self.requests,
+            'responses': self.responses,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+        }
+
+
+class PollScheduler:
+    """Планировщик опроса по схеме запрос-ответ.
+
+    На линии одновременно висит один запрос. Как только приходит ответ
+    (или истекает таймаут), отправляется запрос датчику, у которого раньше
+    всех наступил срок по его целевой частоте. Без ответа запрос
+    повторяется retries раз, затем датчик пропускается до следующего срока.
+    """
+
+    def __init__(self, protocol, targets):
+        self.protocol = protocol
+        self.targets = list(targets)
+        self.waiting_for = None
+        self.response_event = asyncio.Event()
+
+    def on_response(self, name):
+        if self.waiting_for is not None and self.waiting_for.name == name:
+            self.response_event.set()
+
+    async def poll(self, target):
+        loop = asyncio.get_running_loop()
+        for _ in range(target.retries + 1):
+            self.response_event.clear()
+            self.waiting_for = target
+            sent_at = loop.time()
+            self.protocol.send(target.frame)
+            target.requests += 1
+            try:
+                await asyncio.wait_for(self.response_event.wait(), target.timeout)
+            except asyncio.TimeoutError:
+                target.timeouts += 1
+                continue
+            finally:
+                self.waiting_for = None
+            now = loop.time()
+            target.record_response(now, now - sent_at)
+            target.next_due = max(sent_at + target.interval, now)
+            return True
+        target.failures += 1
+        target.next_due = loop.time() + target.interval
+        return False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            target = min(self.targets, key=lambda t: t.next_due)
+            delay = target.next_due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.poll(target)
+
+    async def report(self, interval=POLL_STATS_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            for name, stats in self.stats().items():
+                print(f"Poll {name}: {stats}")
+
+    def stats(self):
+        return {target.name: target.stats() for target in self.targets}
+
+
+def build_poll_targets():
+    """Кадры запросов собираются один раз; имя цели совпадает с именем типа
+    пакета ответа в backend/uart_packets.py"""
+    return [
+        PollTarget('traction', build_uart_packet_traction(POLL_COMMAND), 50.0),
+        PollTarget('temperature', build_uart_packet_temprature(POLL_COMMAND), 5.0),
+        PollTarget('high_temperature', build_uart_packet_high_temprature(POLL_COMMAND), 1.0),
+    ]
+
 async def periodic_send(protocol: UARTProtocol):
+    global poll_scheduler
     await protocol.connection_ready.wait()
     print("Starting periodic UART send")
 
@@ -368,28 +516,37 @@ async def periodic_send(protocol: UARTProtocol):
     protocol.send(build_uart_packet_get_calibration_value(0x3C))
     await asyncio.sleep(2)
 
+    poll_scheduler = PollScheduler(protocol, build_poll_targets())
+    protocol.scheduler = poll_scheduler
+    report_task = asyncio.create_task(poll_scheduler.report())
+    try:
+        await poll_scheduler.run()
+    except asyncio.CancelledError:
+        print("Periodic send cancelled")
+    finally:
+        report_task.cancel()
+
+async def flush_capture(capture, interval=1.0):
     while True:
-        try:
-            print('Temperature')
-            protocol.send(build_uart_packet_temprature(0x3B))
-            await asyncio.sleep(0.1)
-            print('Traction')
-            protocol.send(build_uart_packet_traction(0x3B))
-            await asyncio.sleep(0.5)
-            print('High_Temperature')
-            protocol.send(build_uart_packet_high_temprature(0x3B))
-            await asyncio.sleep(1)
-        except asyncio.CancelledError:
-            print("Periodic send cancelled")
-            break
-
-async def main():
+        await asyncio.sleep(interval)
+        capture.flush()
+
+async def main(args):
+    capture = None
     try:
+        if args.capture:
+            capture = CaptureWriter(args.capture)
+            asyncio.create_task(flush_capture(capture))
+            print(f"Raw UART frames are captured to {args.capture}")
+
         http_thread = threading.Thread(target=run_http_server, daemon=True)
         http_thread.start()
         print("UART HTTP server thread started")
         
-        protocol = await uart_reader()
+        uplink = SensorUplink()
+        uplink_task = asyncio.create_task(uplink.run())
+
+        protocol = await uart_reader(uplink, capture)
         if protocol is None:
             print("Failed to connect to any UART port")
             return
@@ -409,10 +566,28 @@ async def main():
         for task in tasks:
             task.cancel()
         if tasks:
-            await asyncio.gather(*tasks, return_when=asyncio.ALL_COMPLETED)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if capture:
+            capture.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Мост UART -> main.py')
+    parser.add_argument(
+        '--capture',
+        help='Дописывать сырые кадры UART в файл записи (см. backend/uart_capture.py)',
+    )
+    parser.add_argument('--log-level', default=LOG_LEVEL, help='Уровень журнала')
+    parser.add_argument(
+        '--log-format', choices=['json', 'text'], default=LOG_FORMAT, help='Формат журнала'
+    )
+    return parser.parse_args()
 
 if __name__ == '__main__':
+    args = parse_args()
+    setup_logging(args.log_level, args.log_format)
     try:
-        asyncio.run(main())
+        asyncio.run(main(args))
     except KeyboardInterrupt:
-        print("Program interrupted by user, exiting...")
\ No newline at end of file
+        print("Program interrupted by user, exiting...")
+    finally:
+        shutdown_logging()
\ No newline at end of file
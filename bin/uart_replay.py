@@ -0,0 +1,102 @@
+"""
+Воспроизведение записи сырых кадров UART в сервер main.py.
+
+Кадры уходят бинарными WebSocket-сообщениями и проходят тот же путь, что и
+живые данные: декодирование -> рассылка клиентам -> сохранение в БД.
+
+    python3 bin/uart_replay.py capture.bin              # в реальном темпе
+    python3 bin/uart_replay.py capture.bin --speed 10   # в 10 раз быстрее
+    python3 bin/uart_replay.py capture.bin --max-speed  # как можно быстрее
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import websockets
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.uart_capture import CaptureReader
+
+SERVER_WEBSOCKET_URL = 'ws://127.0.0.1:8767'
+
+
+async def replay(args):
+    reader = CaptureReader(args.capture)
+    frames = reader.seek_frame(args.start_frame) if args.start_frame else iter(reader)
+
+    sent = 0
+    messages = 0
+    started = time.monotonic()
+    first_ts = None
+    batch = bytearray()
+
+    async with websockets.connect(
+        args.url, max_size=None, compression=None, ping_interval=None
+    ) as websocket:
+        for timestamp_ns, frame in frames:
+            if args.limit and sent >= args.limit:
+                break
+            if not args.max_speed:
+                if first_ts is None:
+                    first_ts = timestamp_ns
+                due = (timestamp_ns - first_ts) / 1e9 / args.speed
+                delay = due - (time.monotonic() - started)
+                if delay > 0:
+                    if batch:
+                        await websocket.send(bytes(batch))
+                        messages += 1
+                        batch.clear()
+                    await asyncio.sleep(delay)
+            batch += frame
+            sent += 1
+            if len(batch) >= args.batch_frames * len(frame):
+                await websocket.send(bytes(batch))
+                messages += 1
+                batch.clear()
+        if batch:
+            await websocket.send(bytes(batch))
+            messages += 1
+
+    reader.close()
+    elapsed = time.monotonic() - started
+    rate = sent / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Отправлено кадров: {sent} ({messages} сообщений) за {elapsed:.2f} с — "
+        f"{rate:,.0f} кадров/с"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Воспроизведение записи UART в main.py'
+    )
+    parser.add_argument('capture', help='Файл записи (bin/uart.py --capture)')
+    parser.add_argument('--url', default=SERVER_WEBSOCKET_URL)
+    parser.add_argument(
+        '--speed', type=float, default=1.0, help='Множитель темпа записи'
+    )
+    parser.add_argument(
+        '--max-speed',
+        action='store_true',
+        help='Игнорировать метки времени и слать как можно быстрее',
+    )
+    parser.add_argument(
+        '--batch-frames',
+        type=int,
+        default=64,
+        help='Кадров в одном WebSocket-сообщении',
+    )
+    parser.add_argument('--start-frame', type=int, default=0)
+    parser.add_argument('--limit', type=int, default=0, help='Не больше N кадров')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(replay(parse_args()))
+    except KeyboardInterrupt:
+        print("Воспроизведение прервано")
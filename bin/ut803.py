@@ -6,6 +6,7 @@ import argparse
 import asyncio
 import json
 import logging
+import os
 import socket
 import sys
 import time
@@ -16,6 +17,10 @@ import hid
 import serial
 import websockets
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.events import EventWriter
+
 logging.basicConfig(
     level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
 )
@@ -23,6 +28,8 @@ logger = logging.getLogger('UT803')
 
 sys.stdout.reconfigure(line_buffering=True)
 
+events = EventWriter()
+
 
 class UT803Reader:
     def __init__(self, measurement_time: int = 10, force_save: bool = False):
@@ -565,7 +572,8 @@ class UT803Reader:
 
     async def run(self):
         """Main measurement loop"""
-        if not await self.connect_websocket():
+        # started by the server: readings go over the event channel
+        if not events.connected and not await self.connect_websocket():
             return
 
         self.start_time = time.time()
@@ -584,6 +592,16 @@ class UT803Reader:
                     measurement, human_readable = self.read_hid()
 
                 if measurement and human_readable:
+                    if events.connected:
+                        events.reading('multimeter', measurement)
+                        events.progress(
+                            'multimeter',
+                            time.time() - self.start_time,
+                            self.measurement_time,
+                        )
+                        print(human_readable)
+                        await asyncio.sleep(0.1)
+                        continue
                     try:
                         await self.send_measurement(measurement)
                         print(human_readable)
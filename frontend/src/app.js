@@ -9,6 +9,9 @@ let currentPerPage = 10;
 let dbCurrentPage = 1;
 const dbPerPage = 50;
 let dbTotalPages = 1;
+let dbPageCursor = null;
+let dbNextBeforeId = null;
+let dbPrevAfterId = null;
 let dbCurrentType = 'oscilloscope';
 let dbSelectedTest = '';
 window.oscilloscopeChart = null;
@@ -16,6 +19,23 @@ window.multimeterChart = null;
 window.multimeterHistoryChart = null;
 window.oscilloHistoryChart = null;
 
+// Подтверждение трассы задержек (backend/tracing.py): после отрисовки
+// кадра, в котором обработано сообщение
+function sendTraceAck(trace, receivedAt) {
+    const renderStart = performance.now();
+    requestAnimationFrame(() => {
+        const now = performance.now();
+        if (websocket && websocket.readyState === WebSocket.OPEN) {
+            websocket.send(JSON.stringify({
+                action: 'trace_ack',
+                trace: trace,
+                handled_ms: now - receivedAt,
+                render_ms: now - renderStart
+            }));
+        }
+    });
+}
+
 function initWebSocket() {
     websocket = new WebSocket(WEBSOCKET_URL);
     
@@ -50,8 +70,12 @@ function initWebSocket() {
     };
     
     websocket.onmessage = function(event) {
+        const receivedAt = performance.now();
         try {
             const data = JSON.parse(event.data);
+            if (data.trace) {
+                sendTraceAck(data.trace, receivedAt);
+            }
             if (data.type === 'oscilloscope') {
                 parseAndAddOscilloscopeTestData(data.line);
             } else if (data.type === 'multimeter') {
@@ -90,6 +114,18 @@ function initWebSocket() {
                 updateMultimeterTestData(data.data);
             } else if (data.time && data.voltage) {
                 updateOscilloscopeData(data);
+            } else if (data.type === 'lua_output' && data.lines) {
+                addLinesToLuaConsoleTest(data.lines);
+            } else if (data.type === 'job_status') {
+                const job = data.job;
+                addToLuaConsoleTest(`<span style="color:gray">Задание #${job.id} (${job.script}): ${job.state}</span>`);
+                if (job.state === 'cancelled') luaTestActive = false;
+            } else if (data.type === 'lua_progress') {
+                updateTestProgress(data.percent);
+            } else if (data.type === 'oscilloscope_waveform') {
+                addOscilloscopeTestWaveform(data);
+            } else if (data.type === 'oscilloscope_trigger') {
+                setOscilloscopeTestTrigger(data);
             } else if (data.type === 'lua_output') {
                 if (data.line && data.line.startsWith('[PROGRESS]')) {
                     const percent = parseInt(data.line.match(/\[PROGRESS\]\s*(\d+)%/)[1]);
@@ -487,6 +523,7 @@ function setActiveDbTab(type) {
 function toggleDataView(type) {
     dbCurrentType = type;
     dbCurrentPage = 1;
+    dbPageCursor = null;
     setActiveDbTab(type);
     document.getElementById('oscilloscopeData').style.display = (type === 'oscilloscope') ? 'block' : 'none';
     document.getElementById('multimeterData').style.display = (type === 'multimeter') ? 'block' : 'none';
@@ -501,7 +538,13 @@ function renderDbPagination() {
     const prevBtn = document.createElement('button');
     prevBtn.className = 'page-link';
     prevBtn.innerHTML = '&laquo;';
-    prevBtn.onclick = () => { if (dbCurrentPage > 1) { dbCurrentPage--; loadDatabaseData(); } };
+    prevBtn.onclick = () => {
+        if (dbCurrentPage > 1) {
+            dbCurrentPage--;
+            dbPageCursor = dbPrevAfterId && dbCurrentPage > 1 ? `after_id=${dbPrevAfterId}` : null;
+            loadDatabaseData();
+        }
+    };
     prevLi.appendChild(prevBtn);
     pag.appendChild(prevLi);
     const infoLi = document.createElement('li');
@@ -516,7 +559,13 @@ function renderDbPagination() {
     const nextBtn = document.createElement('button');
     nextBtn.className = 'page-link';
     nextBtn.innerHTML = '&raquo;';
-    nextBtn.onclick = () => { if (dbCurrentPage < dbTotalPages) { dbCurrentPage++; loadDatabaseData(); } };
+    nextBtn.onclick = () => {
+        if (dbCurrentPage < dbTotalPages) {
+            dbCurrentPage++;
+            dbPageCursor = dbNextBeforeId ? `before_id=${dbNextBeforeId}` : null;
+            loadDatabaseData();
+        }
+    };
     nextLi.appendChild(nextBtn);
     pag.appendChild(nextLi);
 }
@@ -539,6 +588,9 @@ async function loadDatabaseData() {
         endpoint = dbCurrentType === 'oscilloscope'
             ? `/db/oscilloscope?page=${dbCurrentPage}&per_page=${dbPerPage}`
             : `/db/multimeter?page=${dbCurrentPage}&per_page=${dbPerPage}`;
+        if (dbPageCursor) {
+            endpoint += `&${dbPageCursor}`;
+        }
     }
     try {
         const response = await fetch(endpoint);
@@ -577,6 +629,8 @@ async function loadDatabaseData() {
             throw new Error('Неверная структура данных от сервера');
         }
         dbTotalPages = totalPages || 1;
+        dbNextBeforeId = result.next_before_id || null;
+        dbPrevAfterId = result.prev_after_id || null;
         const tableBody = document.querySelector(dbCurrentType === 'oscilloscope' ? '#oscilloscopeData tbody' : '#multimeterData tbody');
         if (!tableBody) {
             throw new Error('Элемент таблицы не найден');
@@ -732,12 +786,14 @@ document.addEventListener('DOMContentLoaded', function() {
     initApp();
     setActiveDbTab('oscilloscope');
     dbCurrentPage = 1;
+    dbPageCursor = null;
     dbCurrentType = 'oscilloscope';
     loadDatabaseData();
     updateDbTestSelect();
     document.getElementById('dbTestSelect').addEventListener('change', function() {
         dbSelectedTest = this.value;
         dbCurrentPage = 1;
+        dbPageCursor = null;
         loadDatabaseData();
         if (document.getElementById('avgMultimeterChart')) {
             loadAvgMultimeterChart(this.value);
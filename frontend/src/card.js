@@ -351,6 +351,7 @@ function connectWebSocket() {
     };
     
     ws.onmessage = function(event) {
+      const receivedAt = performance.now();
       try {
         const data = JSON.parse(event.data);
         console.log('WebSocket data received:', data);
@@ -358,7 +359,11 @@ function connectWebSocket() {
         if (data.type === 'sensor_data') {
           lastDataTime = Date.now();
           console.log('Sensor data received:', data.data);
+          const renderStart = performance.now();
           updateGauges(data.data);
+          if (data.trace) {
+            sendTraceAck(data.trace, receivedAt, renderStart);
+          }
         } else if (data.type === 'status') {
           console.log('Status update:', data.data);
         } else if (data.type === 'multimeter') {
@@ -393,6 +398,22 @@ function connectWebSocket() {
   }
 }
 
+// Подтверждение трассы задержек (backend/tracing.py): отправляется после
+// отрисовки кадра с новыми значениями
+function sendTraceAck(trace, receivedAt, renderStart) {
+  requestAnimationFrame(() => {
+    const now = performance.now();
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({
+        action: 'trace_ack',
+        trace: trace,
+        handled_ms: now - receivedAt,
+        render_ms: now - renderStart
+      }));
+    }
+  });
+}
+
 function updateGauges(sensorData) {
   console.log('Updating gauges with:', sensorData);
   
@@ -12,6 +12,14 @@ function addToLuaConsoleTest(line) {
     }
 }
 
+function addLinesToLuaConsoleTest(lines) {
+    const luaConsoleTest = document.getElementById('luaConsoleTest');
+    if (luaConsoleTest && lines.length) {
+        luaConsoleTest.insertAdjacentHTML('beforeend', lines.join('<br>') + '<br>');
+        luaConsoleTest.scrollTop = luaConsoleTest.scrollHeight;
+    }
+}
+
 function updateTestProgress(percent) {
     const progressBar = document.getElementById('testProgressBar');
     if (!progressBar) return;
@@ -74,29 +82,49 @@ function addClearTestChartButton() {
     }
 }
 
+function setOscilloscopeTestWaveform(channel, time, voltage, color, settings) {
+    settings = settings || {};
+    if (typeof settings.display === 'undefined') settings.display = '0';
+    oscilloscopeTestLiveData[channel] = {
+        time: time,
+        voltage: voltage,
+        color: color || CHANNEL_COLORS[parseInt(channel.slice(2)) - 1],
+        settings: settings
+    };
+    updateOscilloscopeChartTestLive();
+}
+
+function setOscilloscopeTestTrigger(obj) {
+    window.oscilloscopeTestTrigger = {
+        level: obj.level,
+        mode: obj.mode || 'Auto',
+        source: obj.source || 'CH1',
+        slope: obj.slope || 'Rising'
+    };
+    updateOscilloscopeChartTestLive();
+}
+
+// Осциллограмма из канала событий: массивы float32 в base64
+function addOscilloscopeTestWaveform(data) {
+    if (!data.channel) return;
+    setOscilloscopeTestWaveform(
+        data.channel,
+        Array.from(decodeBase64ToFloat32Array(data.time_data)),
+        Array.from(decodeBase64ToFloat32Array(data.voltage_data)),
+        data.color,
+        data.settings
+    );
+}
+
 function parseAndAddOscilloscopeTestData(line) {
     try {
         const obj = JSON.parse(line);
         if (obj.type === 'oscilloscope_test' && obj.channel && obj.time && obj.voltage) {
-            let settings = obj.settings || {};
-            if (typeof settings.display === 'undefined') settings.display = '0';
-            oscilloscopeTestLiveData[obj.channel] = {
-                time: obj.time,
-                voltage: obj.voltage,
-                color: obj.color || CHANNEL_COLORS[parseInt(obj.channel.slice(2)) - 1],
-                settings: settings
-            };
-            updateOscilloscopeChartTestLive();
+            setOscilloscopeTestWaveform(obj.channel, obj.time, obj.voltage, obj.color, obj.settings);
             return;
         }
         if (obj.type === 'trigger' && (obj.level !== undefined)) {
-            window.oscilloscopeTestTrigger = {
-                level: obj.level,
-                mode: obj.mode || 'Auto',
-                source: obj.source || 'CH1',
-                slope: obj.slope || 'Rising'
-            };
-            updateOscilloscopeChartTestLive();
+            setOscilloscopeTestTrigger(obj);
             return;
         }
     } catch (e) {
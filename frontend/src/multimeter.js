@@ -403,47 +403,12 @@ async function loadAvgMultimeterChart(testNumber) {
         return;
     }
     try {
-        const resp = await fetch(`/tests/${testNumber}?type=multimeter&limit=1000`);
+        const resp = await fetch(`/history/multimeter/stats?test_number=${testNumber}`);
         if (!resp.ok) throw new Error('Ошибка загрузки данных');
         const result = await resp.json();
-        let records = [];
-        if (Array.isArray(result)) {
-            records = result;
-        } else if (result.data && Array.isArray(result.data)) {
-            records = result.data;
-        } else if (result.multimeter && Array.isArray(result.multimeter)) {
-            records = result.multimeter;
-        }
-        if (!records.length) {
-            if (valueElem) valueElem.textContent = '--';
-            return;
-        }
-
-        const groupedData = {};
-        records.forEach(record => {
-            const unit = record.unit || 'V';
-            if (!groupedData[unit]) {
-                groupedData[unit] = {
-                    values: [],
-                    sum: 0,
-                    count: 0
-                };
-            }
-            const value = parseFloat(record.value);
-            if (!isNaN(value)) {
-                groupedData[unit].values.push(value);
-                groupedData[unit].sum += value;
-                groupedData[unit].count++;
-            }
-        });
-
-        const avgText = [];
-        Object.entries(groupedData).forEach(([unit, data]) => {
-            if (data.count > 0) {
-                const avg = data.sum / data.count;
-                avgText.push(`${avg.toFixed(3)} ${unit}`);
-            }
-        });
+        const avgText = (result.units || [])
+            .filter(item => item.count > 0 && item.avg !== null)
+            .map(item => `${item.avg.toFixed(3)} ${item.unit || 'V'}`);
 
         if (avgText.length > 0) {
             if (valueElem) valueElem.textContent = avgText.join(', ');
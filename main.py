@@ -1,12 +1,10 @@
 import asyncio
 import concurrent.futures
+import functools
 import json
 import os
 import sys
-import threading
 import traceback
-from datetime import datetime
-from http.server import HTTPServer
 
 import requests
 import websockets
@@ -17,58 +15,50 @@ from backend.measurement import *
 from backend.multimetrUT803 import *
 from backend.oscillocsope_visualizer import *
 from backend.run_lua import *
-from backend.send_websocket import send_to_all_websocket_clients
-from backend.settings import (HTTP_PORT, current_uart_data, global_multimeter,
-                              http_event_loop, is_measurement_active,
+from backend.send_websocket import (active_websockets,
+                                    send_to_all_websocket_clients)
+from backend.settings import (HTTP_PORT, LOG_FORMAT, LOG_LEVEL, LUA_ENGINE,
+                              LUA_RUN_TIMEOUT,
+                              current_uart_data, global_multimeter,
+                              is_measurement_active,
                               is_multimeter_running, last_multimeter_values,
                               multimeter_task, oscilloscope_task)
 from backend.setup_db import *
-
-active_websockets = set()
-
-
-def process_uart_packet(packet_bytes):
-    try:
-        start_byte = packet_bytes[0]
-        command = packet_bytes[1]
-        status = packet_bytes[2]
-        payload_len = packet_bytes[3]
-        payload = packet_bytes[4:62]
-        crc_one = packet_bytes[62]
-        crc_two = packet_bytes[63]
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-
-        data = {
-            'timestamp': timestamp,
-            'start_byte': start_byte,
-            'command': command,
-            'status': status,
-            'payload_len': payload_len,
-            'payload': payload,
-            'crc_one': crc_one,
-            'crc_two': crc_two,
-        }
-
-        save_uart_data(data)
-        if current_uart_table:
-            save_uart_data_to_test(data, current_uart_table)
-
-        print(
-            f"UART пакет сохранен: CMD={command}, StartByte=0x{start_byte:02X}"
-        )
-
-    except Exception as e:
-        print(f"Ошибка обработки UART пакета: {e}")
-        traceback.print_exc()
+from backend.http_server import serve_http
+from backend.jobs import Job, scheduler
+from backend.lifecycle import test_lifecycle
+from backend.log import get_logger, setup_logging, shutdown_logging
+from backend.metrics import STATS_INTERVAL
+from backend.metrics import snapshot as metrics_snapshot
+from backend.scenario import (SCENARIO_INSTRUMENTS, SCENARIO_SCRIPTS,
+                              ScenarioRun, load_scenario,
+                              multimeter_subscribers,
+                              publish_multimeter_reading)
+from backend.retention import format_report, run_retention, run_retention_pass
+from backend.static_files import static_cache
+from backend.tracing import Trace, tracer
+from backend.uart_ingest import ingest_raw_packets, ingest_sensor_frames
+
+stats_subscribers = set()
+# проверка «испытание уже идёт» и начало нового — одно действие для заданий,
+# стартующих в одном проходе планировщика
+test_start_lock = asyncio.Lock()
+logger = get_logger('server')
 
 async def send_calibration_value_to_uart(value):
     """Отправляет калибровочное значение в UART модуль через HTTP"""
     try:
-        response = requests.post(
-            'http://localhost:9999/send_calibration',
-            json={'value': value, 'command': 0x3D},
-            timeout=5
+        # requests блокирующий: в цикле событий он останавливал бы сервер
+        # на время ответа моста (до timeout)
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            None,
+            functools.partial(
+                requests.post,
+                'http://localhost:9999/send_calibration',
+                json={'value': value, 'command': 0x3D},
+                timeout=5,
+            ),
         )
         if response.status_code == 200:
             print(f"Calibration value {value} sent to UART via HTTP")
@@ -95,19 +85,26 @@ async def handle_websocket(websocket):
         async for message in websocket:
             try:
                 if isinstance(message, bytes):
-                    process_uart_packet(message)
+                    await ingest_raw_packets(message)
                     continue
 
                 data = json.loads(message)
 
+                if data.get('type') == 'sensor_batch':
+                    await ingest_sensor_frames(data.get('data', []))
+                    continue
+
                 if 'timestamp' in data and 'value' in data and 'unit' in data:
-                    print(f"Получены данные мультиметра: {data}")
                     force_save = data.get('force_save', False)
-                    print(f"Флаг force_save: {force_save}")
+                    logger.debug(
+                        "Показание мультиметра (force_save=%s): %s", force_save, data
+                    )
                     if force_save:
-                        save_multimeter_data(data, force_save=True)
-                        print(
-                            f"Данные мультиметра сохранены (force_save): {data}"
+                        await run_db(
+                            save_multimeter_data,
+                            data,
+                            force_save=True,
+                            active_test=test_lifecycle.active,
                         )
 
                     await send_to_all_websocket_clients(
@@ -119,20 +116,112 @@ async def handle_websocket(websocket):
 
                 if action == 'run_lua':
                     script_name = data.get('script', 'contrib/main.lua')
+                    if (
+                        script_name in SCENARIO_SCRIPTS
+                        and data.get('engine') != 'lua'
+                    ):
+                        kind = 'scenario'
+                        instruments = SCENARIO_INSTRUMENTS
+                    else:
+                        engine = data.get('engine', LUA_ENGINE)
+                        kind = 'lua_embedded' if engine == 'embedded' else 'lua'
+                        instruments = data.get(
+                            'instruments', SCENARIO_INSTRUMENTS
+                        )
                     print(f"Запуск Lua скрипта: {script_name}")
-
-                    test_number = start_new_test()
-                    if test_number:
+                    try:
+                        job = Job(
+                            kind,
+                            script_name,
+                            instruments,
+                            functools.partial(
+                                run_test_job, websocket=websocket, data=data
+                            ),
+                            owner=websocket,
+                        )
+                    except ValueError as e:
                         await websocket.send(
                             json.dumps(
                                 {
-                                    'type': 'test_started',
-                                    'test_number': test_number,
+                                    'type': 'lua_status',
+                                    'success': False,
+                                    'error': str(e),
                                 }
                             )
                         )
+                        continue
+                    await scheduler.submit(job)
+
+                elif action == 'stop_lua':
+                    job_id = data.get('job_id')
+                    if job_id is not None:
+                        job_ids = [int(job_id)]
+                    else:
+                        job_ids = [
+                            job.id for job in scheduler.active_jobs(websocket)
+                        ]
+                    cancelled = [
+                        job_id
+                        for job_id in job_ids
+                        if await scheduler.cancel(job_id)
+                    ]
+                    await websocket.send(
+                        json.dumps({'type': 'lua_stopped', 'jobs': cancelled})
+                    )
+
+                elif action == 'subscribe_jobs':
+                    scheduler.subscribe(websocket)
+                    await websocket.send(
+                        json.dumps({'type': 'jobs', 'data': scheduler.jobs()})
+                    )
+
+                elif action == 'unsubscribe_jobs':
+                    scheduler.unsubscribe(websocket)
+
+                elif action == 'subscribe_stats':
+                    stats_subscribers.add(websocket)
+
+                elif action == 'unsubscribe_stats':
+                    stats_subscribers.discard(websocket)
+
+                elif action == 'trace_ack':
+                    tracer.acknowledge(
+                        data.get('trace'),
+                        data.get('handled_ms', 0.0),
+                        data.get('render_ms', 0.0),
+                    )
+
+                elif action == 'get_latency':
+                    await websocket.send(
+                        json.dumps({'type': 'latency', 'data': tracer.report()})
+                    )
+
+                elif action == 'list_jobs':
+                    await websocket.send(
+                        json.dumps({'type': 'jobs', 'data': scheduler.jobs()})
+                    )
+
+                elif action in ('stop_test', 'abort_test'):
+                    if action == 'stop_test':
+                        test_number = await run_db(test_lifecycle.stop)
+                    else:
+                        test_number = await run_db(test_lifecycle.abort)
+                    await websocket.send(
+                        json.dumps(
+                            {
+                                'type': 'test_stopped',
+                                'test_number': test_number,
+                                'aborted': action == 'abort_test',
+                            }
+                        )
+                    )
 
-                    await run_lua_test_parallel_async(script_name, websocket)
+                elif action == 'test_status':
+                    await websocket.send(
+                        json.dumps(
+                            {'type': 'test_status', 'data': test_lifecycle.status()}
+                        )
+                    )
 
                 elif action == 'start_measurements':
                     is_measurement_active = True
@@ -264,8 +353,8 @@ async def handle_websocket(websocket):
                                 }
                             )
                         )
-                        print(
-                            f"Sent UART data on request: {current_uart_data}"
+                        logger.debug(
+                            "Данные UART отправлены по запросу: %s", current_uart_data
                         )
                     except Exception as e:
                         print(f"Error sending UART data on request: {e}")
@@ -329,12 +418,117 @@ async def handle_websocket(websocket):
         print(f"Ошибка WebSocket соединения: {e}")
         traceback.print_exc()
     finally:
+        scheduler.unsubscribe(websocket)
+        stats_subscribers.discard(websocket)
         if id(websocket) in last_multimeter_values:
             del last_multimeter_values[id(websocket)]
         if websocket in active_websockets:
             active_websockets.remove(websocket)
 
 
+async def publish_stats(interval=STATS_INTERVAL):
+    """Раз в interval рассылает метрики клиентам, подписанным на stats"""
+    while True:
+        await asyncio.sleep(interval)
+        if not stats_subscribers:
+            continue
+        message = {'type': 'stats', 'data': metrics_snapshot()}
+        for websocket in list(stats_subscribers):
+            await send_to_client(websocket, message)
+
+
+async def send_to_client(websocket, message):
+    try:
+        await websocket.send(json.dumps(message))
+    except Exception as e:
+        print(f"Ошибка отправки сообщения клиенту: {e}")
+
+
+def _test_shared(job):
+    """Испытание задания используют другие идущие задания"""
+    return any(
+        other is not job and other.test_number == job.test_number
+        for other in scheduler.running.values()
+    )
+
+
+async def run_test_job(job, websocket, data):
+    """Тело задания run_lua: испытание и сценарий. Параллельные задания на
+    разных приборах пишут в одно испытание, оно завершается последним"""
+    async with test_start_lock:
+        test_number = test_lifecycle.test_number
+        started = test_number is None
+        if started:
+            test_number = await run_db(start_new_test)
+        job.test_number = test_number
+    if started and test_number:
+        await send_to_client(
+            websocket, {'type': 'test_started', 'test_number': test_number}
+        )
+
+    try:
+        if job.kind == 'scenario':
+            result = {
+                'success': await run_scenario(websocket, data.get('scenario'))
+            }
+        elif job.kind == 'lua_embedded':
+            result = await run_lua_embedded(
+                job.script,
+                websocket,
+                visualizer=global_visualizer,
+                multimeter=global_multimeter,
+                shared_multimeter=bool(is_multimeter_running and global_multimeter),
+                send_calibration=send_calibration_value_to_uart,
+                timeout=data.get('timeout', LUA_RUN_TIMEOUT),
+            )
+        else:
+            result = await run_lua_test_parallel_async(
+                job.script,
+                websocket,
+                on_process=job.attach_process,
+                timeout=data.get('timeout', LUA_RUN_TIMEOUT),
+            )
+    except BaseException:
+        if (
+            test_number
+            and test_lifecycle.test_number == test_number
+            and not _test_shared(job)
+        ):
+            await run_db(test_lifecycle.abort)
+        raise
+    if (
+        test_number
+        and test_lifecycle.test_number == test_number
+        and not _test_shared(job)
+    ):
+        await run_db(test_lifecycle.stop)
+        await send_to_client(
+            websocket, {'type': 'test_stopped', 'test_number': test_number}
+        )
+    return result
+
+
+async def run_scenario(websocket, overrides=None):
+    """Выполняет сценарий испытания на приборах, уже открытых сервером"""
+    scenario = load_scenario(overrides=overrides)
+    print(f"Запуск сценария: {scenario.to_dict()}")
+
+    async def send(message):
+        await websocket.send(json.dumps(message))
+
+    # опрос сервера уже держит мультиметр — показания берутся по подписке
+    shared_multimeter = bool(is_multimeter_running and global_multimeter)
+    scenario_run = ScenarioRun(
+        scenario,
+        visualizer=global_visualizer,
+        multimeter=global_multimeter,
+        send=send,
+        shared_multimeter=shared_multimeter,
+        active_test=test_lifecycle.active,
+    )
+    return await scenario_run.run()
+
+
 async def run_multimeter():
     """Асинхронно запускает чтение мультиметра в отдельном потоке и отправляет данные клиентам"""
     global global_multimeter, active_websockets, is_multimeter_running, is_measurement_active, last_live_multimeter_data
@@ -363,7 +557,7 @@ async def run_multimeter():
         loop = asyncio.get_running_loop()
         with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
             while is_multimeter_running:
-                if not is_measurement_active:
+                if not is_measurement_active and not multimeter_subscribers:
                     await asyncio.sleep(0.1)
                     continue
                 measurement, human_readable = await loop.run_in_executor(
@@ -376,12 +570,19 @@ async def run_multimeter():
                 )
 
                 if measurement and human_readable:
+                    trace = Trace('multimeter', global_multimeter.capture_ns)
+                    trace.mark('decode')
                     last_live_multimeter_data = measurement
-                    print(f"Отправка данных мультиметра: {measurement}")
+                    publish_multimeter_reading(measurement)
+                    logger.debug("Отправка данных мультиметра: %s", measurement)
                     if active_websockets:
                         await send_to_all_websocket_clients(
-                            {"type": "multimeter", "data": measurement}
+                            trace.message(
+                                {"type": "multimeter", "data": measurement}
+                            )
                         )
+                        trace.mark('fanout')
+                        tracer.sent(trace)
                 await asyncio.sleep(0.02)
         if global_multimeter:
             global_multimeter.disconnect()
@@ -395,20 +596,9 @@ async def run_multimeter():
         print("Опрос мультиметра остановлен.")
 
 
-def run_http_server():
-    try:
-        server_address = ('0.0.0.0', HTTP_PORT)
-        httpd = HTTPServer(server_address, CustomHTTPRequestHandler)
-        print(f"HTTP-сервер запущен на http://0.0.0.0:{HTTP_PORT}")
-        httpd.serve_forever()
-    except Exception as e:
-        print(f"Ошибка запуска HTTP-сервера: {e}")
-        traceback.print_exc()
-
-
-async def main():
+async def main(dev=False):
     """Main function to start the server"""
-    global is_multimeter_running, is_measurement_active, http_event_loop
+    global is_multimeter_running, is_measurement_active
 
     try:
         print("Initializing devices...")
@@ -442,14 +632,21 @@ async def main():
             print("WebSocket server started at ws://0.0.0.0:8767")
 
             print("Starting HTTP server...")
-            http_thread = threading.Thread(target=run_http_server)
-            http_thread.daemon = True
-            http_thread.start()
+            print(f"Статических файлов в кэше: {static_cache.preload()}")
+            watch_task = None
+            if dev:
+                watch_task = asyncio.create_task(static_cache.watch())
+                print("Режим разработки: изменения фронтенда подхватываются на лету")
+            http_server = await serve_http(
+                CustomHTTPRequestHandler, '0.0.0.0', HTTP_PORT
+            )
             print(f"HTTP-сервер запущен на http://0.0.0.0:{HTTP_PORT}")
 
             is_multimeter_running = True
             is_measurement_active = True
             multimeter_task = asyncio.create_task(run_multimeter())
+            retention_task = asyncio.create_task(run_retention())
+            stats_task = asyncio.create_task(publish_stats())
 
             try:
                 await asyncio.Future()
@@ -458,6 +655,12 @@ async def main():
             finally:
                 is_multimeter_running = False
                 is_measurement_active = False
+                http_server.close()
+                retention_task.cancel()
+                stats_task.cancel()
+                await scheduler.shutdown()
+                if watch_task:
+                    watch_task.cancel()
                 if multimeter_task:
                     multimeter_task.cancel()
                     try:
@@ -506,8 +709,12 @@ async def handle_get_multimeter_data(websocket, connection_id):
 async def handle_get_oscilloscope_data(websocket):
     try:
         if global_visualizer and global_visualizer.connected:
+            trace = Trace('oscilloscope')
             oscilloscope_data = await global_visualizer.get_oscilloscope_data()
-            await websocket.send(json.dumps(oscilloscope_data))
+            trace.mark('acquire')
+            await websocket.send(json.dumps(trace.message(oscilloscope_data)))
+            trace.mark('send')
+            tracer.sent(trace)
     except Exception as e:
         print(f"Ошибка в handle_get_oscilloscope_data: {e}")
 
@@ -528,8 +735,46 @@ if __name__ == "__main__":
         action='store_true',
         help='Проверить структуру базу данных',
     )
+    parser.add_argument(
+        '--export-test',
+        type=int,
+        metavar='N',
+        help='Выгрузить испытание N в колоночные файлы и выйти',
+    )
+    parser.add_argument(
+        '--export-format',
+        choices=['npz', 'npy', 'parquet'],
+        default='npz',
+        help='Формат выгрузки: npz (один файл), npy (каталог для mmap), parquet',
+    )
+    parser.add_argument(
+        '--export-path',
+        help='Куда выгрузить (по умолчанию exports/test_N[.npz])',
+    )
+    parser.add_argument(
+        '--retention-once',
+        action='store_true',
+        help='Выполнить один проход очистки и архивации БД и выйти',
+    )
+    parser.add_argument(
+        '--dev',
+        action='store_true',
+        help='Режим разработки: отслеживать изменения файлов фронтенда',
+    )
+    parser.add_argument(
+        '--log-level',
+        default=LOG_LEVEL,
+        help=f'Уровень журнала (по умолчанию {LOG_LEVEL})',
+    )
+    parser.add_argument(
+        '--log-format',
+        choices=['json', 'text'],
+        default=LOG_FORMAT,
+        help='Формат журнала: строка JSON на запись или обычный текст',
+    )
 
     args = parser.parse_args()
+    setup_logging(args.log_level, args.log_format)
 
     if args.reset_db:
         print("ВНИМАНИЕ: Выполняется принудительный сброс базы данных!")
@@ -556,16 +801,43 @@ if __name__ == "__main__":
             print("Рекомендуется выполнить сброс: python3 main.py --reset-db")
         sys.exit(0)
 
+    if args.export_test is not None:
+        from backend.export import export_test
+
+        export_path = args.export_path or os.path.join(
+            'exports', f"test_{args.export_test}"
+        )
+        try:
+            result = export_test(args.export_test, export_path, args.export_format)
+            print(f"Испытание #{args.export_test} выгружено: {result}")
+        except Exception as e:
+            print(f"Ошибка выгрузки испытания: {e}")
+            traceback.print_exc()
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.retention_once:
+        report = asyncio.run(run_retention_pass())
+        for item in report['tables']:
+            print(
+                f"  - {item['table']}: удалено {item['deleted']}, "
+                f"новых интервалов свёртки {item['rollup_buckets']}"
+            )
+        print(format_report(report))
+        sys.exit(0)
+
     if not os.path.exists('frontend/index.html'):
         print("Предупреждение: файл index.html не найден!")
     if not os.path.exists('frontend/src/app.js'):
         print("Предупреждение: файл app.js не найден!")
 
     try:
-        asyncio.run(main())
+        asyncio.run(main(dev=args.dev))
     except KeyboardInterrupt:
         print("\nСервер остановлен пользователем")
     except Exception as e:
         print(f"Критическая ошибка: {e}")
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        shutdown_logging()